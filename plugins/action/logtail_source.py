@@ -0,0 +1,14 @@
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible_collections.sd_hardy.logtail.plugins.modules import logtail_source
+from ansible_collections.sd_hardy.logtail.plugins.plugin_utils.logtail_action import LogtailActionBase
+
+
+class ActionModule(LogtailActionBase):
+    """ Run logtail_source on the controller """
+
+    module = logtail_source
@@ -0,0 +1,38 @@
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    accounts:
+        description:
+            - Several Logtail accounts to process at once, in place of I(token).
+            - Each account has its own connections and rate limit. Returned sources carry the C(account) alias they belong to.
+            - A failing account does not stop the others, the task fails once all accounts finished.
+        required: false
+        type: list
+        elements: dict
+        suboptions:
+            alias:
+                description: A unique name for the account, used to tag its results.
+                required: true
+                type: str
+            token:
+                description: The Logtail API Token of the account.
+                required: true
+                type: str
+            rate:
+                description: Maximum API requests per second for this account, unlimited when not set.
+                required: false
+                type: float
+    account_concurrency:
+        description: Maximum number of accounts processed at once.
+        required: false
+        default: 8
+        type: int
+'''
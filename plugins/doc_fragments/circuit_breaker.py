@@ -0,0 +1,34 @@
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    circuit_breaker_file:
+        description:
+            - Path of a state file shared by every task on the controller to stop calling the API during an outage.
+            - After I(circuit_breaker_threshold) consecutive connection errors or 5xx responses, tasks fail at once
+              instead of waiting for their own timeouts.
+            - Rate limited (429) responses do not open the circuit.
+            - After I(circuit_breaker_reset) seconds one task is let through to probe the API,
+              its success closes the circuit for all tasks.
+            - With I(accounts) each account has its own state file, named after this path with C(.<alias>) appended.
+            - Calls made through the local API daemon, see I(daemon_socket), do not use it.
+        required: false
+        type: path
+    circuit_breaker_threshold:
+        description: Consecutive failures that open the circuit.
+        required: false
+        default: 5
+        type: int
+    circuit_breaker_reset:
+        description: Seconds the circuit stays open before a probe request is let through.
+        required: false
+        default: 30
+        type: int
+'''
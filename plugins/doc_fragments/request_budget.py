@@ -0,0 +1,27 @@
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+
+class ModuleDocFragment(object):
+
+    DOCUMENTATION = r'''
+options:
+    timeout:
+        description:
+            - Seconds to wait for each API request.
+            - Uses the 10 second default of C(open_url) when not set.
+        required: false
+        type: int
+    deadline:
+        description:
+            - Seconds the task may spend on API requests in total, across listing pages, waits for coalesced requests
+              and parallel updates.
+            - Once exceeded no further request is sent and the task fails with C(deadline_exceeded) set,
+              returning what was done so far.
+            - Calls made through the local API daemon, see I(daemon_socket), pass both limits on to the daemon.
+        required: false
+        type: int
+'''
@@ -0,0 +1,73 @@
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+name: logtail_index
+short_description: Key a list of Logtail sources by one of their fields.
+version_added: "2.12.0"
+description:
+    - Build a dict of sources keyed by I(key), so later lookups do not scan the whole list.
+    - Keys are strings, numbers are keyed in their JSON form.
+    - When several sources share a key the first one is kept. Sources without a value for I(key) are left out.
+options:
+    _input:
+        description: A list of sources, such as the C(sources) returned by M(sd_hardy.logtail.logtail_source_info).
+        type: list
+        elements: dict
+        required: true
+    key:
+        description: The source field to key by.
+        type: str
+        default: id
+        choices:
+        - id
+        - name
+        - table_name
+author:
+    - Skyler Hardy (https://github.com/sd-hardy)
+'''
+
+EXAMPLES = r'''
+- name: Index the sources by name once
+  ansible.builtin.set_fact:
+    logtail_sources_by_name: "{{ sources.sources | sd_hardy.logtail.logtail_index('name') }}"
+
+- name: Look up the source of each host
+  ansible.builtin.debug:
+    msg: "{{ logtail_sources_by_name[inventory_hostname].token }}"
+'''
+
+RETURN = r'''
+_value:
+    description: The sources keyed by I(key).
+    type: dict
+'''
+
+from ansible.errors import AnsibleFilterError
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import index_sources
+
+KEYS = ('id', 'name', 'table_name')
+
+
+def logtail_index(sources, key='id'):
+    if key not in KEYS:
+        raise AnsibleFilterError(
+            "logtail_index key must be one of %s, got %s"
+            % (', '.join(KEYS), key))
+    if not isinstance(sources, list):
+        raise AnsibleFilterError(
+            "logtail_index expects a list of sources, got %s"
+            % type(sources).__name__)
+    return index_sources(sources, key)[0]
+
+
+class FilterModule(object):
+
+    def filters(self):
+        return {
+            'logtail_index': logtail_index,
+        }
@@ -0,0 +1,98 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It runs one operation against several Logtail accounts at once. Every
+account gets its own client, keep-alive connections and optional rate
+limit, so a slow or throttled account does not hold the others back.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_accounts import account_clients, fan_out
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError
+
+
+def accounts_argument_spec():
+    """ The options of the accounts documentation fragment """
+    return dict(
+        accounts=dict(
+            type='list', elements='dict', required=False, default=None,
+            options=dict(
+                alias=dict(type='str', required=True),
+                token=dict(type='str', required=True, no_log=True),
+                rate=dict(type='float', required=False, default=None),
+            )),
+        account_concurrency=dict(type='int', required=False, default=8),
+    )
+
+
+def check_accounts(params):
+    """ Return why the accounts param cannot be used, or None. Exclusion
+    with token is left to the module's argument constraints. """
+    if params.get('accounts') is None:
+        return None
+    aliases = [account['alias'] for account in params['accounts']]
+    if not aliases:
+        return "accounts must list at least one account"
+    for alias in aliases:
+        if aliases.count(alias) > 1:
+            return "The account alias %s is used more than once" % alias
+    return None
+
+
+def account_clients(accounts, configure=None):
+    """ Return a list of (alias, client) for the `accounts` param. Each
+    client keeps its own pool of connections, shared by its threads, and,
+    with a `rate`, its own limit of requests per second. Hosts behind a
+    proxy from the environment are still reached through open_url.
+    configure(client, alias) applies the shared settings. """
+    # Imported on demand to keep the default startup lean
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_transport import LogtailKeepAliveTransport, LogtailRateLimiter
+    clients = list()
+    for account in accounts:
+        client = LogtailApiClient(account['token'])
+        client.transport = LogtailKeepAliveTransport()
+        if account.get('rate'):
+            client.limiter = LogtailRateLimiter(account['rate'])
+        if configure is not None:
+            configure(client, account['alias'])
+        clients.append((account['alias'], client))
+    return clients
+
+
+def fan_out(fn, clients, concurrency=8, errors=(LogtailApiError,)):
+    """ Call fn(alias, client) for every (alias, client) on a thread pool,
+    at most `concurrency` accounts at once. Returns a list of
+    (alias, result, error, elapsed) in input order, where error is the
+    exception of `errors` raised for that account and elapsed the seconds
+    it took. The connections of the clients are closed once every account
+    is done. """
+
+    def call(entry):
+        alias, client = entry
+        started = time.time()
+        try:
+            return alias, fn(alias, client), None, time.time() - started
+        except errors as e:
+            return alias, None, e, time.time() - started
+
+    workers = max(1, min(concurrency, len(clients)))
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            return list(pool.map(call, clients))
+    finally:
+        for alias, client in clients:
+            if hasattr(client.transport, 'close'):
+                client.transport.close()
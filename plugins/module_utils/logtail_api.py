@@ -14,34 +14,307 @@ To use this module, include it as part of a custom module as shown below:
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import codecs
+import io
 import json
+import socket
+import time
+import zlib
 from json import JSONDecodeError
-from ansible.module_utils.urls import open_url
 from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
 from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
 
 
+def open_url(*args, **kwargs):
+    """ Load ansible.module_utils.urls on first use, it is the slowest
+    import of the modules and is not needed when a transport is set """
+    from ansible.module_utils.ansible_release import __version__
+    from ansible.module_utils.urls import open_url as _open_url
+    # Since ansible-core 2.14 open_url gunzips whole bodies on its own, the
+    # client decodes them incrementally instead
+    if tuple(int(part) for part in __version__.split('.')[:2]) >= (2, 14):
+        kwargs.setdefault('decompress', False)
+    return _open_url(*args, **kwargs)
+
+
+class LogtailDecodedResponse():
+    """ Wraps a gzip or deflate encoded response, decompressing the body
+    chunk by chunk as it is read """
+
+    chunk_size = 65536
+
+    def __init__(self, response):
+        self.response = response
+        self.status = getattr(response, 'status', None)
+        self.headers = response.headers
+        # 47 accepts both gzip and zlib wrapped data
+        self.decoder = zlib.decompressobj(47)
+        self.started = False
+        self.buffer = b''
+        self.eof = False
+
+    def _decompress(self, chunk):
+        try:
+            return self.decoder.decompress(chunk)
+        except zlib.error:
+            if self.started:
+                raise
+            # Some servers send deflate without the zlib wrapper
+            self.decoder = zlib.decompressobj(-15)
+            return self.decoder.decompress(chunk)
+
+    def read(self, size=-1):
+        try:
+            while not self.eof and (size is None or size < 0 or
+                                    len(self.buffer) < size):
+                chunk = self.response.read(self.chunk_size)
+                if not chunk:
+                    self.buffer += self.decoder.flush()
+                    self.eof = True
+                    if self.started and not self.decoder.eof:
+                        raise LogtailApiError(
+                            "The compressed response from the server was "
+                            "truncated")
+                else:
+                    self.buffer += self._decompress(chunk)
+                    self.started = True
+        except zlib.error as e:
+            raise LogtailApiError(
+                "Error decompressing response from server. Reason: %s" % e)
+        if size is None or size < 0:
+            data, self.buffer = self.buffer, b''
+        else:
+            data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+
+def decoded_response(response):
+    """ Return the response wrapped to decompress its body if needed """
+    headers = getattr(response, 'headers', None)
+    encoding = headers.get('Content-Encoding') if headers is not None \
+        else None
+    if encoding and encoding.lower() in ('gzip', 'deflate'):
+        return LogtailDecodedResponse(response)
+    return response
+
+
+class LogtailJsonStream():
+    """ Decodes a JSON object as its response is read, handing each element
+    of the `data` array to a callback as soon as it is complete. Only the
+    element being decoded is held in memory, not the whole body. """
+
+    chunk_size = 65536
+
+    def __init__(self, response):
+        self.response = response
+        self.decoder = json.JSONDecoder()
+        self.text = codecs.getincrementaldecoder('utf-8')()
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+
+    def _fill(self):
+        """ Append the next chunk of the body, returns False at its end """
+        if self.eof:
+            return False
+        chunk = self.response.read(self.chunk_size)
+        if not chunk:
+            self.eof = True
+            self.buffer += self.text.decode(b'', final=True)
+            return False
+        if isinstance(chunk, bytes):
+            chunk = self.text.decode(chunk)
+        # Drop what was already decoded
+        self.buffer = self.buffer[self.pos:] + chunk
+        self.pos = 0
+        return True
+
+    def _peek(self):
+        """ Return the next non-whitespace character, '' at the end """
+        while True:
+            while self.pos < len(self.buffer) and \
+                    self.buffer[self.pos] in ' \t\n\r':
+                self.pos += 1
+            if self.pos < len(self.buffer):
+                return self.buffer[self.pos]
+            if not self._fill():
+                return ''
+
+    def _expect(self, chars):
+        char = self._peek()
+        if not char or char not in chars:
+            raise JSONDecodeError(
+                "Expecting one of '%s'" % chars, self.buffer, self.pos)
+        self.pos += 1
+        return char
+
+    def _value(self):
+        self._peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+            except JSONDecodeError:
+                # The value may continue in the next chunk
+                if self._fill():
+                    continue
+                raise
+            # So may a number ending the chunk, which decodes short when
+            # the chunk ends right after its digits, '.', exponent or sign
+            if not self.buffer[end:].strip('0123456789.eE+-') and \
+                    self._fill():
+                continue
+            self.pos = end
+            return value
+
+    def _items(self, item):
+        items = list()
+        if self._peek() == ']':
+            self.pos += 1
+            return items
+        while True:
+            items.append(item(self._value()))
+            if self._expect(',]') == ']':
+                return items
+
+    def decode(self, item):
+        """ Return the decoded object, with each element of its `data`
+        array replaced by item(element) """
+        result = dict()
+        self._expect('{')
+        if self._peek() == '}':
+            self.pos += 1
+        else:
+            while True:
+                if self._peek() != '"':
+                    raise JSONDecodeError(
+                        "Expecting property name enclosed in double quotes",
+                        self.buffer, self.pos)
+                key = self._value()
+                self._expect(':')
+                if key == 'data' and self._peek() == '[':
+                    self.pos += 1
+                    result[key] = self._items(item)
+                else:
+                    result[key] = self._value()
+                if self._expect(',}') == '}':
+                    break
+        if self._peek():
+            raise JSONDecodeError("Extra data", self.buffer, self.pos)
+        return result
+
+
 class LogtailApiError(Exception):
-    def __init__(self, msg):
+    def __init__(self, msg, status=None):
         self.msg = msg
+        # HTTP status code, None when no response was received
+        self.status = status
+
+
+class LogtailConnectionError(LogtailApiError):
+    """ Raised when the API could not be reached or did not answer in
+    time, as opposed to an answer that could not be used """
+
+
+class LogtailDeadlineError(LogtailApiError):
+    """ Raised once the deadline of an operation has passed. `partial`
+    holds what was fetched before, when the operation collects results. """
+
+    def __init__(self, msg, partial=None):
+        super(LogtailDeadlineError, self).__init__(msg)
+        self.partial = partial
+
+
+def fail_api_error(module, result, error, progress=None):
+    """ Fail the module with the message of `error`, flagging in `result`
+    whether its deadline was exceeded and failing the optional `progress` """
+    if isinstance(error, LogtailDeadlineError):
+        result['deadline_exceeded'] = True
+    if progress is not None:
+        progress.fail(error.msg)
+    return module.fail_json(msg=error.msg, **result)
+
+
+def budget_argument_spec():
+    """ The options of the request_budget documentation fragment """
+    return dict(
+        timeout=dict(type='int', required=False, default=None),
+        deadline=dict(type='int', required=False, default=None),
+    )
 
 
 class LogtailApiClient():
 
-    def __init__(self, token):
+    def __init__(self, token, singleflight=None):
+        self.token = token
+        # Optional LogtailSingleFlight used to coalesce identical GETs
+        self.singleflight = singleflight
+        # Optional open_url replacement and rate limiter, see logtail_daemon
+        self.transport = None
+        self.limiter = None
+        # Optional LogtailCircuitBreaker shared by parallel processes
+        self.breaker = None
+        # Seconds per request, and time.time() by which the whole
+        # operation must finish. None keeps the open_url default
+        self.timeout = None
+        self.deadline = None
+        # Optional LogtailHttpCache used to send conditional GETs
+        self.http_cache = None
+        # Optional LogtailJobProgress updated as listing pages arrive
+        self.progress = None
         self.baseurl = 'https://logtail.com/api'
         self.api_version = 1
         self.api_endpoint = 'sources'
+        # Listing order used by incremental syncs, newest changes first.
+        # The API does not promise to honour it, incremental syncs only
+        # stop paging early when changes_ordered is set
+        self.changes_query = 'sort=-updated_at'
+        self.changes_ordered = False
         self.agent = "ansible-logtail (Python-urllib/3.8)"
         self.headers = dict(
             Authorization='Bearer %s' % token
         )
+        # Listing pages are large JSON documents that compress well
+        self.headers['Accept-Encoding'] = 'gzip, deflate'
+
+    def close(self):
+        """ Release the connections held by the client. The plain client
+        keeps none, see LogtailDaemonClient. """
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def set_budget(self, timeout=None, deadline=None):
+        """ Bound each request to `timeout` seconds and every request made
+        from now on to `deadline` seconds in total """
+        self.timeout = timeout
+        self.deadline = time.time() + deadline if deadline else None
+
+    def _remaining(self):
+        """ Return the seconds left before the deadline, None without one.
+        Raises LogtailDeadlineError once it has passed. """
+        if self.deadline is None:
+            return None
+        remaining = self.deadline - time.time()
+        if remaining <= 0:
+            raise LogtailDeadlineError(
+                "The operation did not finish before its deadline")
+        return remaining
+
+    def _request_timeout(self):
+        remaining = self._remaining()
+        if remaining is None or self.timeout is None:
+            return self.timeout if remaining is None else remaining
+        return min(self.timeout, remaining)
 
     def _build_url(
             self,
             version=None,
             endpoint=None,
-            source=None):
+            source=None,
+            query=None):
         url = self.baseurl + '/v'
         url += str(version) + '/' if version is not \
             None else str(self.api_version) + '/'
@@ -49,6 +322,8 @@ class LogtailApiClient():
             else self.api_endpoint
         if source:
             url += '/' + str(source)
+        if query:
+            url += '?' + query
         return url
 
     def _format_payload(self, source):
@@ -78,38 +353,100 @@ class LogtailApiClient():
             table_name=source['attributes']['table_name'],
             team_id=source['attributes']['team_id'])
 
-    def request(self, method='GET', url=None, data=None):
-        """ Make a request to the Logtail API """
+    def _compact_source(self, source):
+        return self._format_source(source).get_dict()
+
+    def request(self, method='GET', url=None, data=None, item=None):
+        """ Make a request to the Logtail API.
+
+        With `item` the `data` array of the response is decoded as it is
+        read, each element replaced by item(element). """
         if not url:
             url = self._build_url()
+        if method == 'GET' and self.singleflight is not None:
+            # The budget and the connection of the leader are its own, the
+            # other processes try for themselves
+            return self.singleflight.do(
+                self.singleflight.key(self.token, method, url),
+                lambda: self._request(method, url, data, item),
+                error=LogtailApiError,
+                deadline=self.deadline,
+                transient=(LogtailConnectionError, LogtailDeadlineError))
+        return self._request(method, url, data, item)
+
+    def _request(self, method, url, data, item=None):
+        if self.breaker is not None:
+            return self.breaker.call(self._send, method, url, data, item)
+        return self._send(method, url, data, item)
+
+    def _decode(self, body, item):
+        if item is None:
+            return json.loads(body)
+        if not isinstance(body, bytes):
+            body = body.encode('utf-8')
+        return LogtailJsonStream(io.BytesIO(body)).decode(item)
+
+    def _send(self, method, url, data, item=None):
+        timeout = self._request_timeout()
+        if self.limiter is not None:
+            self.limiter.acquire()
+        opener = self.transport if self.transport is not None else open_url
+        kwargs = dict()
+        if timeout is not None:
+            kwargs['timeout'] = timeout
+        headers = self.headers
+        cached = None
+        if method == 'GET' and self.http_cache is not None:
+            cached = self.http_cache.get(self.token, url)
+            if cached is not None:
+                headers = dict(self.headers)
+                headers.update(self.http_cache.conditions(cached))
         try:
-            response = open_url(
+            response = opener(
                 url,
                 method=method,
                 data=data,
-                headers=self.headers,
-                http_agent=self.agent
+                headers=headers,
+                http_agent=self.agent,
+                **kwargs
             )
             # Handle empty success repsonse
             if response.status == 204:
                 return True
-            resp_obj = json.loads(response.read())
+            # Transports that do not raise on 304 return it directly
+            if response.status == 304 and cached is not None:
+                return self._decode(cached['body'], item)
+            response = decoded_response(response)
+            validators = None
+            if method == 'GET' and self.http_cache is not None:
+                validators = self._validators(response)
+            if item is None or validators:
+                # The cache stores the body as it was sent
+                body = response.read()
+                resp_obj = self._decode(body, item)
+            else:
+                resp_obj = LogtailJsonStream(response).decode(item)
             # Catch empty API response
             if 'data' not in resp_obj:
                 raise LogtailApiError(
-                    "Invalid response from API. Status"
-                    "URL: %s code: %i, Response Body: %s"
-                    % (url, response.status, response.read())
+                    "Invalid response from API. "
+                    "URL: %s, Status code: %i, Response Body: %s"
+                    % (url, response.status, json.dumps(resp_obj))
                 )
+            if validators:
+                self.http_cache.put(self.token, url, body=body, **validators)
             return resp_obj
         except HTTPError as error:
+            # Not modified since the stored response
+            if error.status == 304 and cached is not None:
+                return self._decode(cached['body'], item)
             message = error.reason
             # Capture error message from API response
             if 'Content-type' in error.headers and \
                     'application/json' in \
                     error.headers['Content-type'].lower():
                 try:
-                    resp_body = error.read()
+                    resp_body = decoded_response(error).read()
                     resp_obj = json.loads(resp_body)
                     # Return false from 404
                     if error.status == 404:
@@ -125,7 +462,8 @@ class LogtailApiClient():
             raise LogtailApiError(
                 "Unable to complete API request. "
                 "URL: %s, Status code: %i, Reason: %s"
-                % (url, error.status, message)
+                % (url, error.status, message),
+                status=error.status
             )
         except JSONDecodeError as err:
             raise LogtailApiError(
@@ -134,10 +472,27 @@ class LogtailApiClient():
                 % (err.msg, err.doc, err.pos)
             )
         except URLError as error:
-            raise LogtailApiError(
+            raise LogtailConnectionError(
                 "Unable to complete API request. "
                 "Reason: %s" % error.reason
             )
+        except socket.timeout:
+            raise LogtailConnectionError(
+                "Unable to complete API request. "
+                "Reason: timed out reading the response from %s" % url
+            )
+
+    def _validators(self, response):
+        """ Return the ETag and Last-Modified of a response, None when it
+        has neither """
+        headers = getattr(response, 'headers', None)
+        if headers is None:
+            return None
+        etag = headers.get('ETag')
+        last_modified = headers.get('Last-Modified')
+        if etag or last_modified:
+            return dict(etag=etag, last_modified=last_modified)
+        return None
 
     def get_source(self, source_id):
         response = self.request(
@@ -181,17 +536,72 @@ class LogtailApiClient():
             return self._format_source(response['data'])
         return False
 
+    def get_source_page(self, url=None):
+        """ Return a page of the source listing as a list of dicts and the
+        URL of the next page, or None on the last one. The page is False if
+        the API returns an empty response. """
+        # Records are built as the page is read, the page is never held in
+        # memory as a whole
+        response = self.request(url=url, item=self._compact_source)
+        if not response or 'data' not in response:
+            return False, None
+        return response['data'], response['pagination']['next']
+
+    def iter_source_pages(self, url=None):
+        """ Yield each page of the source listing as a list of dicts.
+        Yields False and stops if the API returns an empty response. """
+        while True:
+            page, url = self.get_source_page(url)
+            if page is False:
+                yield False
+                return
+            if self.progress is not None:
+                self.progress.advance(pages=1, items=len(page))
+            yield page
+            if url is None:
+                return
+
     def get_all_sources(self):
-        url = None
         sources = list()
-        while True:
-            response = self.request(url=url)
-            if response and 'data' in response:
-                for source in response['data']:
-                    sources.append(self._format_source(source).get_dict())
-                if response['pagination']['next'] is not None:
-                    url = response['pagination']['next']
-                else:
-                    break
-            else: return False
+        try:
+            for page in self.iter_source_pages():
+                if page is False:
+                    return False
+                sources.extend(page)
+        except LogtailDeadlineError as e:
+            e.partial = sources
+            raise
         return sources
+
+    def get_sources_since(self, since, reconcile=False):
+        """ Return sources updated after the `since` timestamp.
+
+        The listing is requested newest change first. When the client
+        knows the API honours that order (`changes_ordered`) paging stops
+        at the first page that only holds records up to `since`, unless
+        `reconcile` asks for every page. Otherwise, or if the pages turn
+        out not to be ordered, the whole listing is walked.
+
+        Returns a tuple of (sources, seen_ids, complete), where `complete`
+        is True when every page was read and `seen_ids` holds the ID of
+        every source in the account.
+        """
+        sources = list()
+        seen_ids = set()
+        ordered = True
+        previous = None
+        url = self._build_url(query=self.changes_query)
+        for page in self.iter_source_pages(url):
+            if page is False:
+                return False, seen_ids, False
+            for source in page:
+                seen_ids.add(source['id'])
+                if previous is not None and source['updated_at'] > previous:
+                    ordered = False
+                previous = source['updated_at']
+                if source['updated_at'] > since:
+                    sources.append(source)
+            if self.changes_ordered and not reconcile and ordered and \
+                    page and page[-1]['updated_at'] <= since:
+                return sources, seen_ids, False
+        return sources, seen_ids, True
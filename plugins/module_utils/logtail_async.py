@@ -0,0 +1,370 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by controller side plugins of the logtail ansible
+collection.
+
+It provides an asyncio variant of LogtailApiClient with a small HTTP/1.1
+transport built on asyncio streams, so many API requests can be in flight
+on one thread. It needs Python 3.7 or later and must not be imported by
+modules that may run on older managed hosts.
+
+The transport connects to the API directly. When the environment sets a
+proxy for the API host, see https_proxy and no_proxy, requests are made
+with open_url on the default executor instead, which uses the proxy.
+
+No plugin of the collection uses it yet, it is a building block for
+controller side plugins. Modules keep using LogtailApiClient.
+
+To use this module, include it as part of a plugin as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_async import LogtailAsyncApiClient
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import asyncio
+import json
+import ssl
+import time
+from json import JSONDecodeError
+from urllib.error import HTTPError
+from urllib.parse import urlsplit
+from urllib.request import getproxies, proxy_bypass
+
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailConnectionError, LogtailDecodedResponse, open_url
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_concurrency import LogtailAdaptiveConcurrency
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+
+
+class LogtailAsyncResponse():
+
+    def __init__(self, status, reason, headers, body):
+        self.status = status
+        self.reason = reason
+        self.headers = headers
+        self.body = body
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            body, self.body = self.body, b''
+        else:
+            body, self.body = self.body[:size], self.body[size:]
+        return body
+
+
+class LogtailAsyncTransport():
+    """ A minimal HTTP/1.1 client keeping idle connections for reuse """
+
+    def __init__(self, timeout=30, ssl_context=None):
+        self.timeout = timeout
+        self.ssl_context = ssl_context
+        self.idle = dict()
+
+    async def _open(self, scheme, host, port, fresh=False):
+        key = (scheme, host, port)
+        if not fresh and self.idle.get(key):
+            return self.idle[key].pop(), True
+        context = None
+        if scheme == 'https':
+            context = self.ssl_context or ssl.create_default_context()
+        reader, writer = await asyncio.open_connection(
+            host, port, ssl=context)
+        return (reader, writer), False
+
+    def _discard(self, opened):
+        for conn, reused in opened:
+            conn[1].close()
+
+    def _release(self, key, conn, reuse):
+        if reuse:
+            self.idle.setdefault(key, list()).append(conn)
+        else:
+            conn[1].close()
+
+    async def _read_body(self, reader, headers, method, status):
+        if method == 'HEAD' or status in (204, 304) or status < 200:
+            return b''
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = list()
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    # Skip trailers up to the closing blank line
+                    while (await reader.readline()) not in (b'\r\n', b''):
+                        pass
+                    return b''.join(chunks)
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+        if 'content-length' in headers:
+            return await reader.readexactly(int(headers['content-length']))
+        return await reader.read()
+
+    async def _exchange(self, conn, method, target, headers, data):
+        reader, writer = conn
+        lines = ['%s %s HTTP/1.1' % (method, target)]
+        lines.extend('%s: %s' % item for item in headers.items())
+        writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1'))
+        if data:
+            writer.write(data)
+        await writer.drain()
+        status_line = await reader.readline()
+        if not status_line:
+            raise ConnectionResetError('Connection closed by the server')
+        # The reason phrase may be left out, as in 'HTTP/1.1 200'
+        parts = status_line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        status = parts[1]
+        reason = parts[2] if len(parts) > 2 else ''
+        resp_headers = dict()
+        while True:
+            line = (await reader.readline()).decode('latin-1').rstrip('\r\n')
+            if not line:
+                break
+            key, value = line.split(':', 1)
+            resp_headers[key.strip().lower()] = value.strip()
+        body = await self._read_body(
+            reader, resp_headers, method, int(status))
+        reuse = resp_headers.get('connection', '').lower() != 'close' \
+            and ('content-length' in resp_headers or
+                 'transfer-encoding' in resp_headers or
+                 method == 'HEAD' or int(status) in (204, 304))
+        return LogtailAsyncResponse(
+            int(status), reason, resp_headers, body), reuse
+
+    async def _round_trip(self, key, fresh, opened, method, target, headers,
+                          data):
+        """ Connect, including the TLS handshake, and exchange one request
+        within a single timeout. The connection and whether it was reused
+        are appended to `opened` so the caller can close it. """
+        conn, reused = await self._open(*key, fresh=fresh)
+        opened.append((conn, reused))
+        return await self._exchange(conn, method, target, headers, data)
+
+    def _proxied(self, scheme, host):
+        """ Return True when the environment sets a proxy for host """
+        return scheme in getproxies() and not proxy_bypass(host)
+
+    def _open_url(self, url, method, data, headers):
+        """ Make a request with open_url, which uses the proxy """
+        try:
+            response = open_url(
+                url, method=method, data=data, headers=headers,
+                timeout=self.timeout)
+        except HTTPError as error:
+            response = error
+        resp_headers = dict(
+            (key.lower(), value) for key, value in response.headers.items())
+        return LogtailAsyncResponse(
+            response.getcode(), response.reason, resp_headers,
+            response.read())
+
+    async def request(self, url, method='GET', data=None, headers=None):
+        parts = urlsplit(url)
+        if self._proxied(parts.scheme, parts.hostname):
+            return await asyncio.get_running_loop().run_in_executor(
+                None, self._open_url, url, method, data, headers)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        key = (parts.scheme, parts.hostname, port)
+        target = parts.path + ('?' + parts.query if parts.query else '')
+        headers = dict(headers or dict())
+        headers['Host'] = parts.netloc
+        headers['Content-Length'] = str(len(data) if data else 0)
+        if data:
+            headers.setdefault(
+                'Content-Type', 'application/x-www-form-urlencoded')
+        fresh = False
+        while True:
+            opened = list()
+            try:
+                response, reuse = await asyncio.wait_for(
+                    self._round_trip(
+                        key, fresh, opened, method, target, headers, data),
+                    self.timeout)
+            except (ConnectionError, asyncio.IncompleteReadError):
+                reused = any(reused for conn, reused in opened)
+                self._discard(opened)
+                if reused:
+                    # The server closed an idle connection, retry once on
+                    # a new one
+                    fresh = True
+                    continue
+                raise
+            except BaseException:
+                self._discard(opened)
+                raise
+            self._release(key, opened[0][0], reuse)
+            return response
+
+    async def close(self):
+        for conns in self.idle.values():
+            for reader, writer in conns:
+                writer.close()
+        self.idle = dict()
+
+
+class LogtailAdaptiveSlot():
+    """ Holds requests back while the LogtailAdaptiveConcurrency limit
+    is reached, without blocking the event loop. """
+
+    def __init__(self, controller):
+        self.controller = controller
+        self.in_flight = 0
+        self.cond = asyncio.Condition()
+
+    async def __aenter__(self):
+        async with self.cond:
+            await self.cond.wait_for(
+                lambda: self.in_flight < self.controller.limit)
+            self.in_flight += 1
+
+    async def __aexit__(self, *exc):
+        async with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+
+class LogtailAsyncApiClient():
+    """ An asyncio mirror of LogtailApiClient.
+
+    At most `concurrency` requests are in flight at once, shared by every
+    coroutine using this client. Pass a LogtailAdaptiveConcurrency instead
+    of a number to adjust the limit to the API's responses.
+    """
+
+    def __init__(self, token, concurrency=10, timeout=30, transport=None):
+        # The sync client supplies URLs, payloads and source formatting
+        self.client = LogtailApiClient(token)
+        self.concurrency = concurrency
+        self.transport = transport if transport is not None \
+            else LogtailAsyncTransport(timeout)
+        self._semaphore = None
+
+    def _slot(self):
+        if self._semaphore is None:
+            if isinstance(self.concurrency, LogtailAdaptiveConcurrency):
+                self._semaphore = LogtailAdaptiveSlot(self.concurrency)
+            else:
+                self._semaphore = asyncio.Semaphore(self.concurrency)
+        return self._semaphore
+
+    def _record(self, started, status=None, error=False):
+        if isinstance(self.concurrency, LogtailAdaptiveConcurrency):
+            self.concurrency.record(
+                time.time() - started, status=status, error=error)
+
+    def _decode(self, url, body):
+        try:
+            return json.loads(body)
+        except JSONDecodeError as err:
+            raise LogtailApiError(
+                "Error decoding response from server. "
+                "Reason: %s. %s %s"
+                % (err.msg, err.doc, err.pos)
+            )
+
+    async def request(self, method='GET', url=None, data=None):
+        """ Make a request to the Logtail API """
+        if not url:
+            url = self.client._build_url()
+        headers = dict(self.client.headers)
+        headers['User-Agent'] = self.client.agent
+        async with self._slot():
+            started = time.time()
+            try:
+                response = await self.transport.request(
+                    url, method=method, data=data, headers=headers)
+            except (OSError, asyncio.TimeoutError,
+                    asyncio.IncompleteReadError, ValueError) as error:
+                self._record(started, error=True)
+                raise LogtailConnectionError(
+                    "Unable to complete API request. "
+                    "Reason: %s" % (str(error) or type(error).__name__)
+                )
+            self._record(
+                started, response.status, error=response.status >= 400)
+        if response.status == 204:
+            return True
+        if response.headers.get('content-encoding', '').lower() in \
+                ('gzip', 'deflate'):
+            response.body = LogtailDecodedResponse(response).read()
+        is_json = 'application/json' in \
+            response.headers.get('content-type', '').lower()
+        if response.status >= 400:
+            message = response.reason
+            if is_json:
+                resp_obj = self._decode(url, response.body)
+                if response.status == 404:
+                    return False
+                if 'errors' in resp_obj:
+                    message = resp_obj['errors']
+            raise LogtailApiError(
+                "Unable to complete API request. "
+                "URL: %s, Status code: %i, Reason: %s"
+                % (url, response.status, message),
+                status=response.status
+            )
+        resp_obj = self._decode(url, response.body)
+        if 'data' not in resp_obj:
+            raise LogtailApiError(
+                "Invalid response from API. "
+                "URL: %s, Status code: %i, Response Body: %s"
+                % (url, response.status, response.body)
+            )
+        return resp_obj
+
+    async def get_source(self, source_id):
+        response = await self.request(
+            url=self.client._build_url(source=source_id))
+        if response and 'data' in response:
+            return self.client._format_source(response['data'])
+        return False
+
+    async def update_source(self, source_id, name, autogen, ingest):
+        response = await self.request(
+            method='PATCH',
+            url=self.client._build_url(source=source_id),
+            data=self.client._format_payload(LogtailSource(
+                name=name,
+                autogen_views=autogen,
+                ingest_paused=ingest
+            ))
+        )
+        if response and 'data' in response:
+            return self.client._format_source(response['data'])
+        return False
+
+    async def remove_source(self, source_id):
+        return await self.request(
+            method='DELETE',
+            url=self.client._build_url(source=source_id))
+
+    async def create_source(self, name, platform):
+        response = await self.request(
+            method='POST',
+            data=self.client._format_payload(LogtailSource(
+                name=name,
+                platform=platform
+            ))
+        )
+        if response and 'data' in response:
+            return self.client._format_source(response['data'])
+        return False
+
+    async def get_all_sources(self):
+        url = None
+        sources = list()
+        while True:
+            response = await self.request(url=url)
+            if not response or 'data' not in response:
+                return False
+            for source in response['data']:
+                sources.append(self.client._format_source(source).get_dict())
+            if response['pagination']['next'] is None:
+                return sources
+            url = response['pagination']['next']
+
+    async def close(self):
+        await self.transport.close()
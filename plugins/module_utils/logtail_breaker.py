@@ -0,0 +1,170 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It provides a circuit breaker shared by every module process on a machine
+through a state file. After `threshold` consecutive connection errors or
+5xx responses the circuit opens and requests fail at once instead of each
+waiting for its own timeout. Rate limited (429) responses are left to the
+adaptive concurrency. Once `reset_timeout` seconds have passed a
+single process is let through as a probe, closing the circuit if it
+succeeds and opening it again if it fails.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_breaker import LogtailCircuitBreaker
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import fcntl
+import json
+import os
+import re
+import time
+
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError, LogtailConnectionError, LogtailDeadlineError
+
+
+class LogtailCircuitBreaker():
+
+    def __init__(self, path, threshold=5, reset_timeout=30):
+        self.path = os.path.expanduser(path)
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+
+    def _read(self):
+        """ Return the state without locking, for the common case of a
+        closed circuit """
+        try:
+            with open(self.path, 'r') as f:
+                return json.loads(f.read() or '{}')
+        except (IOError, OSError, ValueError):
+            return dict()
+
+    def _update(self, fn):
+        """ Apply fn to the state under an exclusive lock, persisting the
+        changes it makes. Returns what fn returns. """
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            with os.fdopen(fd, 'r+') as f:
+                fcntl.flock(f, fcntl.LOCK_EX)
+                try:
+                    state = json.loads(f.read() or '{}')
+                except ValueError:
+                    state = dict()
+                state.setdefault('failures', 0)
+                state.setdefault('opened_at', None)
+                state.setdefault('probe_at', None)
+                result = fn(state)
+                f.seek(0)
+                f.truncate()
+                json.dump(state, f)
+                return result
+        except (IOError, OSError) as e:
+            raise LogtailApiError(
+                "Unable to update the circuit breaker file %s. Reason: %s"
+                % (self.path, e))
+
+    def before(self):
+        """ Raise LogtailApiError while the circuit is open. Returns True
+        when the caller is the half-open probe. """
+        if self._read().get('opened_at') is None:
+            return False
+
+        def check(state):
+            if state['opened_at'] is None:
+                return False
+            now = time.time()
+            retry_in = state['opened_at'] + self.reset_timeout - now
+            if retry_in <= 0:
+                # One probe at a time, a probe that never reported back
+                # is replaced after another reset_timeout
+                if state['probe_at'] is None or \
+                        now - state['probe_at'] > self.reset_timeout:
+                    state['probe_at'] = now
+                    return True
+                retry_in = state['probe_at'] + self.reset_timeout - now
+            raise LogtailApiError(
+                "The Logtail API circuit is open after %i consecutive "
+                "failures, not sending requests for another %is"
+                % (state['failures'], max(1, int(retry_in))))
+        return self._update(check)
+
+    def success(self, probe=False):
+        state = self._read()
+        if not probe and not state.get('failures') and \
+                state.get('opened_at') is None:
+            return
+
+        def close(state):
+            state['failures'] = 0
+            state['opened_at'] = None
+            state['probe_at'] = None
+        self._update(close)
+
+    def failure(self, probe=False):
+        def count(state):
+            state['failures'] += 1
+            if probe or state['failures'] >= self.threshold:
+                state['opened_at'] = time.time()
+                state['probe_at'] = None
+        self._update(count)
+
+    def call(self, fn, *args):
+        """ Run fn(*args) through the breaker. Connection errors and 5xx
+        responses count as failures. Other API errors, such as a 429 or a
+        body that can not be decoded, show the API answered and count as
+        successes. A passed deadline sent no request and counts as neither.
+        """
+        probe = self.before()
+        try:
+            result = fn(*args)
+        except LogtailDeadlineError:
+            raise
+        except LogtailApiError as e:
+            if isinstance(e, LogtailConnectionError) or \
+                    e.status is not None and e.status >= 500:
+                self.failure(probe)
+            else:
+                self.success(probe)
+            raise
+        self.success(probe)
+        return result
+
+
+def breaker_argument_spec():
+    """ The options of the circuit_breaker documentation fragment """
+    return dict(
+        circuit_breaker_file=dict(type='path', required=False, default=None),
+        circuit_breaker_threshold=dict(type='int', required=False, default=5),
+        circuit_breaker_reset=dict(type='int', required=False, default=30),
+    )
+
+
+def account_path(path, alias):
+    """ Return the per account variant of a state file path """
+    return "%s.%s" % (path, re.sub(r'[^A-Za-z0-9_.-]', '_', alias))
+
+
+def circuit_breaker(params, alias=None):
+    """ Return the LogtailCircuitBreaker configured by the module params,
+    or None when circuit_breaker_file is not set. With an account alias
+    the state file is suffixed with it, so accounts trip separately. """
+    if params.get('circuit_breaker_file') is None:
+        return None
+    path = params['circuit_breaker_file']
+    if alias is not None:
+        path = account_path(path, alias)
+    return LogtailCircuitBreaker(
+        path,
+        threshold=params['circuit_breaker_threshold'],
+        reset_timeout=params['circuit_breaker_reset'])
@@ -0,0 +1,287 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It keeps a local snapshot of the source listing so that it can be refreshed
+incrementally instead of downloading every source on each run.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_cache import LogtailSourceCache
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError, LogtailConnectionError, LogtailDeadlineError
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import equal_source, match_source
+
+
+class LogtailCacheError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class LogtailSourceCache():
+
+    # Seconds between full listings used to reconcile deleted sources
+    reconcile_interval = 3600
+    # Seconds after which a background refresh lock is considered dead
+    lock_timeout = 600
+
+    def __init__(self, path, token=None):
+        self.path = os.path.expanduser(path)
+        if token is not None:
+            # A snapshot is only reused for the token that fetched it
+            self.path += '.' + hashlib.sha256(token.encode()).hexdigest()[:16]
+        self.synced_at = None
+        self.refreshed_at = None
+        self.reconciled_at = None
+        self.sources = dict()
+
+    def load(self):
+        """ Load the snapshot from disk, returns False if there is none """
+        try:
+            with open(self.path, 'r') as f:
+                snapshot = json.load(f)
+        except (IOError, OSError):
+            return False
+        except ValueError:
+            # A corrupt snapshot is treated as a missing one
+            return False
+        self.synced_at = snapshot.get('synced_at')
+        self.refreshed_at = snapshot.get('refreshed_at')
+        self.reconciled_at = snapshot.get('reconciled_at')
+        self.sources = dict(
+            (str(source['id']), source)
+            for source in snapshot.get('sources', list()))
+        return True
+
+    def save(self):
+        """ Atomically write the snapshot, readable by the owner only """
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.logtail')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(dict(
+                    synced_at=self.synced_at,
+                    refreshed_at=self.refreshed_at,
+                    reconciled_at=self.reconciled_at,
+                    sources=list(self.sources.values())
+                ), f)
+            os.replace(tmp, self.path)
+        except (IOError, OSError) as e:
+            raise LogtailCacheError(
+                "Unable to write source cache %s. Reason: %s"
+                % (self.path, e))
+
+    def get_sources(self):
+        return list(self.sources.values())
+
+    def get_sources_since(self, since):
+        return [source for source in self.sources.values()
+                if source['updated_at'] > since]
+
+    def find_sources(self, name=None, filter=None, since=None, match=None):
+        """ Return the sources matching a name or key-value filter,
+        using the same rules as logtail_source_info. Every field of
+        `match` must also be equal. """
+        sources = self.get_sources() if since is None \
+            else self.get_sources_since(since)
+        if match:
+            sources = [source for source in sources
+                       if equal_source(match, source)]
+        if name is not None:
+            return [source for source in sources if source['name'] == name]
+        if filter is not None:
+            return [source for source in sources
+                    if match_source(filter, source)]
+        return sources
+
+    def _watermark(self):
+        stamps = [source['updated_at'] for source in self.sources.values()]
+        return max(stamps) if stamps else None
+
+    def _replace(self, sources):
+        fresh = dict((str(source['id']), source) for source in sources)
+        removed = sorted(set(self.sources) - set(fresh))
+        changed = [
+            source for key, source in fresh.items()
+            if key not in self.sources or self.sources[key] != source]
+        self.sources = fresh
+        return changed, removed
+
+    def _upsert(self, sources):
+        changed = [
+            source for source in sources
+            if self.sources.get(str(source['id'])) != source]
+        for source in changed:
+            self.sources[str(source['id'])] = source
+        return changed
+
+    def _retain(self, ids):
+        seen = set(str(key) for key in ids)
+        removed = sorted(set(self.sources) - seen)
+        for key in removed:
+            del self.sources[key]
+        return removed
+
+    def refresh(self, client, full=False):
+        """ Bring the snapshot up to date and persist it.
+
+        A delta refresh only keeps sources changed since the last sync.
+        Deleted sources are reconciled from the set of IDs seen whenever the
+        whole listing ends up being walked. At least every
+        `reconcile_interval` seconds the walk is made to cover every page,
+        the unchanged sources are still not copied into the snapshot.
+
+        Returns a dict with the `changed` sources and `removed` IDs, or
+        False if the API returned an empty response.
+        """
+        now = time.time()
+        if full or self.synced_at is None:
+            sources = client.get_all_sources()
+            if sources is False:
+                return False
+            changed, removed = self._replace(sources)
+            self.reconciled_at = now
+        else:
+            reconcile = self.reconciled_at is None or \
+                now - self.reconciled_at > self.reconcile_interval
+            sources, seen_ids, complete = client.get_sources_since(
+                self.synced_at, reconcile=reconcile)
+            if sources is False:
+                return False
+            changed = self._upsert(sources)
+            removed = list()
+            if complete:
+                removed = self._retain(seen_ids)
+                self.reconciled_at = now
+        self.synced_at = self._watermark()
+        self.refreshed_at = now
+        self.save()
+        return dict(changed=changed, removed=removed)
+
+    def age(self):
+        if self.refreshed_at is None:
+            return None
+        return time.time() - self.refreshed_at
+
+    def _lock_path(self):
+        return self.path + '.lock'
+
+    def _acquire_refresh_lock(self):
+        lock = self._lock_path()
+        try:
+            if time.time() - os.path.getmtime(lock) > self.lock_timeout:
+                os.remove(lock)
+        except OSError:
+            pass
+        try:
+            os.close(os.open(lock, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+        except OSError:
+            return False
+        return True
+
+    def _release_refresh_lock(self):
+        try:
+            os.remove(self._lock_path())
+        except OSError:
+            pass
+
+    def _spawn(self, target):
+        """ Run target in a detached grandchild process.
+
+        The process running the module is forked, which is the controller
+        worker of the host when the module runs through its action plugin.
+        The grandchild only calls `target` and exits with os._exit, so none
+        of the worker's exit handlers run in it. """
+        pid = os.fork()
+        if pid:
+            os.waitpid(pid, 0)
+            return
+        try:
+            os.setsid()
+            if os.fork():
+                os._exit(0)
+            # Do not hold the module's stdout open, Ansible waits for EOF
+            devnull = os.open(os.devnull, os.O_RDWR)
+            for fd in (0, 1, 2):
+                os.dup2(devnull, fd)
+            target()
+        finally:
+            os._exit(0)
+
+    def refresh_in_background(self, client, full=False):
+        """ Start a refresh in a detached process unless one is running.
+        Returns True if a refresh was started. """
+        if not self._acquire_refresh_lock():
+            return False
+        cache_class = type(self)
+        path = self.path
+
+        def target():
+            try:
+                # Connections do not survive a fork, drop the copies of the
+                # parent's so calls open their own, and use a fresh instance
+                client.close()
+                cache = cache_class(path)
+                cache.load()
+                cache.refresh(client, full)
+            except (LogtailApiError, LogtailCacheError):
+                pass
+            finally:
+                cache_class(path)._release_refresh_lock()
+
+        try:
+            self._spawn(target)
+        except OSError:
+            self._release_refresh_lock()
+            return False
+        return True
+
+    def revalidate(self, client, ttl=0, stale_while_revalidate=0,
+                   stale_if_error=0, full=False):
+        """ Refresh the snapshot with stale-while-revalidate semantics.
+
+        A snapshot younger than `ttl` seconds is served as is. Up to
+        `stale_while_revalidate` seconds past the ttl it is served
+        immediately while a single background process refreshes it. Up to
+        `stale_if_error` seconds past the ttl it is served when the API
+        cannot be reached, answers with a 5xx or the deadline passed. Other
+        errors, such as a revoked token, are raised.
+
+        Returns the refresh result with an extra `stale` key, or False if
+        the API returned an empty response.
+        """
+        age = None if full else self.age()
+        if age is not None and age <= ttl:
+            return dict(changed=list(), removed=list(), stale=False)
+        if age is not None and age <= ttl + stale_while_revalidate:
+            self.refresh_in_background(client, full)
+            return dict(changed=list(), removed=list(), stale=True)
+        try:
+            changes = self.refresh(client, full)
+        except LogtailApiError as e:
+            outage = isinstance(
+                e, (LogtailConnectionError, LogtailDeadlineError)) or \
+                e.status is not None and e.status >= 500
+            if not outage or age is None or age > ttl + stale_if_error:
+                raise
+            return dict(changed=list(), removed=list(), stale=True,
+                        error=e.msg)
+        if changes:
+            changes['stale'] = False
+        return changes
@@ -0,0 +1,161 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It provides an AIMD (additive increase, multiplicative decrease) limit on
+the number of API requests in flight, and a thread based runner for the
+parallel code paths that uses it.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_concurrency import LogtailAdaptiveConcurrency, run_parallel
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    index = int(round((len(ordered) - 1) * pct / 100.0))
+    return ordered[index]
+
+
+class LogtailAdaptiveConcurrency():
+    """ Grows the limit by `increase` after every window of successful
+    requests whose p95 latency stays within `tolerance` times the
+    baseline, and multiplies it by `decrease` on a 429, a 5xx, a
+    connection error or a p95 latency rise. """
+
+    def __init__(
+            self,
+            initial=4,
+            minimum=1,
+            maximum=64,
+            increase=1,
+            decrease=0.5,
+            window=20,
+            tolerance=1.5):
+        self.limit = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.increase = increase
+        self.decrease = decrease
+        self.window = window
+        self.tolerance = tolerance
+        self.baseline = None
+        self.samples = list()
+        self.since_decrease = 0
+        self.in_flight = 0
+        self.history = list()
+        self.cond = threading.Condition()
+
+    def _change(self, limit, reason):
+        limit = max(self.minimum, min(self.maximum, int(limit)))
+        if limit != self.limit:
+            self.history.append(dict(
+                at=time.time(), previous=self.limit,
+                limit=limit, reason=reason))
+            self.limit = limit
+            self.cond.notify_all()
+
+    def _cut(self, reason):
+        # Requests already in flight when the limit was cut report the
+        # same congestion, only cut once per limit's worth of responses
+        if self.since_decrease < self.limit and self.history and \
+                self.history[-1]['limit'] < self.history[-1]['previous']:
+            return
+        self.since_decrease = 0
+        self.samples = list()
+        self._change(self.limit * self.decrease, reason)
+
+    def record(self, latency, status=None, error=False):
+        """ Record the outcome of one request """
+        with self.cond:
+            self.since_decrease += 1
+            if error and status == 429:
+                return self._cut('throttled by the API (429)')
+            if error and status is not None and status >= 500:
+                return self._cut('server error (%i)' % status)
+            if error and status is None:
+                return self._cut('connection error or timeout')
+            self.samples.append(latency)
+            if len(self.samples) < self.window:
+                return
+            p95 = percentile(self.samples, 95)
+            self.samples = list()
+            if self.baseline is None:
+                self.baseline = p95
+            if p95 > self.baseline * self.tolerance:
+                return self._cut(
+                    'p95 latency %.0fms above baseline %.0fms'
+                    % (p95 * 1000, self.baseline * 1000))
+            # Let the baseline follow slow drifts of the API latency
+            self.baseline = 0.9 * self.baseline + 0.1 * p95
+            self._change(
+                self.limit + self.increase,
+                'p95 latency %.0fms within baseline %.0fms'
+                % (p95 * 1000, self.baseline * 1000))
+
+    def acquire(self):
+        with self.cond:
+            while self.in_flight >= self.limit:
+                self.cond.wait()
+            self.in_flight += 1
+
+    def release(self):
+        with self.cond:
+            self.in_flight -= 1
+            self.cond.notify_all()
+
+    def call(self, fn, *args):
+        """ Run fn(*args) within the limit, recording its outcome """
+        self.acquire()
+        started = time.time()
+        try:
+            result = fn(*args)
+        except LogtailApiError as e:
+            self.record(time.time() - started, status=e.status, error=True)
+            raise
+        finally:
+            self.release()
+        self.record(time.time() - started)
+        return result
+
+    def report(self):
+        """ Return the current limit and the reason of every change """
+        limits = [self.limit] + [change['previous'] for change in self.history]
+        return dict(
+            limit=self.limit,
+            min_limit=min(limits),
+            max_limit=max(limits),
+            changes=list(self.history),
+        )
+
+
+def run_parallel(fn, items, controller=None, workers=None):
+    """ Call fn(item) for each item on a thread pool, within the limit of
+    the controller. Returns a list of (result, error) tuples in input
+    order, where error is the LogtailApiError raised for that item. """
+    if controller is None:
+        controller = LogtailAdaptiveConcurrency()
+    workers = workers or controller.maximum
+
+    def call(item):
+        try:
+            return controller.call(fn, item), None
+        except LogtailApiError as e:
+            return None, e
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(call, items))
@@ -0,0 +1,372 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It provides a local daemon that outlives single module executions. The
+daemon keeps keep-alive connections to the Logtail API, an LRU of source
+lookups and a shared rate limiter. Modules talk to it over a Unix socket
+with newline delimited JSON, one call per line.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_daemon import connect_client
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import socket
+import stat
+import threading
+import time
+from collections import OrderedDict
+
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailDeadlineError
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_transport import LogtailKeepAliveTransport, LogtailRateLimiter
+
+# Client methods the daemon will run on behalf of a module
+METHODS = (
+    'get_source', 'update_source', 'remove_source', 'create_source',
+    'get_all_sources', 'get_sources_since', 'get_source_page')
+
+
+class LogtailSourceLRU():
+    """ A size and age bounded cache of source dicts """
+
+    def __init__(self, size=1024, ttl=30):
+        self.size = size
+        self.ttl = ttl
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if time.time() - entry[0] > self.ttl:
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self.lock:
+            self.entries[key] = (time.time(), value)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+
+    def discard(self, key):
+        with self.lock:
+            self.entries.pop(key, None)
+
+
+class LogtailDaemon():
+
+    def __init__(
+            self,
+            socket_path,
+            idle_timeout=300,
+            rate=10,
+            cache_size=1024,
+            cache_ttl=30):
+        self.socket_path = os.path.expanduser(socket_path)
+        self.idle_timeout = idle_timeout
+        self.transport = LogtailKeepAliveTransport()
+        self.limiter = LogtailRateLimiter(rate)
+        self.lru = LogtailSourceLRU(cache_size, cache_ttl)
+        self.clients = dict()
+        self.lock = threading.Lock()
+        self.last_active = time.time()
+
+    def _client(self, token):
+        key = hashlib.sha256(token.encode()).hexdigest()
+        with self.lock:
+            if key not in self.clients:
+                client = LogtailApiClient(token)
+                client.transport = self.transport
+                client.limiter = self.limiter
+                self.clients[key] = client
+            return key, self.clients[key]
+
+    def _budget_client(self, client, timeout, deadline):
+        """ Return a client sharing the pool of `client`, bound to the
+        request budget of a single call """
+        budget = LogtailApiClient(client.token)
+        budget.transport = client.transport
+        budget.limiter = client.limiter
+        budget.set_budget(timeout, deadline)
+        return budget
+
+    def call(self, token, method, args, timeout=None, deadline=None):
+        """ Run a client method, serving get_source from the LRU.
+        `timeout` and `deadline` are the request budget of the caller. """
+        if method not in METHODS:
+            raise LogtailApiError("Unsupported daemon call: %s" % method)
+        key, client = self._client(token)
+        if method == 'get_source_page' and args and args[0] is not None \
+                and not str(args[0]).startswith(client.baseurl + '/'):
+            # The token must only be sent to the API
+            raise LogtailApiError(
+                "Unsupported listing page URL: %s" % args[0])
+        if timeout is not None or deadline is not None:
+            client = self._budget_client(client, timeout, deadline)
+        if method == 'get_source':
+            cached = self.lru.get((key, str(args[0])))
+            if cached is not None:
+                return cached
+        result = getattr(client, method)(*args)
+        if isinstance(result, LogtailSource):
+            result = result.get_dict()
+        if method == 'get_sources_since':
+            result = [result[0], sorted(result[1]), result[2]]
+        if method in ('get_source', 'update_source', 'create_source'):
+            if result:
+                self.lru.put((key, str(result['id'])), result)
+        elif method == 'remove_source':
+            self.lru.discard((key, str(args[0])))
+        return result
+
+    def handle(self, conn):
+        reader = conn.makefile('rb')
+        try:
+            for line in reader:
+                self.last_active = time.time()
+                try:
+                    req = json.loads(line)
+                    resp = dict(result=self.call(
+                        req['token'], req['method'],
+                        req.get('args', list()),
+                        req.get('timeout'), req.get('deadline')))
+                except LogtailDeadlineError as e:
+                    resp = dict(error=e.msg, deadline_exceeded=True,
+                                partial=e.partial)
+                except LogtailApiError as e:
+                    resp = dict(error=e.msg)
+                except (ValueError, KeyError, TypeError) as e:
+                    resp = dict(error="Invalid daemon request: %s" % e)
+                except Exception as e:
+                    # Every request gets a reply, or the client would
+                    # wait for it until its timeout
+                    resp = dict(
+                        error="The logtail daemon failed the call. "
+                        "Reason: %s" % (str(e) or type(e).__name__))
+                conn.sendall(json.dumps(resp).encode() + b'\n')
+        except socket.error:
+            # The client went away
+            pass
+        finally:
+            reader.close()
+            conn.close()
+
+    def serve(self):
+        """ Serve until no call was made for `idle_timeout` seconds """
+        if os.path.lexists(self.socket_path):
+            if not stat.S_ISSOCK(os.lstat(self.socket_path).st_mode):
+                raise LogtailApiError(
+                    "%s exists and is not a socket" % self.socket_path)
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(self.socket_path)
+                # Another daemon already serves this socket
+                return
+            except socket.error:
+                os.remove(self.socket_path)
+            finally:
+                probe.close()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        umask = os.umask(0o077)
+        try:
+            server.bind(self.socket_path)
+        finally:
+            os.umask(umask)
+        server.listen(128)
+        server.settimeout(1)
+        try:
+            while time.time() - self.last_active < self.idle_timeout:
+                try:
+                    conn, addr = server.accept()
+                except socket.timeout:
+                    continue
+                conn.settimeout(None)
+                worker = threading.Thread(target=self.handle, args=(conn,))
+                worker.daemon = True
+                worker.start()
+        finally:
+            server.close()
+            self.transport.close()
+            os.remove(self.socket_path)
+
+
+class LogtailDaemonClient(LogtailApiClient):
+    """ A LogtailApiClient that forwards calls to a LogtailDaemon.
+
+    Each thread gets its own connection, the daemon serves connections on
+    separate threads so parallel callers are not serialized. """
+
+    def __init__(self, token, socket_path, socket_timeout=300):
+        super(LogtailDaemonClient, self).__init__(token)
+        self.socket_path = os.path.expanduser(socket_path)
+        # Seconds to wait for a reply when the call has no deadline
+        self.socket_timeout = socket_timeout
+        self.local = threading.local()
+        self.connections = list()
+        self.lock = threading.Lock()
+        # Connect now, so an unreachable daemon is found by connect_client
+        self._connection()
+
+    def _connection(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.socket_timeout)
+            try:
+                sock.connect(self.socket_path)
+            except socket.error:
+                sock.close()
+                raise
+            conn = self.local.conn = (sock, sock.makefile('rb'))
+            with self.lock:
+                self.connections.append(conn)
+        return conn
+
+    def _disconnect(self, conn):
+        sock, reader = conn
+        reader.close()
+        sock.close()
+        with self.lock:
+            if conn in self.connections:
+                self.connections.remove(conn)
+
+    def close(self):
+        """ Close the connections of every thread, later calls connect
+        again """
+        with self.lock:
+            connections, self.connections = self.connections, list()
+            self.local = threading.local()
+        for sock, reader in connections:
+            reader.close()
+            sock.close()
+
+    def _call(self, method, *args):
+        conn = None
+        try:
+            conn = self._connection()
+            sock, reader = conn
+            # A call may make many requests, only the deadline bounds it
+            remaining = self._remaining()
+            sock.settimeout(
+                self.socket_timeout if remaining is None else remaining)
+            # The daemon applies the budget to the requests it makes
+            req = dict(token=self.token, method=method, args=list(args))
+            if self.timeout is not None:
+                req['timeout'] = self.timeout
+            if remaining is not None:
+                req['deadline'] = remaining
+            sock.sendall(json.dumps(req).encode() + b'\n')
+            resp = json.loads(reader.readline())
+        except (socket.error, ValueError) as e:
+            if conn is not None:
+                # A late reply must not be read as the answer to the
+                # next call, start over on a new connection
+                self._disconnect(conn)
+                self.local.conn = None
+            if self.deadline is not None and time.time() >= self.deadline:
+                raise LogtailDeadlineError(
+                    "The operation did not finish before its deadline")
+            raise LogtailApiError(
+                "Unable to reach the logtail daemon at %s. Reason: %s"
+                % (self.socket_path, e))
+        if 'error' in resp:
+            if resp.get('deadline_exceeded'):
+                raise LogtailDeadlineError(resp['error'], resp.get('partial'))
+            raise LogtailApiError(resp['error'])
+        return resp['result']
+
+    def _source(self, result):
+        return LogtailSource(**result) if result else result
+
+    def get_source(self, source_id):
+        return self._source(self._call('get_source', source_id))
+
+    def update_source(self, source_id, name, autogen, ingest):
+        return self._source(self._call(
+            'update_source', source_id, name, autogen, ingest))
+
+    def remove_source(self, source_id):
+        return self._call('remove_source', source_id)
+
+    def create_source(self, name, platform):
+        return self._source(self._call('create_source', name, platform))
+
+    def get_all_sources(self):
+        return self._call('get_all_sources')
+
+    def get_sources_since(self, since, reconcile=False):
+        sources, seen_ids, complete = self._call(
+            'get_sources_since', since, reconcile)
+        return sources, set(seen_ids), complete
+
+    def get_source_page(self, url=None):
+        page, next_url = self._call('get_source_page', url)
+        return page, next_url
+
+
+def start_daemon(socket_path, **kwargs):
+    """ Start a detached LogtailDaemon listening on socket_path """
+    pid = os.fork()
+    if pid:
+        os.waitpid(pid, 0)
+        return
+    try:
+        os.setsid()
+        if os.fork():
+            os._exit(0)
+        devnull = os.open(os.devnull, os.O_RDWR)
+        for fd in (0, 1, 2):
+            os.dup2(devnull, fd)
+        LogtailDaemon(socket_path, **kwargs).serve()
+    finally:
+        os._exit(0)
+
+
+def connect_client(token, socket_path, start=True, wait=5, timeout=None,
+                   deadline=None):
+    """ Return a LogtailDaemonClient, starting the daemon if needed.
+    Falls back to a plain LogtailApiClient if the daemon is unavailable.
+    Either client is bound to the `timeout` and `deadline` budget. """
+    lt = _connect_client(token, socket_path, start, wait)
+    lt.set_budget(timeout, deadline)
+    return lt
+
+
+def _connect_client(token, socket_path, start, wait):
+    socket_path = os.path.expanduser(socket_path)
+    try:
+        return LogtailDaemonClient(token, socket_path)
+    except socket.error:
+        if not start:
+            return LogtailApiClient(token)
+    directory = os.path.dirname(socket_path) or '.'
+    try:
+        if not os.path.isdir(directory):
+            os.makedirs(directory, 0o700)
+        start_daemon(socket_path)
+    except OSError:
+        return LogtailApiClient(token)
+    started = time.time()
+    while time.time() - started < wait:
+        try:
+            return LogtailDaemonClient(token, socket_path)
+        except socket.error:
+            time.sleep(0.05)
+    return LogtailApiClient(token)
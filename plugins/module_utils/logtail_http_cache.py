@@ -0,0 +1,111 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It stores API responses with their ETag and Last-Modified validators, so a
+later GET of the same URL can be sent as a conditional request and a 304
+answered from the stored body. Entries not used for `max_age` seconds are
+deleted, and only the `max_entries` most recently used ones are kept.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_http_cache import LogtailHttpCache
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+
+class LogtailHttpCache():
+
+    def __init__(self, directory, max_age=86400, max_entries=1024):
+        self.directory = os.path.expanduser(directory)
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._pruned = False
+
+    def _path(self, token, url):
+        # Responses are only reused for the token that fetched them
+        digest = hashlib.sha256()
+        digest.update(token.encode())
+        digest.update(b'\0')
+        digest.update(url.encode())
+        return os.path.join(self.directory, digest.hexdigest() + '.json')
+
+    def get(self, token, url):
+        """ Return the stored entry for a URL, or None """
+        path = self._path(token, url)
+        try:
+            with open(path, 'r') as f:
+                entry = json.load(f)
+            # The modification time records the last use, see _prune
+            os.utime(path, None)
+        except (IOError, OSError, ValueError):
+            return None
+        return entry
+
+    def _prune(self):
+        """ Delete entries unused for max_age seconds and the least
+        recently used ones past max_entries, along with temporary files
+        left by processes that died while writing one """
+        now = time.time()
+        entries = list()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                mtime = os.path.getmtime(path)
+                if now - mtime > self.max_age:
+                    os.remove(path)
+                elif name.endswith('.json'):
+                    entries.append((mtime, path))
+            except OSError:
+                pass
+        entries.sort(reverse=True)
+        for mtime, path in entries[self.max_entries:]:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def put(self, token, url, etag, last_modified, body):
+        """ Store a response body with its validators. Storage errors are
+        ignored, the next request is then sent unconditionally. """
+        if isinstance(body, bytes):
+            body = body.decode('utf-8')
+        try:
+            if not os.path.isdir(self.directory):
+                os.makedirs(self.directory, 0o700)
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.response')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(dict(
+                    etag=etag, last_modified=last_modified, body=body), f)
+            os.replace(tmp, self._path(token, url))
+        except (IOError, OSError):
+            pass
+        if not self._pruned:
+            # Once per run is enough, a listing stores one entry per page
+            self._pruned = True
+            self._prune()
+
+    def conditions(self, entry):
+        """ Return the request headers revalidating a stored entry """
+        headers = dict()
+        if entry.get('etag'):
+            headers['If-None-Match'] = entry['etag']
+        if entry.get('last_modified'):
+            headers['If-Modified-Since'] = entry['last_modified']
+        return headers
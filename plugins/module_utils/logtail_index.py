@@ -0,0 +1,218 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It stores the source snapshot in a local SQLite database, indexed on the
+columns used for exact lookups, so id, name, platform, team_id, table_name
+and incremental queries do not need to scan every source. Filter queries
+match substrings and still scan.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_index import LogtailSourceIndex
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import sqlite3
+
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_cache import LogtailSourceCache, LogtailCacheError
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import source_text
+
+COLUMNS = (
+    'id', 'name', 'platform', 'token', 'ingest_paused', 'autogen_views',
+    'created_at', 'updated_at', 'retention', 'table_name', 'team_id')
+
+# Stored as integers, filters match them as true and false like match_source
+BOOLEANS = ('ingest_paused', 'autogen_views')
+
+SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS sources ('
+    'id TEXT PRIMARY KEY, name TEXT, platform TEXT, token TEXT, '
+    'ingest_paused INTEGER, autogen_views INTEGER, created_at TEXT, '
+    'updated_at TEXT, retention INTEGER, table_name TEXT, team_id INTEGER)',
+    'CREATE INDEX IF NOT EXISTS sources_name ON sources (name)',
+    'CREATE INDEX IF NOT EXISTS sources_updated_at ON sources (updated_at)',
+    'CREATE INDEX IF NOT EXISTS sources_platform ON sources (platform)',
+    'CREATE INDEX IF NOT EXISTS sources_team_id ON sources (team_id)',
+    'CREATE INDEX IF NOT EXISTS sources_table_name ON sources (table_name)',
+    'CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value)',
+)
+
+
+class LogtailSourceIndex(LogtailSourceCache):
+    """ A LogtailSourceCache kept in SQLite instead of a JSON file.
+
+    Only the sync metadata is read on load, sources are queried on demand.
+    """
+
+    def __init__(self, path, token=None):
+        super(LogtailSourceIndex, self).__init__(path, token)
+        self.conn = None
+
+    def _connect(self):
+        if self.conn is not None:
+            return self.conn
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            # The index holds source tokens, create it owner only
+            os.close(os.open(self.path, os.O_CREAT | os.O_WRONLY, 0o600))
+            self.conn = sqlite3.connect(self.path)
+            for statement in SCHEMA:
+                self.conn.execute(statement)
+        except (IOError, OSError, sqlite3.Error) as e:
+            raise LogtailCacheError(
+                "Unable to open source index %s. Reason: %s"
+                % (self.path, e))
+        return self.conn
+
+    def _execute(self, statement, params=(), many=False):
+        """ Run a statement, raising LogtailCacheError for SQLite errors
+        such as a database locked by another task """
+        conn = self._connect()
+        try:
+            if many:
+                return conn.executemany(statement, params).fetchall()
+            return conn.execute(statement, params).fetchall()
+        except sqlite3.Error as e:
+            # Drop the half written sync, the last saved one stays valid
+            conn.rollback()
+            raise LogtailCacheError(
+                "Unable to query source index %s. Reason: %s"
+                % (self.path, e))
+
+    def _row(self, row):
+        source = dict(zip(COLUMNS, row))
+        for key in BOOLEANS:
+            if source[key] is not None:
+                source[key] = bool(source[key])
+        return source
+
+    def _values(self, source):
+        return tuple(
+            str(source['id']) if key == 'id' else source.get(key)
+            for key in COLUMNS)
+
+    def _query(self, where='', params=()):
+        rows = self._execute(
+            'SELECT %s FROM sources %s ORDER BY id'
+            % (', '.join(COLUMNS), where), params)
+        return [self._row(row) for row in rows]
+
+    def load(self):
+        """ Load the sync metadata, returns False if the index is empty """
+        meta = dict(self._execute('SELECT key, value FROM meta'))
+        self.synced_at = meta.get('synced_at')
+        self.refreshed_at = meta.get('refreshed_at')
+        self.reconciled_at = meta.get('reconciled_at')
+        return self.synced_at is not None
+
+    def save(self):
+        self._execute(
+            'INSERT OR REPLACE INTO meta (key, value) VALUES (?, ?)', (
+                ('synced_at', self.synced_at),
+                ('refreshed_at', self.refreshed_at),
+                ('reconciled_at', self.reconciled_at)), many=True)
+        try:
+            self.conn.commit()
+        except sqlite3.Error as e:
+            raise LogtailCacheError(
+                "Unable to write source index %s. Reason: %s"
+                % (self.path, e))
+
+    def get_sources(self):
+        return self._query()
+
+    def get_sources_since(self, since):
+        return self._query('WHERE updated_at > ?', (since,))
+
+    def get_source(self, source_id):
+        sources = self._query('WHERE id = ?', (str(source_id),))
+        return sources[0] if sources else None
+
+    def _text(self, key):
+        """ Return the SQL rendering a column as source_text does """
+        if key in BOOLEANS:
+            return "CASE %s WHEN 1 THEN 'true' WHEN 0 THEN 'false' " \
+                "ELSE '' END" % key
+        return "COALESCE(CAST(%s AS TEXT), '')" % key
+
+    def find_sources(self, name=None, filter=None, since=None, match=None):
+        clauses = list()
+        params = list()
+        if since is not None:
+            clauses.append('updated_at > ?')
+            params.append(since)
+        for key, val in sorted((match or dict()).items()):
+            if key not in COLUMNS:
+                raise LogtailCacheError("Unknown match key: %s" % key)
+            if val is None:
+                clauses.append('%s IS NULL' % key)
+            else:
+                clauses.append('%s = ?' % key)
+                params.append(str(val) if key == 'id' else val)
+        if name is not None:
+            clauses.append('name = ?')
+            params.append(name)
+        elif filter is not None:
+            matches = list()
+            for key, val in filter.items():
+                if key not in COLUMNS:
+                    raise LogtailCacheError(
+                        "Unknown filter key: %s" % key)
+                matches.append(
+                    'instr(lower(%s), ?) > 0' % self._text(key))
+                params.append(source_text(val))
+            if matches:
+                clauses.append('(%s)' % ' OR '.join(matches))
+        where = 'WHERE ' + ' AND '.join(clauses) if clauses else ''
+        return self._query(where, tuple(params))
+
+    def _watermark(self):
+        return self._execute('SELECT max(updated_at) FROM sources')[0][0]
+
+    def _replace(self, sources):
+        current = dict((source['id'], source) for source in self._query())
+        fresh = dict((str(source['id']), source) for source in sources)
+        removed = sorted(set(current) - set(fresh))
+        changed = [
+            source for key, source in fresh.items()
+            if current.get(key) != self._row(self._values(source))]
+        self._execute('DELETE FROM sources')
+        self._execute(
+            'INSERT INTO sources VALUES (%s)' % ', '.join('?' * len(COLUMNS)),
+            [self._values(source) for source in fresh.values()], many=True)
+        return changed, removed
+
+    def _upsert(self, sources):
+        changed = [
+            source for source in sources
+            if self.get_source(source['id']) !=
+            self._row(self._values(source))]
+        self._execute(
+            'INSERT OR REPLACE INTO sources VALUES (%s)'
+            % ', '.join('?' * len(COLUMNS)),
+            [self._values(source) for source in changed], many=True)
+        return changed
+
+    def _retain(self, ids):
+        self._execute(
+            'CREATE TEMP TABLE IF NOT EXISTS seen (id TEXT PRIMARY KEY)')
+        self._execute('DELETE FROM seen')
+        self._execute(
+            'INSERT OR IGNORE INTO seen VALUES (?)',
+            [(str(key),) for key in ids], many=True)
+        removed = [row[0] for row in self._execute(
+            'SELECT id FROM sources WHERE id NOT IN (SELECT id FROM seen) '
+            'ORDER BY id')]
+        self._execute(
+            'DELETE FROM sources WHERE id NOT IN (SELECT id FROM seen)')
+        return removed
@@ -0,0 +1,112 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It records the progress of long running operations, such as full listings
+run with async, in a status file that logtail_job_info can read while the
+operation is still running.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_job import LogtailJobProgress
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import errno
+import json
+import os
+import tempfile
+import threading
+import time
+
+
+class LogtailJobProgress():
+
+    def __init__(self, path, operation=None):
+        self.path = os.path.expanduser(path)
+        self.status = dict(
+            operation=operation,
+            state='running',
+            pid=os.getpid(),
+            started_at=time.time(),
+            updated_at=time.time(),
+            pages=0,
+            items=0,
+            applied=0,
+            failed=0,
+            msg=None,
+        )
+        # Bulk operations advance the counters from their worker threads
+        self.lock = threading.Lock()
+
+    def _write(self):
+        self.status['updated_at'] = time.time()
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.job')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(self.status, f)
+            os.replace(tmp, self.path)
+        except (IOError, OSError):
+            # Progress reporting must never fail the operation itself
+            return False
+        return True
+
+    def start(self):
+        """ Replace the status of a previous job, removing it when the new
+        status can not be written """
+        if not self._write():
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+        return self
+
+    def advance(self, pages=0, items=0, applied=0, failed=0):
+        """ Add to the counters and publish the new status, safe to call
+        from several threads """
+        with self.lock:
+            self.status['pages'] += pages
+            self.status['items'] += items
+            self.status['applied'] += applied
+            self.status['failed'] += failed
+            self._write()
+
+    def finish(self, msg=None):
+        with self.lock:
+            self.status['state'] = 'finished'
+            self.status['msg'] = msg
+            self._write()
+
+    def fail(self, msg):
+        with self.lock:
+            self.status['state'] = 'failed'
+            self.status['msg'] = msg
+            self._write()
+
+
+def read_progress(path):
+    """ Return the status dict of a job, or None if it has not started """
+    try:
+        with open(os.path.expanduser(path), 'r') as f:
+            status = json.load(f)
+    except (IOError, OSError, ValueError):
+        return None
+    status['elapsed'] = status['updated_at'] - status['started_at']
+    if status['state'] == 'running':
+        try:
+            os.kill(status['pid'], 0)
+        except OSError as e:
+            # EPERM means the process exists but belongs to another user
+            if e.errno != errno.EPERM:
+                status['state'] = 'failed'
+                status['msg'] = 'The job process exited without finishing'
+    return status
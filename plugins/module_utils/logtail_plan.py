@@ -0,0 +1,239 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It computes the creates, updates and deletes that bring an account to a
+desired list of sources, stores them in a plan file for review, and applies
+a stored plan in parallel.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_plan import LogtailSourcePlan
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import tempfile
+import time
+
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailDeadlineError
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_concurrency import run_parallel
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource, index_sources
+
+
+class LogtailPlanError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+class LogtailSourcePlan():
+    """ A list of actions, each holding the `updated_at` the source had
+    when the plan was made. Sources are matched to the desired state by
+    name. """
+
+    version = 1
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.planned_at = None
+        self.watermark = None
+        self.actions = list()
+
+    def build(self, sources, desired, prune=False):
+        """ Compute the actions turning the listing `sources` into
+        `desired`, a list of dicts with a name and optionally platform,
+        ingest_paused and autogen_views. With `prune` sources missing from
+        `desired` are deleted. """
+        by_name, duplicates = index_sources(sources, 'name')
+        wanted = dict()
+        for entry in desired:
+            if not isinstance(entry, dict) or not entry.get('name'):
+                raise LogtailPlanError(
+                    "Every desired source needs a name, got %s" % entry)
+            if entry['name'] in wanted:
+                raise LogtailPlanError(
+                    "The desired source %s is listed more than once"
+                    % entry['name'])
+            wanted[entry['name']] = entry
+
+        actions = list()
+        for name, entry in wanted.items():
+            values = dict(
+                ingest_paused=entry.get('ingest_paused'),
+                autogen_views=entry.get('autogen_views'))
+            if name in duplicates:
+                raise LogtailPlanError(
+                    "Several sources are named %s, the plan cannot tell "
+                    "them apart" % name)
+            if name not in by_name:
+                if not entry.get('platform'):
+                    raise LogtailPlanError(
+                        "The desired source %s does not exist and has no "
+                        "platform to create it with" % name)
+                actions.append(dict(
+                    action='create', id=None, name=name,
+                    platform=entry['platform'], desired=values))
+                continue
+            source = by_name[name]
+            changes = LogtailSource(**source).requires_update(
+                None, values['ingest_paused'], values['autogen_views'])
+            if changes:
+                actions.append(dict(
+                    action='update', id=source['id'], name=name,
+                    changes=changes, desired=values,
+                    expected_updated_at=source['updated_at']))
+        if prune:
+            for source in sources:
+                if source['name'] not in wanted:
+                    actions.append(dict(
+                        action='delete', id=source['id'],
+                        name=source['name'],
+                        expected_updated_at=source['updated_at']))
+
+        stamps = [source['updated_at'] for source in sources]
+        self.watermark = max(stamps) if stamps else None
+        self.planned_at = time.time()
+        self.actions = actions
+        return actions
+
+    def load(self):
+        try:
+            with open(self.path, 'r') as f:
+                plan = json.load(f)
+        except (IOError, OSError, ValueError) as e:
+            raise LogtailPlanError(
+                "Unable to read plan %s. Reason: %s" % (self.path, e))
+        if plan.get('version') != self.version:
+            raise LogtailPlanError(
+                "Unsupported plan version %s in %s"
+                % (plan.get('version'), self.path))
+        self.planned_at = plan['planned_at']
+        self.watermark = plan['watermark']
+        self.actions = plan['actions']
+
+    def save(self):
+        """ Atomically write the plan, readable by the owner only """
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.plan')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(dict(
+                    version=self.version,
+                    planned_at=self.planned_at,
+                    watermark=self.watermark,
+                    actions=self.actions,
+                ), f, indent=2)
+            os.replace(tmp, self.path)
+        except (IOError, OSError) as e:
+            raise LogtailPlanError(
+                "Unable to write plan %s. Reason: %s" % (self.path, e))
+
+    def _changed_since(self, client):
+        """ Return the sources changed since the plan was made, keyed by
+        ID, and the IDs of every source if the whole listing was read. """
+        if self.watermark is None:
+            # The account had no sources, whatever exists now is new
+            sources = client.get_all_sources()
+            complete = sources is not False
+            seen_ids = None
+        else:
+            sources, seen_ids, complete = \
+                client.get_sources_since(self.watermark)
+        if sources is False:
+            raise LogtailPlanError(
+                "Unable to list the sources changed since the plan was made")
+        current = dict((str(source['id']), source) for source in sources)
+        if not complete:
+            return current, None
+        if seen_ids is None:
+            return current, set(current)
+        return current, set(str(key) for key in seen_ids)
+
+    def _prepare(self, action, current, seen_ids, names):
+        """ Return the step to run for an action, using the fresh record
+        of the sources that changed since planning. """
+        step = dict(action)
+        step['drifted'] = False
+        if action['action'] == 'create':
+            if action['name'] in names:
+                step['outcome'] = 'conflict'
+                step['msg'] = "A source named %s was created since the " \
+                    "plan was made" % action['name']
+            return step
+        key = str(action['id'])
+        if seen_ids is not None and key not in seen_ids:
+            step['outcome'] = 'missing'
+            return step
+        fresh = current.get(key)
+        if fresh is None or \
+                fresh['updated_at'] == action['expected_updated_at']:
+            return step
+        step['drifted'] = True
+        if action['action'] == 'delete':
+            step['outcome'] = 'conflict'
+            step['msg'] = "The source %s changed since the plan was made" \
+                % action['name']
+        elif action['action'] == 'update':
+            step['changes'] = LogtailSource(**fresh).requires_update(
+                None, action['desired']['ingest_paused'],
+                action['desired']['autogen_views'])
+            if not step['changes']:
+                step['outcome'] = 'unchanged'
+        return step
+
+    def _run(self, client, step):
+        if step['action'] == 'delete':
+            return client.remove_source(step['id'])
+        if step['action'] == 'update':
+            return client.update_source(
+                step['id'], None,
+                step['changes'].get('autogen_views'),
+                step['changes'].get('ingest_paused'))
+        created = client.create_source(step['name'], step['platform'])
+        if not created:
+            return created
+        step['id'] = created.id
+        changes = created.requires_update(
+            None, step['desired']['ingest_paused'],
+            step['desired']['autogen_views'])
+        if changes:
+            return client.update_source(
+                created.id, None,
+                changes.get('autogen_views'), changes.get('ingest_paused'))
+        return created
+
+    def apply(self, client, controller=None):
+        """ Run the plan in parallel and return the outcome of each action,
+        in plan order.
+
+        Only sources changed since the plan was made are listed again.
+        Updates of those are recomputed from the fresh record, deletes of
+        those and creates of a name that appeared meanwhile are skipped as
+        conflicts. """
+        current, seen_ids = self._changed_since(client)
+        names = set(source['name'] for source in current.values())
+        steps = [self._prepare(action, current, seen_ids, names)
+                 for action in self.actions]
+        pending = [step for step in steps if 'outcome' not in step]
+        outcomes = run_parallel(
+            lambda step: self._run(client, step), pending, controller)
+        for step, (response, error) in zip(pending, outcomes):
+            if error is not None:
+                step['outcome'] = 'failed'
+                step['msg'] = error.msg
+                if isinstance(error, LogtailDeadlineError):
+                    step['deadline_exceeded'] = True
+            elif not response:
+                step['outcome'] = 'missing'
+            else:
+                step['outcome'] = 'applied'
+        return steps
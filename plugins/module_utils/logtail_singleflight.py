@@ -0,0 +1,183 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It coalesces identical API requests made at the same time by separate
+processes on one machine. The first process to take the lock file for a
+request performs it and writes a result file, the others wait and read it.
+Result files hold source tokens, they are only written to a directory
+readable by the owner alone and expired ones are deleted.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_singleflight import LogtailSingleFlight
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import hashlib
+import json
+import os
+import tempfile
+import time
+
+
+class LogtailSingleFlight():
+
+    def __init__(
+            self,
+            directory,
+            wait_timeout=60,
+            result_ttl=5,
+            poll_interval=0.05):
+        self.directory = os.path.expanduser(directory)
+        self.wait_timeout = wait_timeout
+        self.result_ttl = result_ttl
+        self.poll_interval = poll_interval
+        self._secure = None
+
+    def secure(self):
+        """ Create the directory owner only. Returns False when the
+        directory can be reached by other users, requests are then made
+        without coalescing. """
+        if self._secure is None:
+            try:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory, 0o700)
+            except OSError:
+                # Another process may have created it meanwhile
+                pass
+            try:
+                st = os.stat(self.directory)
+                self._secure = st.st_uid == os.getuid() and \
+                    not st.st_mode & 0o077
+            except OSError:
+                self._secure = False
+        return self._secure
+
+    def key(self, *parts):
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def _paths(self, key):
+        base = os.path.join(self.directory, key)
+        return base + '.lock', base + '.json'
+
+    def _read_result(self, path):
+        """ Return the stored result if it is recent enough, else None """
+        try:
+            if time.time() - os.path.getmtime(path) > self.result_ttl:
+                return None
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (IOError, OSError, ValueError):
+            return None
+
+    def _write_result(self, path, result):
+        try:
+            fd, tmp = tempfile.mkstemp(dir=self.directory, prefix='.result')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(result, f)
+            os.replace(tmp, path)
+        except (IOError, OSError, TypeError, ValueError):
+            # Followers fall back to making the request themselves
+            pass
+
+    def _prune(self):
+        """ Delete result files past their ttl, and temporary files left
+        by processes that died while writing one """
+        now = time.time()
+        try:
+            names = os.listdir(self.directory)
+        except OSError:
+            return
+        for name in names:
+            path = os.path.join(self.directory, name)
+            try:
+                age = now - os.path.getmtime(path)
+                if (name.endswith('.json') and age > self.result_ttl) or \
+                        (name.startswith('.result') and
+                         age > self.wait_timeout):
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def _error(self, error, result):
+        """ Rebuild the exception the leader stored in `result`, as the
+        subclass of `error` it was raised as """
+        classes = [error]
+        for cls in classes:
+            if cls.__name__ == result.get('type'):
+                error = cls
+                break
+            classes.extend(cls.__subclasses__())
+        e = error(result['error'])
+        if result.get('status') is not None:
+            e.status = result['status']
+        return e
+
+    def _take_lock(self, path):
+        try:
+            os.close(os.open(path, os.O_CREAT | os.O_EXCL | os.O_WRONLY, 0o600))
+        except OSError:
+            try:
+                if time.time() - os.path.getmtime(path) > self.wait_timeout:
+                    # The leader died without releasing the lock
+                    os.remove(path)
+            except OSError:
+                pass
+            return False
+        self._prune()
+        return True
+
+    def do(self, key, fn, error=Exception, deadline=None, transient=()):
+        """ Return fn() performed once across processes sharing `key`.
+
+        Exceptions of type `error` raised by the leader are raised again in
+        every waiting process, with the same type, message and status.
+        Exceptions of a
+        `transient` type are only raised by the leader, a waiting process
+        then makes the call itself. Waiting stops at the `deadline` time,
+        fn() is then called directly.
+        """
+        if not self.secure():
+            return fn()
+        lock, result_path = self._paths(key)
+        started = time.time()
+        while time.time() - started < self.wait_timeout and \
+                (deadline is None or time.time() < deadline):
+            result = self._read_result(result_path)
+            if result is not None:
+                if 'error' in result:
+                    raise self._error(error, result)
+                return result['value']
+            if self._take_lock(lock):
+                try:
+                    try:
+                        value = fn()
+                    except transient:
+                        raise
+                    except error as e:
+                        self._write_result(result_path, dict(
+                            error=getattr(e, 'msg', str(e)),
+                            type=type(e).__name__,
+                            status=getattr(e, 'status', None)))
+                        raise
+                    self._write_result(result_path, dict(value=value))
+                    return value
+                finally:
+                    try:
+                        os.remove(lock)
+                    except OSError:
+                        # A waiter judged the lock stale and removed it
+                        pass
+            time.sleep(self.poll_interval)
+        return fn()
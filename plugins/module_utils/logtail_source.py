@@ -14,6 +14,8 @@ To use this module, include it as part of a custom module as shown below:
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import json
+
 
 class LogtailSource():
 
@@ -43,13 +45,24 @@ class LogtailSource():
         self.team_id = team_id
 
     def requires_update(self, name, ingest, autogen):
+        """ Return a dict of the attributes that differ from the wanted
+        values, mapped to those values. Empty if no update is needed. """
+        changes = dict()
         if name is not None and name != self.name:
-            return True
+            changes['name'] = name
         if ingest is not None and ingest != self.ingest_paused:
-            return True
+            changes['ingest_paused'] = ingest
         if autogen is not None and autogen != self.autogen_views:
-            return True
-        return False
+            changes['autogen_views'] = autogen
+        return changes
+
+    def get_diff(self, changes):
+        """ Return the before and after values of the changed attributes,
+        as expected by Ansible's diff output """
+        return dict(
+            before=dict((key, getattr(self, key)) for key in changes),
+            after=dict(changes),
+        )
 
     def get_dict(self):
         return {
@@ -65,3 +78,80 @@ class LogtailSource():
             'table_name': self.table_name,
             'team_id': self.team_id
         }
+
+
+def source_text(value):
+    """ Return the text a filter matches a field against, booleans read as
+    true and false and a missing value as empty """
+    if isinstance(value, bool):
+        return 'true' if value else 'false'
+    return '' if value is None else str(value)
+
+
+def match_source(filter, source):
+    for key, val in filter.items():
+        if source_text(val) in source_text(source.get(key)).lower():
+            return True
+    return False
+
+
+def equal_source(match, source):
+    """ Return True if every field of `match` equals the source's """
+    return all(source.get(key) == val for key, val in match.items())
+
+
+class LogtailSourceSummary():
+    """ Counts sources by the fields capacity reports group on, one source
+    at a time, so a listing can be summarised without keeping it. """
+
+    fields = ('platform', 'team_id', 'retention', 'ingest_paused')
+
+    def __init__(self):
+        self.count = 0
+        self.groups = dict((field, dict()) for field in self.fields)
+
+    def _key(self, value):
+        # Keys read the same whether the result is returned in process
+        # or serialised to JSON by a remote module
+        if isinstance(value, str):
+            return value
+        return json.dumps(value)
+
+    def add(self, source):
+        self.count += 1
+        for field in self.fields:
+            key = self._key(source.get(field))
+            self.groups[field][key] = self.groups[field].get(key, 0) + 1
+
+    def merge(self, other):
+        """ Add the counts of another summary to this one """
+        self.count += other.count
+        for field in self.fields:
+            for key, count in other.groups[field].items():
+                self.groups[field][key] = \
+                    self.groups[field].get(key, 0) + count
+
+    def get_dict(self):
+        summary = dict(count=self.count)
+        summary.update(self.groups)
+        return summary
+
+
+def index_sources(sources, key):
+    """ Return (index, duplicates): a dict of the sources keyed by the
+    string form of their `key` field, and the keys held by more than one
+    source. The first source keeps a duplicated key, sources without a
+    value for it are left out. """
+    index = dict()
+    duplicates = list()
+    for source in sources:
+        value = source.get(key)
+        if value is None:
+            continue
+        value = value if isinstance(value, str) else json.dumps(value)
+        if value in index:
+            if value not in duplicates:
+                duplicates.append(value)
+            continue
+        index[value] = source
+    return index, duplicates
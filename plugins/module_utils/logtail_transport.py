@@ -0,0 +1,161 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It provides a keep-alive transport that can stand in for open_url and a
+token bucket rate limiter. Both are shared by the daemon and the accounts
+fan out, and are kept apart from them so a module only ships the code it
+runs.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_transport import LogtailKeepAliveTransport
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import io
+import socket
+import threading
+import time
+
+from ansible.module_utils.six.moves import http_client
+from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
+from ansible.module_utils.six.moves.urllib.parse import urlsplit
+from ansible.module_utils.six.moves.urllib.request import getproxies, proxy_bypass
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import open_url
+
+
+class LogtailResponse():
+    """ A fully read HTTP response, so the connection can be reused """
+
+    def __init__(self, status, headers, body):
+        self.status = status
+        self.headers = headers
+        self.body = body
+
+    def read(self, size=-1):
+        if size is None or size < 0:
+            body, self.body = self.body, b''
+        else:
+            body, self.body = self.body[:size], self.body[size:]
+        return body
+
+
+class LogtailKeepAliveTransport():
+    """ A drop in replacement for open_url that keeps persistent
+    connections in one pool per host, shared by all threads. A connection
+    is used by one request at a time and returned to the pool afterwards.
+
+    Hosts the environment routes through a proxy (https_proxy, no_proxy)
+    are left to open_url. """
+
+    def __init__(self, timeout=30, pool_size=10):
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.idle = dict()
+        self.lock = threading.Lock()
+
+    def _proxied(self, scheme, host):
+        """ Return True when the environment sets a proxy for host """
+        return scheme in getproxies() and not proxy_bypass(host)
+
+    def _acquire(self, scheme, netloc, fresh=False):
+        """ Return an idle connection to the host or a new one """
+        with self.lock:
+            idle = self.idle.get((scheme, netloc))
+            if idle and not fresh:
+                return idle.pop()
+        cls = http_client.HTTPSConnection if scheme == 'https' \
+            else http_client.HTTPConnection
+        return cls(netloc, timeout=self.timeout)
+
+    def _release(self, scheme, netloc, conn):
+        """ Return a connection to the pool, closing it when the pool of
+        the host is full """
+        with self.lock:
+            idle = self.idle.setdefault((scheme, netloc), list())
+            if len(idle) < self.pool_size:
+                idle.append(conn)
+                return
+        conn.close()
+
+    def close(self):
+        """ Close every idle connection """
+        with self.lock:
+            idle, self.idle = self.idle, dict()
+        for conns in idle.values():
+            for conn in conns:
+                conn.close()
+
+    def __call__(self, url, method='GET', data=None, headers=None,
+                 http_agent=None, timeout=None):
+        parts = urlsplit(url)
+        if self._proxied(parts.scheme, parts.hostname):
+            return open_url(
+                url, method=method, data=data, headers=headers,
+                http_agent=http_agent, timeout=timeout or self.timeout)
+        path = parts.path + ('?' + parts.query if parts.query else '')
+        headers = dict(headers or dict())
+        if http_agent:
+            headers['User-Agent'] = http_agent
+        if data is not None:
+            headers.setdefault(
+                'Content-Type', 'application/x-www-form-urlencoded')
+        # Retry once on a new connection, the server may have closed an
+        # idle one
+        for attempt in (1, 2):
+            conn = self._acquire(
+                parts.scheme, parts.netloc, fresh=attempt == 2)
+            conn.timeout = timeout or self.timeout
+            if conn.sock is not None:
+                conn.sock.settimeout(conn.timeout)
+            try:
+                conn.request(method, path, body=data, headers=headers)
+                response = conn.getresponse()
+                body = response.read()
+                break
+            except (http_client.HTTPException, socket.error) as e:
+                conn.close()
+                if attempt == 2:
+                    raise URLError(e)
+        if response.getheader('Connection', '').lower() == 'close':
+            conn.close()
+        else:
+            self._release(parts.scheme, parts.netloc, conn)
+        # HTTPMessage headers are case insensitive, as with open_url
+        resp_headers = response.msg
+        if response.status >= 400:
+            raise HTTPError(url, response.status, response.reason,
+                            resp_headers, io.BytesIO(body))
+        return LogtailResponse(response.status, resp_headers, body)
+
+
+class LogtailRateLimiter():
+    """ A thread safe token bucket allowing `rate` calls per second """
+
+    def __init__(self, rate, burst=None):
+        self.rate = float(rate)
+        self.burst = float(burst or rate)
+        self.tokens = self.burst
+        self.updated = time.time()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self.lock:
+                now = time.time()
+                self.tokens = min(
+                    self.burst,
+                    self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
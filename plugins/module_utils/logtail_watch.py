@@ -0,0 +1,177 @@
+#!/usr/bin/python
+
+#Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""This module is used by the Logtail Source modules as part of the logtail
+ansible collection.
+
+It keeps a snapshot of the sources of an account in a state file and turns
+the differences found by each poll into drift events. Polls only list the
+sources changed since the newest change seen, deletions are found by the
+occasional full listing.
+
+To use this module, include it as part of a custom module as shown below:
+
+  from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_watch import LogtailSourceWatch
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import tempfile
+import time
+
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError
+
+
+class LogtailWatchError(Exception):
+    def __init__(self, msg):
+        self.msg = msg
+
+
+def changed_fields(before, after):
+    """ Return the fields that differ between two records of a source,
+    as a dict of {field: {before, after}}. `updated_at` changes with any
+    other field and is left out. A new token is only reported as
+    {changed: true}, events must not carry tokens. """
+    changes = dict()
+    for key in sorted(set(before) | set(after)):
+        if key == 'updated_at' or before.get(key) == after.get(key):
+            continue
+        if key == 'token':
+            changes[key] = dict(changed=True)
+        else:
+            changes[key] = dict(before=before.get(key), after=after.get(key))
+    return changes
+
+
+def public_fields(source):
+    """ Return the source record without its token """
+    return dict((key, value) for key, value in source.items()
+                if key != 'token')
+
+
+class LogtailSourceWatch():
+
+    version = 1
+
+    def __init__(self, path):
+        self.path = os.path.expanduser(path)
+        self.watermark = None
+        self.scanned_at = None
+        # The last known record of each source, keyed by string ID
+        self.sources = None
+
+    def load(self):
+        """ Read the snapshot, a missing state file leaves it empty """
+        try:
+            with open(self.path, 'r') as f:
+                state = json.load(f)
+        except (IOError, OSError) as e:
+            if os.path.exists(self.path):
+                raise LogtailWatchError(
+                    "Unable to read watch state %s. Reason: %s"
+                    % (self.path, e))
+            return
+        except ValueError as e:
+            raise LogtailWatchError(
+                "Unable to parse watch state %s. Reason: %s" % (self.path, e))
+        if state.get('version') != self.version:
+            raise LogtailWatchError(
+                "Unsupported watch state version %s in %s"
+                % (state.get('version'), self.path))
+        self.watermark = state['watermark']
+        self.scanned_at = state['scanned_at']
+        self.sources = state['sources']
+
+    def save(self):
+        """ Atomically write the snapshot, readable by the owner only """
+        directory = os.path.dirname(self.path) or '.'
+        try:
+            if not os.path.isdir(directory):
+                os.makedirs(directory, 0o700)
+            fd, tmp = tempfile.mkstemp(dir=directory, prefix='.watch')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(dict(
+                    version=self.version,
+                    watermark=self.watermark,
+                    scanned_at=self.scanned_at,
+                    sources=self.sources,
+                ), f)
+            os.replace(tmp, self.path)
+        except (IOError, OSError) as e:
+            raise LogtailWatchError(
+                "Unable to write watch state %s. Reason: %s" % (self.path, e))
+
+    def _event(self, event, record, **kwargs):
+        kwargs.update(
+            event=event,
+            id=str(record['id']),
+            name=record['name'],
+            detected_at=time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()))
+        return kwargs
+
+    def _advance(self, sources):
+        stamps = [source['updated_at'] for source in sources]
+        if self.watermark is not None:
+            stamps.append(self.watermark)
+        self.watermark = max(stamps) if stamps else None
+
+    def poll(self, client, full_scan_interval=None):
+        """ Refresh the snapshot and return the drift events found.
+
+        The first poll only records the snapshot. Later polls list the
+        sources changed since the newest change seen. The whole listing is
+        read, finding deletions too, when `full_scan_interval` seconds have
+        passed since the last full listing or the account had no sources.
+        """
+        if self.sources is None:
+            sources = client.get_all_sources()
+            if sources is False:
+                raise LogtailApiError("Unable to list the sources to watch")
+            self.sources = dict(
+                (str(source['id']), source) for source in sources)
+            self.scanned_at = time.time()
+            self._advance(sources)
+            return list()
+
+        full = self.watermark is None or \
+            (full_scan_interval is not None and
+             time.time() - self.scanned_at >= full_scan_interval)
+        if full:
+            sources = client.get_all_sources()
+            seen_ids = None
+            complete = sources is not False
+        else:
+            sources, seen_ids, complete = \
+                client.get_sources_since(self.watermark)
+        if sources is False:
+            raise LogtailApiError("Unable to list the sources to watch")
+
+        events = list()
+        for source in sources:
+            key = str(source['id'])
+            known = self.sources.get(key)
+            if known is None:
+                events.append(self._event(
+                    'created', source, source=public_fields(source)))
+            else:
+                changes = changed_fields(known, source)
+                if changes:
+                    events.append(self._event(
+                        'modified', source, changes=changes))
+            self.sources[key] = source
+
+        if complete:
+            if seen_ids is None:
+                seen = set(str(source['id']) for source in sources)
+            else:
+                seen = set(str(key) for key in seen_ids)
+            for key in sorted(set(self.sources) - seen):
+                events.append(self._event('deleted', self.sources.pop(key)))
+            self.scanned_at = time.time()
+        self._advance(sources)
+        return events
@@ -0,0 +1,251 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: logtail_env
+
+short_description: Read and write the Logtail source environment variables of a host.
+
+version_added: "2.12.0"
+
+description:
+    - Reads the source ID and token variables from an environment file such as C(/etc/environment)
+      and writes both in one pass.
+    - The file is replaced atomically, and left untouched when its content would not change.
+    - The current values are returned, so plays do not need C(ansible_env) and fact gathering to read them back.
+      The source token is only returned with I(return_token).
+
+options:
+    path:
+        description: The environment file, with one C(NAME=value) assignment per line.
+        required: false
+        default: /etc/environment
+        type: path
+    source_id:
+        description: The source ID to write. The variable is left as it is when omitted.
+        required: false
+        type: str
+    source_token:
+        description: The source token to write. The variable is left as it is when omitted.
+        required: false
+        type: str
+    id_var:
+        description: Name of the source ID variable.
+        required: false
+        default: LOGTAIL_SOURCE_ID
+        type: str
+    token_var:
+        description: Name of the source token variable.
+        required: false
+        default: LOGTAIL_SOURCE_TOKEN
+        type: str
+    return_token:
+        description:
+            - Return the source token in the file as C(source_token).
+            - The token is a secret, set C(no_log) on tasks that use it.
+        required: false
+        default: false
+        type: bool
+    state:
+        description: Whether both variables should be set or removed.
+        required: false
+        default: present
+        type: str
+        choices:
+        - present
+        - absent
+notes:
+    - The file is created with mode C(0644) when it does not exist, an existing file keeps its mode and owner.
+author:
+    - Skyler Hardy (https://github.com/sd-hardy)
+'''
+
+EXAMPLES = r'''
+- name: Read the source of the host
+  sd_hardy.logtail.logtail_env:
+    return_token: true
+  register: logtail_env
+  no_log: true
+
+- name: Write the source ID and token
+  sd_hardy.logtail.logtail_env:
+    source_id: "{{ logtail_source_id }}"
+    source_token: "{{ logtail_source_token }}"
+
+- name: Remove both variables
+  sd_hardy.logtail.logtail_env:
+    state: absent
+'''
+
+RETURN = r'''
+message:
+    description: The output message the module generates.
+    type: str
+    returned: always
+    sample: 'Environment updated'
+source_id:
+    description: The source ID in the file once the module ran, null when not set.
+    type: str
+    returned: always
+    sample: "123456"
+source_token:
+    description:
+        - The source token in the file once the module ran, null when not set.
+        - Masked in the output when it is the I(source_token) that was passed in.
+    type: str
+    returned: when I(return_token) is true
+    sample: "zzzTMvasdj25kznafAL4At"
+'''
+
+import os
+import re
+import tempfile
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.common.text.converters import to_bytes, to_native
+
+
+def argument_spec():
+    return dict(
+        path=dict(type='path', required=False, default='/etc/environment'),
+        source_id=dict(type='str', required=False, default=None),
+        source_token=dict(type='str', required=False, default=None,
+                          no_log=True),
+        id_var=dict(type='str', required=False, default='LOGTAIL_SOURCE_ID'),
+        token_var=dict(type='str', required=False,
+                       default='LOGTAIL_SOURCE_TOKEN'),
+        return_token=dict(type='bool', required=False, default=False),
+        state=dict(type='str', default='present',
+                   choices=['present', 'absent']),
+    )
+
+
+def assignment(line):
+    """ Return the name and value assigned by a line, or (None, None) """
+    match = re.match(
+        r'^\s*(?:export\s+)?([A-Za-z_][A-Za-z0-9_]*)=(.*?)\s*$', line)
+    if not match:
+        return None, None
+    name, value = match.groups()
+    if len(value) > 1 and value[0] == value[-1] and value[0] in '\'"':
+        value = value[1:-1]
+    return name, value
+
+
+def update(lines, values):
+    """ Return the lines with each variable of `values` set to its value,
+    removed when the value is None. Later duplicates are dropped. """
+    result = list()
+    written = set()
+    for line in lines:
+        name, value = assignment(line)
+        if name not in values:
+            result.append(line)
+            continue
+        if name in written or values[name] is None:
+            continue
+        result.append(values[name])
+        written.add(name)
+    for name, line in values.items():
+        if line is not None and name not in written:
+            result.append(line)
+    return result
+
+
+def read(lines):
+    values = dict()
+    for line in lines:
+        name, value = assignment(line)
+        # The first assignment is the one update() keeps
+        if name is not None and name not in values:
+            values[name] = value
+    return values
+
+
+def write(module, path, content):
+    """ Replace path with content through a rename in the same directory """
+    directory = os.path.dirname(path) or '.'
+    fd, tmp = tempfile.mkstemp(dir=directory, prefix='.logtail_env')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(to_bytes(content))
+        if not os.path.exists(path):
+            os.chmod(tmp, 0o644)
+        module.atomic_move(tmp, path)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def run_module(module=None):
+    result = dict(
+        changed=False,
+        message='',
+        source_id=None,
+    )
+
+    if module is None:
+        module = AnsibleModule(
+            argument_spec=argument_spec(),
+            supports_check_mode=True
+        )
+
+    path = module.params['path']
+    id_var = module.params['id_var']
+    token_var = module.params['token_var']
+
+    content = ''
+    if os.path.exists(path):
+        try:
+            with open(path, 'rb') as f:
+                content = to_native(f.read())
+        except (IOError, OSError) as e:
+            return module.fail_json(
+                msg="Unable to read %s. Reason: %s" % (path, e), **result)
+    lines = content.splitlines()
+
+    values = dict()
+    if module.params['state'] == 'absent':
+        values[id_var] = None
+        values[token_var] = None
+    else:
+        if module.params['source_id'] is not None:
+            values[id_var] = "%s=%s" % (id_var, module.params['source_id'])
+        if module.params['source_token'] is not None:
+            values[token_var] = "%s='%s'" % (
+                token_var, module.params['source_token'])
+    if values:
+        lines = update(lines, values)
+
+    current = read(lines)
+    result['source_id'] = current.get(id_var)
+    if module.params['return_token']:
+        result['source_token'] = current.get(token_var)
+
+    if lines == content.splitlines():
+        result['message'] = "Environment unchanged"
+        return module.exit_json(**result)
+
+    result['changed'] = True
+    result['message'] = "Environment updated"
+    if module.check_mode:
+        return module.exit_json(**result)
+    try:
+        write(module, path, ''.join(line + '\n' for line in lines))
+    except (IOError, OSError) as e:
+        return module.fail_json(
+            msg="Unable to write %s. Reason: %s" % (path, e), **result)
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: logtail_job_info
+
+short_description: Report the progress of a background Logtail operation.
+
+version_added: "2.12.0"
+
+description:
+    - Read the status file written by a Logtail module run with a I(progress_file).
+    - Use it to poll listings and bulk operations started with C(async) while they run.
+
+options:
+    path:
+        description: Path of the status file given to the running module as I(progress_file).
+        required: true
+        type: path
+notes:
+    - Run this module on the same host as the background task, for example with C(delegate_to).
+author:
+    - Skyler Hardy (https://github.com/sd-hardy)
+'''
+
+EXAMPLES = r'''
+- name: Start a full listing in the background
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_api_token }}"
+    progress_file: /tmp/logtail_listing.json
+  async: 1800
+  poll: 0
+  register: listing
+
+# ... other work ...
+
+- name: Wait for the listing to finish
+  sd_hardy.logtail.logtail_job_info:
+    path: /tmp/logtail_listing.json
+  register: job
+  until: job.finished
+  retries: 180
+  delay: 10
+
+- name: Collect the listing
+  ansible.builtin.async_status:
+    jid: "{{ listing.ansible_job_id }}"
+  register: sources
+'''
+
+RETURN = r'''
+started:
+    description: If the operation has written its status file.
+    type: bool
+    returned: always
+    sample: true
+finished:
+    description: If the operation has finished, successfully or not.
+    type: bool
+    returned: always
+    sample: false
+job:
+    description: The status of the operation.
+    returned: When started
+    type: complex
+    contains:
+        operation:
+            description: The module running the operation.
+            type: str
+            sample: "logtail_source_info"
+        state:
+            description: One of running, finished or failed.
+            type: str
+            sample: "running"
+        pages:
+            description: Listing pages fetched so far.
+            type: int
+            sample: 12
+        items:
+            description: Sources fetched so far.
+            type: int
+            sample: 600
+        applied:
+            description: Changes applied so far by bulk operations.
+            type: int
+            sample: 0
+        failed:
+            description: Changes bulk operations failed to apply so far.
+            type: int
+            sample: 0
+        elapsed:
+            description: Seconds between the start and the last update.
+            type: float
+            sample: 42.5
+        msg:
+            description: The final message of the operation.
+            type: str
+            sample: "Found 600 sources"
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_job import read_progress
+
+
+def run_module():
+    module_args = dict(
+        path=dict(type='path', required=True),
+    )
+
+    result = dict(
+        changed=False,
+        started=False,
+        finished=False,
+    )
+
+    module = AnsibleModule(
+        argument_spec=module_args,
+        supports_check_mode=True
+    )
+
+    job = read_progress(module.params['path'])
+    if job is not None:
+        result['started'] = True
+        result['finished'] = job['state'] != 'running'
+        result['job'] = job
+        if job['state'] == 'failed':
+            return module.fail_json(msg=job['msg'], **result)
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -64,6 +64,23 @@ options:
             - This option is only applicable to the ubuntu platform.
         required: false
         type: bool
+    http_cache_dir:
+        description:
+            - Directory keeping API responses with their C(ETag) and C(Last-Modified) validators.
+            - Later GETs of the same URL are sent with C(If-None-Match) and C(If-Modified-Since),
+              a C(304 Not Modified) answer is served from the kept response.
+            - Responses contain source tokens, the directory is created owner only.
+            - Responses unused for a day are deleted, and at most 1024 are kept.
+            - Calls made through the local API daemon, see I(daemon_socket), do not use it.
+        required: false
+        type: path
+    daemon_socket:
+        description:
+            - Path of a Unix socket used to reach a persistent local API daemon.
+            - The daemon is started on first use and exits after 5 minutes without calls.
+            - It keeps API connections, source lookups and a rate limiter warm between tasks.
+        required: false
+        type: path
     token:
         description: Your Logtail API Token.
         required: true
@@ -76,10 +93,15 @@ options:
         choices:
         - present
         - absent
-# Specify this value according to your collection
-# in format of namespace.collection.doc_fragment_name
-#extends_documentation_fragment:
-#    - sd_hardy.logtail.my_doc_fragment_name
+notes:
+    - This module runs on the Ansible controller through its action plugin, it is not copied to the managed host.
+    - Tasks run with C(async) are executed on the managed host instead.
+    - Updates only send the attributes that differ from the source, run with C(--diff) to show them.
+    - The module manages one source of one account, reconcile the sources of several accounts at once with
+      M(sd_hardy.logtail.logtail_source_plan) and its I(accounts) option.
+extends_documentation_fragment:
+    - sd_hardy.logtail.circuit_breaker
+    - sd_hardy.logtail.request_budget
 author:
     - Skyler Hardy (https://github.com/sd-hardy)
 '''
@@ -91,6 +113,7 @@ EXAMPLES = r'''
     name: Source1
     platform: ubuntu
     token: "{{ logtail_api_token }}"
+    daemon_socket: ~/.ansible/logtail/daemon.sock
   register: create
 
 # Print out new source details
@@ -188,20 +211,28 @@ source:
           "created_at": "2022-06-27T19:45:17.078Z",
           "updated_at": "2022-07-01T10:56:05.177Z"
         }
+deadline_exceeded:
+    description: Set when the task failed because I(deadline) was exceeded.
+    returned: When the deadline was exceeded
+    type: bool
+    sample: true
+changes:
+    description: The attributes sent in the update, with their new values.
+    returned: When the source is updated
+    type: dict
+    sample: {"ingest_paused": true}
 '''
 
 from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, budget_argument_spec, fail_api_error
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_breaker import breaker_argument_spec, circuit_breaker
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_http_cache import LogtailHttpCache
 
-import json
-import time
-from json import JSONDecodeError
-from ansible.module_utils.urls import open_url
-from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
-from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError
-
-def run_module():
-    module_args = dict(
+def argument_spec():
+    spec = dict(
         token=dict(type='str', required=True, no_log=True),
+        daemon_socket=dict(type='path', required=False, default=None),
+        http_cache_dir=dict(type='path', required=False, default=None),
         id=dict(type='int', required=False, default=None),
         name=dict(type='str', required=False, default=None),
         autogen_views=dict(type='bool', required=False, default=None),
@@ -215,27 +246,19 @@ def run_module():
             'dokku'
         ]),
     )
+    spec.update(breaker_argument_spec())
+    spec.update(budget_argument_spec())
+    return spec
 
-    result = dict(
-        changed=False,
-        message='',
-        source=dict(),
-    )
-
-    module = AnsibleModule(
-        argument_spec=module_args,
-        supports_check_mode=True
-    )
 
+def manage_source(module, lt, result):
+    """ Bring the source to the requested state and exit """
     id = module.params['id']
     name = module.params['name']
-    token = module.params['token']
     state = module.params['state']
     platform = module.params['platform']
     ingest = module.params['ingest_paused']
     autogen = module.params['autogen_views']
-    lt = LogtailApiClient(token)
-
     if state == 'absent':
         if id is None:
             return module.fail_json(
@@ -246,7 +269,7 @@ def run_module():
         try:
             source = lt.get_source(id)
         except LogtailApiError as e:
-            return module.fail_json(msg=e.msg, **result)
+            return fail_api_error(module, result, e)
         if not source:
             result['message'] = "Source not found"
             return module.exit_json(**result)
@@ -258,7 +281,7 @@ def run_module():
             try:
                 removed = lt.remove_source(id)
             except LogtailApiError as e:
-                return module.fail_json(msg=e.msg, **result)
+                return fail_api_error(module, result, e)
             if not removed:
                 module.fail_json(
                     msg="An error occurred while removing "
@@ -276,30 +299,35 @@ def run_module():
             try:
                 source = lt.get_source(id)
             except LogtailApiError as e:
-                return module.fail_json(msg=e.msg, **result)
+                return fail_api_error(module, result, e)
             if not source:  # Source not found
                 return module.fail_json(
                     msg="No source found with ID %s" % id,
                     **result
                 )
             # Source exists
-            if not source.requires_update(name, ingest, autogen):
+            changes = source.requires_update(name, ingest, autogen)
+            if not changes:
                 result['message'] = 'Source present'
                 result['source'] = source.get_dict()
                 return module.exit_json(**result)
             # Update the source
+            result['changes'] = changes
+            if module._diff:
+                result['diff'] = source.get_diff(changes)
             if module.check_mode:
                 result['changed'] = True
                 return module.exit_json(**result)
             updated = None
             try:
+                # Only send the fields that change
                 updated = lt.update_source(
                     source.id,
-                    name,
-                    autogen,
-                    ingest)
+                    changes.get('name'),
+                    changes.get('autogen_views'),
+                    changes.get('ingest_paused'))
             except LogtailApiError as e:
-                return module.fail_json(msg=e.msg, **result)
+                return fail_api_error(module, result, e)
             if updated:
                 result['changed'] = True
                 result['message'] = "Updated source"
@@ -318,7 +346,7 @@ def run_module():
         try:
             created = lt.create_source(name, platform)
         except LogtailApiError as e:
-            return module.fail_json(msg=e.msg, **result)
+            return fail_api_error(module, result, e)
         if not created:
             module.fail_json(
                 msg="An error occurred while creating "
@@ -330,21 +358,56 @@ def run_module():
             result['source'] = created.get_dict()
             # Check if we need to set any additional params
             #  after creating the source, such as disable ingest
-            if created.requires_update(name, ingest, autogen):
+            changes = created.requires_update(name, ingest, autogen)
+            if changes:
+                result['changes'] = changes
                 updated = None
                 try:
                     updated = lt.update_source(
                         created.id,
-                        name,
-                        autogen,
-                        ingest)
+                        changes.get('name'),
+                        changes.get('autogen_views'),
+                        changes.get('ingest_paused'))
                 except LogtailApiError as e:
-                    return module.fail_json(msg=e.msg, **result)
+                    return fail_api_error(module, result, e)
                 if updated:
                     result['source'] = updated.get_dict()
             module.exit_json(**result)
 
 
+def run_module(module=None):
+    result = dict(
+        changed=False,
+        message='',
+        source=dict(),
+    )
+
+    # Action plugins pass in a module that runs on the controller
+    if module is None:
+        module = AnsibleModule(
+            argument_spec=argument_spec(),
+            supports_check_mode=True
+        )
+
+    token = module.params['token']
+    if module.params['daemon_socket'] is not None:
+        # Imported on demand to keep the default startup lean
+        from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_daemon import connect_client
+        lt = connect_client(token, module.params['daemon_socket'],
+                            timeout=module.params['timeout'],
+                            deadline=module.params['deadline'])
+    else:
+        lt = LogtailApiClient(token)
+        lt.breaker = circuit_breaker(module.params)
+        if module.params['http_cache_dir'] is not None:
+            lt.http_cache = LogtailHttpCache(module.params['http_cache_dir'])
+        lt.set_budget(module.params['timeout'], module.params['deadline'])
+
+    # Connections to the daemon are closed once the module exits
+    with lt:
+        manage_source(module, lt, result)
+
+
 def main():
     run_module()
 
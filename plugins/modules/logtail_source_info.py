@@ -20,6 +20,19 @@ options:
         description: Pull A logtail source via name
         required: false
         type: int
+    ids:
+        description:
+            - Pull several logtail sources by id, fetched in parallel.
+            - Duplicate ids are fetched once and sources are returned in the order of their first appearance.
+            - Ids without a source are returned in C(not_found) instead of failing the task.
+        required: false
+        type: list
+        elements: int
+    concurrency:
+        description: Maximum number of requests in flight when pulling I(ids).
+        required: false
+        default: 16
+        type: int
     name:
         description: Pull a logtail source by name
         required: false
@@ -28,12 +41,134 @@ options:
         description: Pull logtail sources by key-value filter
         required: false
         type: dict
+    match:
+        description:
+            - Only return sources whose fields equal all of these values, for example C(platform) or C(team_id).
+            - Combined with I(name) or I(filter), sources must satisfy both.
+            - With I(cache_format=sqlite) lookups on C(platform), C(team_id) and C(table_name) use the indexes.
+        required: false
+        type: dict
+    since:
+        description:
+            - Only return sources updated after this timestamp.
+            - Use the C(updated_at) format returned by the API, for example C(2022-06-10T21:24:46.409Z).
+        required: false
+        type: str
+    cache_path:
+        description:
+            - Path of a local snapshot of the source listing.
+            - When set the snapshot is refreshed incrementally and sources are served from it.
+            - The snapshot contains source tokens and is written with owner only permissions.
+            - A digest of I(token) is appended to the file name, so each API token keeps its own snapshot.
+        required: false
+        type: path
+    cache_format:
+        description:
+            - Storage format of the local snapshot.
+            - C(sqlite) keeps the snapshot in an SQLite database indexed on name, platform, team_id, table_name
+              and updated_at, so I(name) and I(match) queries and incremental syncs do not scan every source.
+            - I(filter) matches substrings, so filter queries scan the snapshot in either format.
+        required: false
+        default: json
+        type: str
+        choices:
+        - json
+        - sqlite
+    cache_ttl:
+        description: Seconds the local snapshot is served without contacting the API.
+        required: false
+        default: 0
+        type: int
+    cache_stale_while_revalidate:
+        description:
+            - Seconds past I(cache_ttl) during which an expired snapshot is returned immediately.
+            - A single background process refreshes the snapshot for later runs. It is forked from the process running
+              the module, which is the controller worker unless the task runs with C(async).
+        required: false
+        default: 0
+        type: int
+    cache_stale_if_error:
+        description:
+            - Seconds past I(cache_ttl) during which an expired snapshot is returned if the API cannot be reached,
+              answers with a 5xx error or I(deadline) passes.
+            - Other errors, such as an invalid token, fail the task.
+        required: false
+        default: 0
+        type: int
+    coalesce_dir:
+        description:
+            - Directory used to coalesce identical API requests made at the same time by parallel tasks on one machine.
+            - The first task performs each request and the others wait for its result.
+            - Results are kept for a few seconds and contain source tokens, the directory is created owner only
+              and expired results are deleted.
+            - An existing directory that other users can reach is not used, requests are then made without coalescing.
+        required: false
+        type: path
+    progress_file:
+        description:
+            - Path of a status file updated with the number of listing pages and sources fetched so far.
+            - Use it with C(async) and poll it with M(sd_hardy.logtail.logtail_job_info) while the listing runs.
+              The status of a previous job is removed when the task is submitted.
+            - With I(daemon_socket) the listing runs in the daemon, so the file only records the start and the outcome.
+              A I(summary) listing is read page by page through the daemon and records each page.
+        required: false
+        type: path
+    summary:
+        description:
+            - Return counts of the selected sources grouped by platform, team_id, retention and ingest_paused instead of the sources.
+            - Without I(cache_path) or I(since) the listing is counted page by page, so the sources are never held in memory.
+        required: false
+        default: false
+        type: bool
+    key_by:
+        description:
+            - Return the sources as C(sources_by_key), a dict keyed by this field, instead of the C(sources) list.
+            - Keys are strings, when several sources share a key the first one is kept and a warning is shown.
+            - The C(sd_hardy.logtail.logtail_index) filter builds the same dict from any list of sources.
+        required: false
+        type: str
+        choices:
+        - id
+        - name
+        - table_name
+    full_refresh:
+        description: Download the full listing into the snapshot instead of only the changed sources.
+        required: false
+        default: false
+        type: bool
+    http_cache_dir:
+        description:
+            - Directory keeping API responses with their C(ETag) and C(Last-Modified) validators.
+            - Later GETs of the same URL are sent with C(If-None-Match) and C(If-Modified-Since),
+              a C(304 Not Modified) answer is served from the kept response.
+            - Responses contain source tokens, the directory is created owner only.
+            - Responses unused for a day are deleted, and at most 1024 are kept.
+            - Calls made through the local API daemon, see I(daemon_socket), do not use it.
+        required: false
+        type: path
+    daemon_socket:
+        description:
+            - Path of a Unix socket used to reach a persistent local API daemon.
+            - The daemon is started on first use and exits after 5 minutes without calls.
+            - It keeps API connections, source lookups and a rate limiter warm between tasks.
+            - Parallel lookups of I(ids) each use their own connection to the daemon.
+            - A I(summary) listing is read from the daemon page by page, so it is never held in memory as a whole.
+        required: false
+        type: path
     token:
-        description: Your Logtail API Token.
-        required: true
+        description:
+            - Your Logtail API Token.
+            - Required unless I(accounts) is set.
+        required: false
         type: str
-#extends_documentation_fragment:
-#    - sd_hardy.logtail.my_doc_fragment_name
+notes:
+    - This module runs on the Ansible controller through its action plugin, it is not copied to the managed host.
+    - Tasks run with C(async) are executed on the managed host instead.
+    - With I(accounts) only listings are supported, I(id), I(ids), I(cache_path) and I(daemon_socket) cannot be used.
+extends_documentation_fragment:
+    - sd_hardy.logtail.accounts
+    - sd_hardy.logtail.circuit_breaker
+    - sd_hardy.logtail.request_budget
 author:
     - Skyler Hardy (https://github.com/sd-hardy)
 '''
@@ -48,6 +183,17 @@ EXAMPLES = r'''
     token: "{{ logtail_token }}"
     id: 123456
 
+- name: return a single source by id through a persistent local daemon
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    id: 123456
+    daemon_socket: ~/.ansible/logtail/daemon.sock
+
+- name: return several sources by id
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    ids: [123456, 123457, 123458]
+
 - name: return sources with name
   sd_hardy.logtail.logtail_source_info:
     token: "{{ logtail_token }}"
@@ -59,12 +205,81 @@ EXAMPLES = r'''
     filter: {
       'platform': 'mongo'
     }
+
+- name: return the nginx sources of a team from an indexed snapshot
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    match:
+      platform: nginx
+      team_id: 1111
+    cache_path: ~/.ansible/logtail/sources.db
+    cache_format: sqlite
+
+- name: return sources changed since the last run from a local snapshot
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    cache_path: ~/.ansible/logtail/sources.json
+    since: "{{ last_sync }}"
+
+- name: look up a source by name from an indexed local snapshot
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    cache_path: ~/.ansible/logtail/sources.db
+    cache_format: sqlite
+    name: 'source1'
+
+- name: serve the snapshot for 5 minutes, refreshing in the background for another 10
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    cache_path: ~/.ansible/logtail/sources.json
+    cache_ttl: 300
+    cache_stale_while_revalidate: 600
+    cache_stale_if_error: 3600
+
+- name: look up a source by name, sharing the listing between parallel forks
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    name: "{{ inventory_hostname }}"
+    coalesce_dir: ~/.ansible/logtail/inflight
+  delegate_to: localhost
+
+- name: return sources keyed by name for direct lookups
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    key_by: name
+  register: logtail_sources
+
+- name: count sources per platform, team, retention and ingest state
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    summary: true
+  register: capacity
+
+- name: audit the nginx sources of several teams at once
+  sd_hardy.logtail.logtail_source_info:
+    accounts:
+      - alias: web
+        token: "{{ logtail_web_token }}"
+      - alias: data
+        token: "{{ logtail_data_token }}"
+        rate: 5
+    filter:
+      platform: nginx
+
+- name: start a full listing in the background
+  sd_hardy.logtail.logtail_source_info:
+    token: "{{ logtail_token }}"
+    progress_file: /tmp/logtail_listing.json
+  async: 1800
+  poll: 0
+  register: listing
 '''
 
 RETURN = r'''
 sources:
-    description: List containing the Source(s) dictionary.
-    returned: On success when state is present
+    description:
+        - List containing the Source(s) dictionary.
+    returned: When summary is false and key_by is not set
     type: list
     elements: dict
     contains:
@@ -112,6 +327,11 @@ sources:
             description: Log retention period in days
             type: int
             sample: 30
+        account:
+            description: The alias of the account the source belongs to.
+            type: str
+            returned: When accounts is set
+            sample: "web"
     sample: [
         {
           "id": "123456",
@@ -140,69 +360,401 @@ sources:
           "updated_at": "2022-07-01T10:56:05.177Z"
         }
     ]
+sources_by_key:
+    description:
+        - The selected sources keyed by their I(key_by) field, each with the fields listed under C(sources).
+        - Keys are strings, of sources sharing a key only the first is returned.
+    returned: When key_by is set and summary is false
+    type: dict
+    sample: {
+        "mysource": {
+            "id": "123456",
+            "name": "mysource",
+            "platform": "ubuntu"
+        }
+    }
+summary:
+    description:
+        - Number of selected sources, and the number per value of each grouped field.
+        - Values are keyed as strings, numbers and booleans in their JSON form.
+    returned: When summary is true
+    type: dict
+    sample: {
+        "count": 3,
+        "platform": {"ubuntu": 2, "nginx": 1},
+        "team_id": {"12345": 3},
+        "retention": {"30": 2, "90": 1},
+        "ingest_paused": {"false": 3}
+    }
+deadline_exceeded:
+    description:
+        - Set when the task failed because I(deadline) was exceeded.
+        - C(sources) or C(summary) then hold the sources listed before the deadline.
+    returned: When the deadline was exceeded
+    type: bool
+    sample: true
+removed:
+    description: IDs of sources deleted since the snapshot was last refreshed.
+    returned: When cache_path is set
+    type: list
+    elements: str
+    sample: ["123458"]
+not_found:
+    description: Requested ids without a source.
+    returned: When ids is set
+    type: list
+    elements: int
+    sample: [123458]
+concurrency:
+    description: The in-flight limit used for the lookups of I(ids) and the reason for each change.
+    returned: When ids is set
+    type: dict
+    sample: {"limit": 8, "min_limit": 4, "max_limit": 8, "changes": []}
+accounts:
+    description: The outcome for each account.
+    returned: When accounts is set
+    type: list
+    elements: dict
+    contains:
+        alias:
+            description: The account alias.
+            type: str
+            sample: "web"
+        count:
+            description: Number of sources selected from the account.
+            type: int
+            returned: When the account was listed
+            sample: 42
+        elapsed:
+            description: Seconds taken by the account.
+            type: float
+            sample: 1.3
+        msg:
+            description: Why the account could not be listed.
+            type: str
+            returned: When the account failed
+            sample: "Unable to complete API request."
+    sample: [{"alias": "web", "count": 42, "elapsed": 1.3}]
+stale:
+    description: If the sources were served from an expired snapshot.
+    returned: When cache_path is set
+    type: bool
+    sample: false
 '''
 
 from ansible.module_utils.basic import AnsibleModule
-from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError
-from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
-
-def match_source(filter, source):
-    for key,val in filter.items():
-        if val in source[key].lower():
-            return True
-    return False
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_accounts import account_clients, accounts_argument_spec, check_accounts, fan_out
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailDeadlineError, budget_argument_spec, fail_api_error
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_breaker import breaker_argument_spec, circuit_breaker
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_cache import LogtailSourceCache, LogtailCacheError
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_concurrency import LogtailAdaptiveConcurrency, run_parallel
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_http_cache import LogtailHttpCache
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_job import LogtailJobProgress
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_singleflight import LogtailSingleFlight
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSourceSummary, equal_source, index_sources, match_source
 
-def run_module():
-    module_args = dict(
-        token=dict(type='str', required=True, no_log=True),
+def argument_spec():
+    spec = dict(
+        token=dict(type='str', required=False, default=None, no_log=True),
         filter=dict(type='dict', required=False, default=None),
+        match=dict(type='dict', required=False, default=None),
         name=dict(type='str', required=False, default=None),
         id=dict(type='int', required=False, default=None),
+        ids=dict(type='list', elements='int', required=False, default=None),
+        concurrency=dict(type='int', required=False, default=16),
+        since=dict(type='str', required=False, default=None),
+        cache_path=dict(type='path', required=False, default=None),
+        full_refresh=dict(type='bool', required=False, default=False),
+        summary=dict(type='bool', required=False, default=False),
+        key_by=dict(type='str', required=False, default=None,
+                    choices=['id', 'name', 'table_name']),
+        cache_format=dict(type='str', default='json', choices=['json', 'sqlite']),
+        cache_ttl=dict(type='int', required=False, default=0),
+        cache_stale_while_revalidate=dict(type='int', required=False, default=0),
+        cache_stale_if_error=dict(type='int', required=False, default=0),
+        coalesce_dir=dict(type='path', required=False, default=None),
+        daemon_socket=dict(type='path', required=False, default=None),
+        http_cache_dir=dict(type='path', required=False, default=None),
+        progress_file=dict(type='path', required=False, default=None),
     )
+    spec.update(accounts_argument_spec())
+    spec.update(breaker_argument_spec())
+    spec.update(budget_argument_spec())
+    return spec
 
-    result = dict(
-        changed=False,
-        sources=list(),
-    )
 
-    module = AnsibleModule(
-        argument_spec=module_args,
-        supports_check_mode=True
+def argument_constraints():
+    return dict(
+        mutually_exclusive=[
+            ('id', 'ids'), ('token', 'accounts'), ('accounts', 'id'),
+            ('accounts', 'ids'), ('accounts', 'cache_path'),
+            ('accounts', 'daemon_socket')],
+        required_one_of=[('token', 'accounts')],
     )
 
-    token = module.params['token']
+
+def coalescer(module):
+    """ Return the LogtailSingleFlight of coalesce_dir, or None """
+    if module.params['coalesce_dir'] is None:
+        return None
+    singleflight = LogtailSingleFlight(module.params['coalesce_dir'])
+    if not singleflight.secure():
+        module.warn(
+            "Requests are not coalesced, %s can be reached by other users "
+            "and results hold source tokens" % singleflight.directory)
+    return singleflight
+
+
+def list_account(lt, since, selected, summary=None):
+    """ Return the selected sources of one account, listed through the API
+    or the daemon. With a summary they are counted into it instead and an
+    empty list is returned. """
+    if summary is not None and since is None:
+        # Count each page as it arrives instead of keeping it
+        for page in lt.iter_source_pages():
+            for source in page or list():
+                if selected(source):
+                    summary.add(source)
+        return list()
+    if since is not None:
+        sources = lt.get_sources_since(since)[0]
+    else:
+        sources = lt.get_all_sources()
+    sources = [source for source in sources or list() if selected(source)]
+    if summary is not None:
+        for source in sources:
+            summary.add(source)
+        return list()
+    return sources
+
+
+def list_accounts(module, result, selected, summary, progress):
+    """ List every account of the accounts param in parallel, adding the
+    sources tagged with their account alias to the result. Returns the
+    errors of the accounts that failed. """
+    singleflight = coalescer(module)
+
+    def configure(lt, alias):
+        lt.singleflight = singleflight
+        lt.breaker = circuit_breaker(module.params, alias)
+        if module.params['http_cache_dir'] is not None:
+            lt.http_cache = LogtailHttpCache(module.params['http_cache_dir'])
+        lt.set_budget(module.params['timeout'], module.params['deadline'])
+        lt.progress = progress
+
+    def run(alias, lt):
+        counts = LogtailSourceSummary() if summary is not None else None
+        sources = list_account(
+            lt, module.params['since'], selected, counts)
+        return sources, counts
+
+    clients = account_clients(module.params['accounts'], configure)
+    result['accounts'] = list()
+    errors = list()
+    for alias, outcome, error, elapsed in fan_out(
+            run, clients, module.params['account_concurrency']):
+        entry = dict(alias=alias, elapsed=elapsed)
+        if error is not None:
+            entry['msg'] = error.msg
+            errors.append("%s: %s" % (alias, error.msg))
+            if isinstance(error, LogtailDeadlineError):
+                result['deadline_exceeded'] = True
+        else:
+            sources, counts = outcome
+            for source in sources:
+                source['account'] = alias
+                result['sources'].append(source)
+            if counts is not None:
+                summary.merge(counts)
+                entry['count'] = counts.count
+            else:
+                entry['count'] = len(sources)
+        result['accounts'].append(entry)
+    return errors
+
+
+def report(module, result, summary, progress, msg=None):
+    """ Exit with the selected sources, failing with msg when set """
+    if summary is not None:
+        for source in result.pop('sources'):
+            summary.add(source)
+        result['summary'] = summary.get_dict()
+    elif module.params['key_by'] is not None:
+        result['sources_by_key'], duplicates = index_sources(
+            result.pop('sources'), module.params['key_by'])
+        if duplicates:
+            module.warn(
+                "Several sources share the %s %s, only the first is returned"
+                % (module.params['key_by'], ', '.join(duplicates)))
+    if msg is not None:
+        if progress is not None:
+            progress.fail(msg)
+        return module.fail_json(msg=msg, **result)
+    if progress is not None:
+        progress.finish("Found %i sources" % (
+            summary.count if summary is not None
+            else len(result['sources'])))
+    return module.exit_json(**result)
+
+
+def query_sources(module, lt, result, selected, summary, progress):
+    """ Add the sources requested by id, ids or a listing to the result
+    and exit """
     filter = module.params['filter']
     name = module.params['name']
     id = module.params['id']
-    lt = LogtailApiClient(token)
+    ids = module.params['ids']
+    since = module.params['since']
+    cache_path = module.params['cache_path']
 
     if id is not None:
         source = None
         try:
             source = lt.get_source(id)
         except LogtailApiError as e:
-            return module.fail_json(msg=e.msg, **result)
+            return fail_api_error(module, result, e, progress)
         if not source:  # Source not found
-            return module.fail_json(
-                msg="No source found with ID %s" % id,
-                ** result)
+            return report(module, result, summary, progress,
+                          "No source found with ID %s" % id)
         result['sources'].append(source.get_dict())
+    elif ids is not None:
+        unique = list()
+        seen = set()
+        for source_id in ids:
+            if source_id not in seen:
+                seen.add(source_id)
+                unique.append(source_id)
+        controller = LogtailAdaptiveConcurrency(
+            initial=min(4, module.params['concurrency']),
+            maximum=module.params['concurrency'])
+        result['not_found'] = list()
+        errors = list()
+        for source_id, (source, error) in zip(
+                unique, run_parallel(lt.get_source, unique, controller)):
+            if error is not None:
+                errors.append("%s: %s" % (source_id, error.msg))
+                if isinstance(error, LogtailDeadlineError):
+                    result['deadline_exceeded'] = True
+            elif not source:
+                result['not_found'].append(source_id)
+            else:
+                result['sources'].append(source.get_dict())
+        result['concurrency'] = controller.report()
+        if progress is not None:
+            progress.advance(items=len(result['sources']))
+        if errors:
+            return report(module, result, summary, progress,
+                          "Failed to pull %i sources. %s" % (
+                              len(errors), '; '.join(errors)))
     else:
-        sources = None
         try:
-            sources = lt.get_all_sources()
-        except LogtailApiError as e:
-            return module.fail_json(msg=e.msg, **result)
-        if sources:
-            for source in sources:
-                if name is None and filter is None:
-                    result['sources'].append(source)
-                elif name is not None and name == source['name']:
-                    result['sources'].append(source)
-                elif filter is not None:
-                    if match_source(filter, source):
-                        result['sources'].append(source)
-    return module.exit_json(**result)
+            if cache_path is not None:
+                if module.params['cache_format'] == 'sqlite':
+                    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_index import LogtailSourceIndex
+                    cache = LogtailSourceIndex(cache_path, lt.token)
+                else:
+                    cache = LogtailSourceCache(cache_path, lt.token)
+                cache.load()
+                changes = cache.revalidate(
+                    lt,
+                    ttl=module.params['cache_ttl'],
+                    stale_while_revalidate=module.params[
+                        'cache_stale_while_revalidate'],
+                    stale_if_error=module.params['cache_stale_if_error'],
+                    full=module.params['full_refresh'])
+                if changes:
+                    result['removed'] = changes['removed']
+                    result['stale'] = changes['stale']
+                    if 'error' in changes:
+                        module.warn(
+                            "Serving stale sources, the refresh failed: %s"
+                            % changes['error'])
+                    # The cache answers name and filter queries itself
+                    result['sources'] = cache.find_sources(
+                        name=name, filter=filter, since=since,
+                        match=module.params['match'])
+            else:
+                result['sources'] = list_account(
+                    lt, since, selected, summary)
+        except (LogtailApiError, LogtailCacheError) as e:
+            if isinstance(e, LogtailDeadlineError):
+                # Return what was listed before the deadline
+                if summary is not None:
+                    result.pop('sources')
+                    result['summary'] = summary.get_dict()
+                elif e.partial:
+                    result['sources'] = [
+                        source for source in e.partial if selected(source)]
+            return fail_api_error(module, result, e, progress)
+    return report(module, result, summary, progress)
+
+
+def run_module(module=None):
+    result = dict(
+        changed=False,
+        sources=list(),
+    )
+
+    # Action plugins pass in a module that runs on the controller
+    if module is None:
+        module = AnsibleModule(
+            argument_spec=argument_spec(),
+            supports_check_mode=True,
+            **argument_constraints()
+        )
+    error = check_accounts(module.params)
+    if error is not None:
+        return module.fail_json(msg=error, **result)
+
+    token = module.params['token']
+    filter = module.params['filter']
+    match = module.params['match']
+    name = module.params['name']
+    summary = None
+    if module.params['summary']:
+        summary = LogtailSourceSummary()
+
+    def selected(source):
+        if match and not equal_source(match, source):
+            return False
+        if name is None and filter is None:
+            return True
+        if name is not None and name == source['name']:
+            return True
+        return filter is not None and match_source(filter, source)
+
+    progress = None
+    if module.params['progress_file'] is not None:
+        progress = LogtailJobProgress(
+            module.params['progress_file'], 'logtail_source_info').start()
+
+    if module.params['accounts'] is not None:
+        errors = list_accounts(module, result, selected, summary, progress)
+        msg = None
+        if errors:
+            msg = "Failed to list %i accounts. %s" % (
+                len(errors), '; '.join(errors))
+        return report(module, result, summary, progress, msg)
+
+    singleflight = coalescer(module)
+    if module.params['daemon_socket'] is not None:
+        # Imported on demand to keep the default startup lean
+        from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_daemon import connect_client
+        lt = connect_client(token, module.params['daemon_socket'],
+                            timeout=module.params['timeout'],
+                            deadline=module.params['deadline'])
+    else:
+        lt = LogtailApiClient(token, singleflight=singleflight)
+        lt.breaker = circuit_breaker(module.params)
+        if module.params['http_cache_dir'] is not None:
+            lt.http_cache = LogtailHttpCache(module.params['http_cache_dir'])
+        lt.set_budget(module.params['timeout'], module.params['deadline'])
+    lt.progress = progress
+
+    # Connections to the daemon are closed once the module exits
+    with lt:
+        query_sources(module, lt, result, selected, summary, progress)
+
 
 def main():
     run_module()
@@ -0,0 +1,354 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: logtail_source_ingest
+
+short_description: Pause or resume log ingesting for many Logtail sources.
+
+version_added: "2.12.0"
+
+description:
+    - Select sources by name or key-value filter from a single listing and set their ingest state.
+    - Sources already in the requested state are skipped, the others are updated in parallel.
+
+options:
+    name:
+        description: Select the sources with this name.
+        required: false
+        type: str
+    filter:
+        description: Select sources by key-value filter, as in M(sd_hardy.logtail.logtail_source_info).
+        required: false
+        type: dict
+    ingest_paused:
+        description: Pause log ingesting for the selected sources when true, resume it when false.
+        required: true
+        type: bool
+    concurrency:
+        description:
+            - Maximum number of updates in flight.
+            - The number in flight starts lower and adapts to the API's latency and throttling.
+        required: false
+        default: 16
+        type: int
+    progress_file:
+        description:
+            - Path of a status file updated as sources are updated, see M(sd_hardy.logtail.logtail_job_info).
+            - The status of a previous job is removed when the task is submitted with C(async).
+        required: false
+        type: path
+    token:
+        description:
+            - Your Logtail API Token.
+            - Required unless I(accounts) is set.
+        required: false
+        type: str
+notes:
+    - This module runs on the Ansible controller through its action plugin, it is not copied to the managed host.
+    - Tasks run with C(async) are executed on the managed host instead.
+extends_documentation_fragment:
+    - sd_hardy.logtail.accounts
+    - sd_hardy.logtail.circuit_breaker
+    - sd_hardy.logtail.request_budget
+author:
+    - Skyler Hardy (https://github.com/sd-hardy)
+'''
+
+EXAMPLES = r'''
+- name: Pause ingesting for every nginx source
+  sd_hardy.logtail.logtail_source_ingest:
+    token: "{{ logtail_api_token }}"
+    filter:
+      platform: nginx
+    ingest_paused: true
+
+- name: Pause ingesting for the nginx sources of every team at once
+  sd_hardy.logtail.logtail_source_ingest:
+    accounts: "{{ logtail_accounts }}"
+    filter:
+      platform: nginx
+    ingest_paused: true
+
+- name: Resume ingesting for a source name
+  sd_hardy.logtail.logtail_source_ingest:
+    token: "{{ logtail_api_token }}"
+    name: web01.example.com
+    ingest_paused: false
+'''
+
+RETURN = r'''
+message:
+    description: The output message the module generates.
+    type: str
+    returned: always
+    sample: 'Updated 12 of 15 sources'
+results:
+    description: The outcome for each selected source.
+    returned: always
+    type: list
+    elements: dict
+    contains:
+        id:
+            description: The Source ID.
+            type: str
+            sample: "123456"
+        name:
+            description: The Source Name.
+            type: str
+            sample: "MySource"
+        outcome:
+            description: One of updated, unchanged or failed.
+            type: str
+            sample: "updated"
+        msg:
+            description: The error when the update failed.
+            type: str
+            returned: When outcome is failed
+            sample: "Unable to complete API request."
+        account:
+            description: The alias of the account the source belongs to.
+            type: str
+            returned: When accounts is set
+            sample: "web"
+    sample: [{"id": "123456", "name": "MySource", "outcome": "updated"}]
+accounts:
+    description: The outcome for each account.
+    returned: When accounts is set
+    type: list
+    elements: dict
+    contains:
+        alias:
+            description: The account alias.
+            type: str
+            sample: "web"
+        elapsed:
+            description: Seconds taken by the account.
+            type: float
+            sample: 1.3
+        msg:
+            description: Why the sources of the account could not be listed.
+            type: str
+            returned: When the account failed
+            sample: "Unable to complete API request."
+        concurrency:
+            description: The in-flight limit used for the updates of the account.
+            type: dict
+            returned: When sources of the account were updated
+            sample: {"limit": 8, "min_limit": 4, "max_limit": 8, "changes": []}
+    sample: [{"alias": "web", "elapsed": 1.3}]
+elapsed:
+    description: Seconds taken by the listing and the updates.
+    type: float
+    returned: always
+    sample: 3.2
+deadline_exceeded:
+    description:
+        - Set when the task failed because I(deadline) was exceeded.
+        - Sources not updated before the deadline are reported as failed.
+    returned: When the deadline was exceeded
+    type: bool
+    sample: true
+concurrency:
+    description: The in-flight limit used for the updates and the reason for each change.
+    type: dict
+    returned: When sources were updated without accounts
+    sample: {"limit": 8, "min_limit": 4, "max_limit": 8, "changes": []}
+'''
+
+import time
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_accounts import account_clients, accounts_argument_spec, check_accounts, fan_out
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailDeadlineError, budget_argument_spec, fail_api_error
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_breaker import breaker_argument_spec, circuit_breaker
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_concurrency import LogtailAdaptiveConcurrency, run_parallel
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_job import LogtailJobProgress
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import match_source
+
+
+def argument_spec():
+    spec = dict(
+        token=dict(type='str', required=False, default=None, no_log=True),
+        name=dict(type='str', required=False, default=None),
+        filter=dict(type='dict', required=False, default=None),
+        ingest_paused=dict(type='bool', required=True),
+        concurrency=dict(type='int', required=False, default=16),
+        progress_file=dict(type='path', required=False, default=None),
+    )
+    spec.update(accounts_argument_spec())
+    spec.update(breaker_argument_spec())
+    spec.update(budget_argument_spec())
+    return spec
+
+
+def argument_constraints():
+    return dict(
+        mutually_exclusive=[('token', 'accounts')],
+        required_one_of=[('name', 'filter'), ('token', 'accounts')],
+    )
+
+
+def ingest_account(lt, module, progress=None):
+    """ Set the ingest state of the selected sources of one account.
+    Returns the result entry of each selected source, the concurrency
+    report when updates were sent and whether the deadline was exceeded. """
+    name = module.params['name']
+    filter = module.params['filter']
+    ingest = module.params['ingest_paused']
+    sources = lt.get_all_sources()
+    if sources is False:
+        raise LogtailApiError("Unable to list the sources to update")
+    selected = list()
+    for source in sources:
+        if name is not None and name != source['name']:
+            continue
+        if filter is not None and not match_source(filter, source):
+            continue
+        selected.append(source)
+    pending = [s for s in selected if s['ingest_paused'] != ingest]
+
+    report = None
+    if pending and not module.check_mode:
+        def update(source):
+            try:
+                updated = lt.update_source(source['id'], None, None, ingest)
+            except LogtailApiError:
+                if progress is not None:
+                    progress.advance(failed=1)
+                raise
+            if progress is not None:
+                progress.advance(applied=1 if updated else 0,
+                                 failed=0 if updated else 1)
+            return updated
+
+        controller = LogtailAdaptiveConcurrency(
+            initial=min(4, module.params['concurrency']),
+            maximum=module.params['concurrency'])
+        outcomes = dict(
+            (source['id'], outcome) for source, outcome in
+            zip(pending, run_parallel(update, pending, controller)))
+        report = controller.report()
+    else:
+        outcomes = dict((source['id'], (True, None)) for source in pending)
+
+    entries = list()
+    deadline_exceeded = False
+    for source in selected:
+        entry = dict(id=source['id'], name=source['name'])
+        if source['id'] not in outcomes:
+            entry['outcome'] = 'unchanged'
+        elif outcomes[source['id']][1] is not None or \
+                not outcomes[source['id']][0]:
+            error = outcomes[source['id']][1]
+            entry['outcome'] = 'failed'
+            entry['msg'] = error.msg if error is not None \
+                else "An error occurred while updating the source"
+            if isinstance(error, LogtailDeadlineError):
+                deadline_exceeded = True
+        else:
+            entry['outcome'] = 'updated'
+        entries.append(entry)
+    return entries, report, deadline_exceeded
+
+
+def run_module(module=None):
+    result = dict(
+        changed=False,
+        message='',
+        results=list(),
+        elapsed=0.0,
+    )
+
+    # Action plugins pass in a module that runs on the controller
+    if module is None:
+        module = AnsibleModule(
+            argument_spec=argument_spec(),
+            supports_check_mode=True,
+            **argument_constraints()
+        )
+    error = check_accounts(module.params)
+    if error is not None:
+        return module.fail_json(msg=error, **result)
+
+    started = time.time()
+    progress = None
+    if module.params['progress_file'] is not None:
+        progress = LogtailJobProgress(
+            module.params['progress_file'], 'logtail_source_ingest').start()
+
+    def configure(lt, alias=None):
+        lt.breaker = circuit_breaker(module.params, alias)
+        lt.set_budget(module.params['timeout'], module.params['deadline'])
+        lt.progress = progress
+
+    errors = list()
+    if module.params['accounts'] is not None:
+        result['accounts'] = list()
+        clients = account_clients(module.params['accounts'], configure)
+        for alias, outcome, error, elapsed in fan_out(
+                lambda alias, lt: ingest_account(lt, module, progress),
+                clients,
+                module.params['account_concurrency']):
+            account = dict(alias=alias, elapsed=elapsed)
+            if error is not None:
+                account['msg'] = error.msg
+                errors.append("%s: %s" % (alias, error.msg))
+                if isinstance(error, LogtailDeadlineError):
+                    result['deadline_exceeded'] = True
+            else:
+                entries, report, deadline_exceeded = outcome
+                for entry in entries:
+                    entry['account'] = alias
+                result['results'].extend(entries)
+                if report is not None:
+                    account['concurrency'] = report
+                if deadline_exceeded:
+                    result['deadline_exceeded'] = True
+            result['accounts'].append(account)
+    else:
+        lt = LogtailApiClient(module.params['token'])
+        configure(lt)
+        try:
+            entries, report, deadline_exceeded = \
+                ingest_account(lt, module, progress)
+        except LogtailApiError as e:
+            return fail_api_error(module, result, e, progress)
+        result['results'] = entries
+        if report is not None:
+            result['concurrency'] = report
+        if deadline_exceeded:
+            result['deadline_exceeded'] = True
+
+    updated = len([e for e in result['results'] if e['outcome'] == 'updated'])
+    failed = len([e for e in result['results'] if e['outcome'] == 'failed'])
+    result['changed'] = updated > 0
+    result['elapsed'] = time.time() - started
+    result['message'] = "Updated %i of %i sources" % (
+        updated, len(result['results']))
+    msg = None
+    if errors:
+        msg = "Failed to list %i accounts. %s" % (
+            len(errors), '; '.join(errors))
+    elif failed:
+        msg = "Failed to update %i sources" % failed
+    if msg is not None:
+        if progress is not None:
+            progress.fail(msg)
+        return module.fail_json(msg=msg, **result)
+    if progress is not None:
+        progress.finish(result['message'])
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,428 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: logtail_source_plan
+
+short_description: Plan and apply Logtail source changes from a desired state.
+
+version_added: "2.12.0"
+
+description:
+    - With I(mode=plan) reads the source listing once and writes every create, update and delete needed
+      to reach the desired state to I(plan_file), without changing the account.
+    - With I(mode=apply) runs the actions of I(plan_file) in parallel.
+    - Apply only lists the sources changed since the plan was made. Their updates are recomputed from the fresh record,
+      while deletes of those sources and creates of a name that appeared meanwhile are skipped as conflicts.
+    - Sources are matched to the desired state by name.
+
+options:
+    mode:
+        description: Write a plan or apply an existing one.
+        required: false
+        default: plan
+        type: str
+        choices:
+        - plan
+        - apply
+    plan_file:
+        description:
+            - Path of the plan, a JSON file readable by the owner only.
+            - With I(accounts) each account has its own plan, named after this path with C(.<alias>) appended.
+        required: true
+        type: path
+    desired:
+        description:
+            - The desired sources, each with a C(name) and optionally C(platform), C(ingest_paused) and C(autogen_views).
+            - C(platform) is required for sources that do not exist yet.
+            - With I(mode=plan) one of I(desired) or I(desired_file) is required.
+            - With I(accounts) a source with an C(account) alias is only planned in that account,
+              sources without one are planned in every account.
+        required: false
+        type: list
+        elements: dict
+    desired_file:
+        description: Path of a YAML or JSON file holding the I(desired) list, or a mapping with a C(sources) list.
+        required: false
+        type: path
+    prune:
+        description: Delete sources whose name is not in the desired state.
+        required: false
+        default: false
+        type: bool
+    concurrency:
+        description: Maximum number of requests in flight when applying.
+        required: false
+        default: 16
+        type: int
+    token:
+        description:
+            - Your Logtail API Token.
+            - Required unless I(accounts) is set.
+        required: false
+        type: str
+notes:
+    - This module runs on the Ansible controller through its action plugin, it is not copied to the managed host.
+    - Planning does not change the account and always reports C(changed=false).
+extends_documentation_fragment:
+    - sd_hardy.logtail.accounts
+    - sd_hardy.logtail.circuit_breaker
+    - sd_hardy.logtail.request_budget
+author:
+    - Skyler Hardy (https://github.com/sd-hardy)
+'''
+
+EXAMPLES = r'''
+- name: Plan the source changes
+  sd_hardy.logtail.logtail_source_plan:
+    token: "{{ logtail_api_token }}"
+    desired_file: files/logtail_sources.yml
+    plan_file: ~/.ansible/logtail/sources.plan
+    prune: true
+  register: plan
+
+- name: Apply the reviewed plan
+  sd_hardy.logtail.logtail_source_plan:
+    token: "{{ logtail_api_token }}"
+    mode: apply
+    plan_file: ~/.ansible/logtail/sources.plan
+
+- name: Plan the sources of several teams at once
+  sd_hardy.logtail.logtail_source_plan:
+    accounts:
+      - alias: web
+        token: "{{ logtail_web_token }}"
+      - alias: data
+        token: "{{ logtail_data_token }}"
+    desired:
+      - name: nginx
+        platform: nginx
+      - name: warehouse
+        platform: postgresql
+        account: data
+    plan_file: ~/.ansible/logtail/sources.plan
+'''
+
+RETURN = r'''
+message:
+    description: The output message the module generates.
+    type: str
+    returned: always
+    sample: 'Planned 2 creates, 10 updates and 1 deletes'
+actions:
+    description: The planned actions, with their outcome when applied.
+    returned: always
+    type: list
+    elements: dict
+    contains:
+        action:
+            description: One of create, update or delete.
+            type: str
+            sample: "update"
+        id:
+            description: The Source ID, null for creates that did not run.
+            type: str
+            sample: "123456"
+        name:
+            description: The Source Name.
+            type: str
+            sample: "MySource"
+        changes:
+            description: The attributes an update sends, with their new values.
+            type: dict
+            returned: For updates
+            sample: {"ingest_paused": true}
+        expected_updated_at:
+            description: The update timestamp of the source when the plan was made.
+            type: str
+            returned: For updates and deletes
+            sample: "2022-07-01T10:56:05.177Z"
+        drifted:
+            description: If the source changed between planning and applying.
+            type: bool
+            returned: When applied
+            sample: false
+        outcome:
+            description: One of applied, unchanged, conflict, missing or failed.
+            type: str
+            returned: When applied
+            sample: "applied"
+        msg:
+            description: Why the action failed or was skipped.
+            type: str
+            returned: When outcome is failed or conflict
+            sample: "Unable to complete API request."
+        deadline_exceeded:
+            description: Set when the action was not run because I(deadline) was exceeded.
+            type: bool
+            returned: When the deadline was exceeded
+            sample: true
+        account:
+            description: The alias of the account the action belongs to.
+            type: str
+            returned: When accounts is set
+            sample: "web"
+counts:
+    description: Number of actions per action type when planning, per outcome when applying.
+    returned: always
+    type: dict
+    sample: {"create": 2, "update": 10, "delete": 1}
+deadline_exceeded:
+    description: Set when the task failed because I(deadline) was exceeded.
+    returned: When the deadline was exceeded
+    type: bool
+    sample: true
+concurrency:
+    description: The in-flight limit used when applying and the reason for each change.
+    type: dict
+    returned: When a plan was applied without accounts
+    sample: {"limit": 8, "min_limit": 4, "max_limit": 8, "changes": []}
+accounts:
+    description: The outcome for each account.
+    returned: When accounts is set
+    type: list
+    elements: dict
+    contains:
+        alias:
+            description: The account alias.
+            type: str
+            sample: "web"
+        elapsed:
+            description: Seconds taken by the account.
+            type: float
+            sample: 1.3
+        counts:
+            description: Number of actions of the account, per action type or per outcome like I(counts).
+            type: dict
+            returned: When the account was planned or applied
+            sample: {"update": 2}
+        msg:
+            description: Why the account could not be planned or applied.
+            type: str
+            returned: When the account failed
+            sample: "Unable to read plan"
+        concurrency:
+            description: The in-flight limit used for the account.
+            type: dict
+            returned: When the plan of the account was applied
+            sample: {"limit": 8, "min_limit": 4, "max_limit": 8, "changes": []}
+    sample: [{"alias": "web", "elapsed": 1.3, "counts": {"update": 2}}]
+'''
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible.module_utils.common.yaml import HAS_YAML, yaml_load
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_accounts import account_clients, accounts_argument_spec, check_accounts, fan_out
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailDeadlineError, budget_argument_spec, fail_api_error
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_breaker import account_path, breaker_argument_spec, circuit_breaker
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_concurrency import LogtailAdaptiveConcurrency
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_plan import LogtailSourcePlan, LogtailPlanError
+
+try:
+    from yaml import YAMLError
+except ImportError:
+    YAMLError = ValueError
+
+
+def argument_spec():
+    spec = dict(
+        token=dict(type='str', required=False, default=None, no_log=True),
+        mode=dict(type='str', default='plan', choices=['plan', 'apply']),
+        plan_file=dict(type='path', required=True),
+        desired=dict(type='list', elements='dict', required=False, default=None),
+        desired_file=dict(type='path', required=False, default=None),
+        prune=dict(type='bool', required=False, default=False),
+        concurrency=dict(type='int', required=False, default=16),
+    )
+    spec.update(accounts_argument_spec())
+    spec.update(breaker_argument_spec())
+    spec.update(budget_argument_spec())
+    return spec
+
+
+def argument_constraints():
+    return dict(
+        mutually_exclusive=[('desired', 'desired_file'), ('token', 'accounts')],
+        required_one_of=[('token', 'accounts')],
+        required_if=[('mode', 'plan', ('desired', 'desired_file'), True)],
+    )
+
+
+def load_desired(path):
+    try:
+        with open(path, 'r') as f:
+            # YAML is a superset of JSON, one loader reads both
+            desired = yaml_load(f)
+    except (IOError, OSError) as e:
+        raise LogtailPlanError(
+            "Unable to read desired state %s. Reason: %s" % (path, e))
+    except (ValueError, YAMLError) as e:
+        raise LogtailPlanError(
+            "Unable to parse desired state %s. Reason: %s" % (path, e))
+    if isinstance(desired, dict):
+        desired = desired.get('sources')
+    if not isinstance(desired, list):
+        raise LogtailPlanError(
+            "The desired state %s must be a list of sources" % path)
+    return desired
+
+
+def count(actions, key):
+    counts = dict()
+    for action in actions:
+        counts[action[key]] = counts.get(action[key], 0) + 1
+    return counts
+
+
+def plan_account(lt, module, plan, desired):
+    """ Build and save the plan of one account, returns its actions """
+    sources = lt.get_all_sources()
+    if sources is False:
+        raise LogtailPlanError("Unable to list the sources to plan against")
+    actions = plan.build(sources, desired, prune=module.params['prune'])
+    if not module.check_mode:
+        plan.save()
+    return actions
+
+
+def apply_account(lt, module, plan):
+    """ Apply the saved plan of one account. Returns the steps and the
+    concurrency report, None in check mode where nothing is run. """
+    plan.load()
+    if module.check_mode:
+        return plan.actions, None
+    controller = LogtailAdaptiveConcurrency(
+        initial=min(4, module.params['concurrency']),
+        maximum=module.params['concurrency'])
+    return plan.apply(lt, controller), controller.report()
+
+
+def run_module(module=None):
+    result = dict(
+        changed=False,
+        message='',
+        actions=list(),
+        counts=dict(),
+    )
+
+    # Action plugins pass in a module that runs on the controller
+    if module is None:
+        module = AnsibleModule(
+            argument_spec=argument_spec(),
+            supports_check_mode=True,
+            **argument_constraints()
+        )
+    error = check_accounts(module.params)
+    if error is not None:
+        return module.fail_json(msg=error, **result)
+
+    mode = module.params['mode']
+    accounts = module.params['accounts']
+    desired = module.params['desired']
+    if mode == 'plan' and desired is None:
+        if not HAS_YAML:
+            return module.fail_json(
+                msg="PyYAML is required to read desired_file", **result)
+        try:
+            desired = load_desired(module.params['desired_file'])
+        except LogtailPlanError as e:
+            return module.fail_json(msg=e.msg, **result)
+    if mode == 'plan' and accounts is not None:
+        aliases = [account['alias'] for account in accounts]
+        for entry in desired:
+            if isinstance(entry, dict) and \
+                    entry.get('account') not in [None] + aliases:
+                return module.fail_json(
+                    msg="The desired source %s names the unknown account %s"
+                    % (entry.get('name'), entry['account']), **result)
+
+    def configure(lt, alias=None):
+        lt.breaker = circuit_breaker(module.params, alias)
+        lt.set_budget(module.params['timeout'], module.params['deadline'])
+
+    def run(alias, lt):
+        path = module.params['plan_file']
+        wanted = desired
+        if alias is not None:
+            # Each account keeps its own plan and desired sources
+            path = account_path(path, alias)
+            if mode == 'plan':
+                wanted = [entry for entry in desired
+                          if not isinstance(entry, dict) or
+                          entry.get('account') in (None, alias)]
+        plan = LogtailSourcePlan(path)
+        if mode == 'plan':
+            return plan_account(lt, module, plan, wanted), None
+        return apply_account(lt, module, plan)
+
+    key = 'outcome' if mode == 'apply' and not module.check_mode \
+        else 'action'
+    errors = list()
+    if accounts is not None:
+        result['accounts'] = list()
+        clients = account_clients(accounts, configure)
+        for alias, outcome, error, elapsed in fan_out(
+                run, clients, module.params['account_concurrency'],
+                errors=(LogtailApiError, LogtailPlanError)):
+            account = dict(alias=alias, elapsed=elapsed)
+            if error is not None:
+                account['msg'] = error.msg
+                errors.append("%s: %s" % (alias, error.msg))
+                if isinstance(error, LogtailDeadlineError):
+                    result['deadline_exceeded'] = True
+            else:
+                actions, report = outcome
+                for action in actions:
+                    action['account'] = alias
+                result['actions'].extend(actions)
+                account['counts'] = count(actions, key)
+                if report is not None:
+                    account['concurrency'] = report
+            result['accounts'].append(account)
+    else:
+        lt = LogtailApiClient(module.params['token'])
+        configure(lt)
+        try:
+            result['actions'], report = run(None, lt)
+        except (LogtailApiError, LogtailPlanError) as e:
+            return fail_api_error(module, result, e)
+        if report is not None:
+            result['concurrency'] = report
+
+    result['counts'] = count(result['actions'], key)
+    if mode == 'plan':
+        result['message'] = \
+            "Planned %i creates, %i updates and %i deletes" % (
+                result['counts'].get('create', 0),
+                result['counts'].get('update', 0),
+                result['counts'].get('delete', 0))
+    elif module.check_mode:
+        result['changed'] = bool(result['actions'])
+        result['message'] = "Would apply %i actions" % len(result['actions'])
+    else:
+        result['changed'] = result['counts'].get('applied', 0) > 0
+        result['message'] = "Applied %i of %i actions" % (
+            result['counts'].get('applied', 0), len(result['actions']))
+        if any(step.get('deadline_exceeded') for step in result['actions']):
+            result['deadline_exceeded'] = True
+    if errors:
+        return module.fail_json(
+            msg="Failed to %s %i accounts. %s" % (
+                mode, len(errors), '; '.join(errors)), **result)
+    if result['counts'].get('failed'):
+        return module.fail_json(
+            msg="Failed to apply %i actions" % result['counts']['failed'],
+            **result)
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,268 @@
+#!/usr/bin/python
+
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+DOCUMENTATION = r'''
+---
+module: logtail_source_watch
+
+short_description: Watch Logtail sources for drift.
+
+version_added: "2.12.0"
+
+description:
+    - Keeps a snapshot of the account's sources in I(state_file) and reports every source created, deleted or
+      modified since the previous poll as a drift event.
+    - A poll reports the sources changed since the newest change seen. The API does not guarantee the order of the
+      listing, so every page is read, use I(http_cache_dir) to have unchanged pages answered with C(304 Not Modified).
+      Deletions are found by a full listing every I(full_scan_interval) seconds.
+    - The first run records the snapshot without reporting events.
+    - With I(duration) the module keeps polling every I(interval) seconds, run it with C(async) for a long watch.
+
+options:
+    state_file:
+        description: Path of the snapshot, a JSON file readable by the owner only. It carries the watch over between runs.
+        required: true
+        type: path
+    events_file:
+        description:
+            - Path of a file the events are appended to as they are found, one JSON object per line.
+            - Each event has C(event), C(id), C(name) and C(detected_at). Created sources carry the new C(source),
+              modified sources the changed fields in C(changes). Failed polls are written as C(error) events with a C(msg).
+            - Events never contain source tokens, a new token shows as a C(token) entry in C(changes) that only holds
+              C(changed=true).
+            - The file is created readable by the owner only.
+        required: false
+        type: path
+    interval:
+        description: Seconds between polls.
+        required: false
+        default: 60
+        type: int
+    duration:
+        description: Seconds to keep polling. With the default of 0 the module polls once.
+        required: false
+        default: 0
+        type: int
+    full_scan_interval:
+        description: Seconds between full listings, which also find deleted sources.
+        required: false
+        default: 900
+        type: int
+    max_events:
+        description:
+            - Number of events returned in C(events), the most recent ones are kept.
+            - I(events_file) and C(counts) still cover every event, so a long watch does not grow the result.
+        required: false
+        default: 100
+        type: int
+    http_cache_dir:
+        description:
+            - Directory keeping API responses with their C(ETag) and C(Last-Modified) validators.
+            - Polls of an unchanged account are then answered with C(304 Not Modified).
+        required: false
+        type: path
+    token:
+        description: Your Logtail API Token.
+        required: true
+        type: str
+notes:
+    - This module runs on the Ansible controller through its action plugin, it is not copied to the managed host.
+    - Tasks run with C(async) are executed on the managed host instead, delegate them to C(localhost).
+    - The account is never changed, the module always reports C(changed=false).
+    - In check mode the account is polled, but neither I(state_file) nor I(events_file) is written.
+    - A failed poll is retried at the next interval, the task only fails when the last poll failed.
+extends_documentation_fragment:
+    - sd_hardy.logtail.circuit_breaker
+    - sd_hardy.logtail.request_budget
+author:
+    - Skyler Hardy (https://github.com/sd-hardy)
+'''
+
+EXAMPLES = r'''
+- name: Report the drift since the last run
+  sd_hardy.logtail.logtail_source_watch:
+    token: "{{ logtail_api_token }}"
+    state_file: ~/.ansible/logtail/watch.json
+  register: drift
+
+- name: Watch for an hour, streaming events to a file
+  sd_hardy.logtail.logtail_source_watch:
+    token: "{{ logtail_api_token }}"
+    state_file: ~/.ansible/logtail/watch.json
+    events_file: /var/log/logtail_drift.ndjson
+    interval: 30
+    duration: 3600
+  delegate_to: localhost
+  async: 3700
+  poll: 0
+'''
+
+RETURN = r'''
+message:
+    description: The output message the module generates.
+    type: str
+    returned: always
+    sample: 'Found 3 drift events in 120 polls'
+events:
+    description: The last I(max_events) events found by this run, as written to I(events_file).
+    returned: always
+    type: list
+    elements: dict
+    sample: [{"event": "modified", "id": "123456", "name": "MySource", "detected_at": "2022-07-01T10:56:05Z",
+              "changes": {"ingest_paused": {"before": false, "after": true}}}]
+counts:
+    description: Number of events per event type, including those left out of C(events).
+    returned: always
+    type: dict
+    sample: {"created": 1, "modified": 2}
+polls:
+    description: Number of polls made.
+    returned: always
+    type: int
+    sample: 120
+sources:
+    description: Number of sources in the snapshot.
+    returned: always
+    type: int
+    sample: 8000
+deadline_exceeded:
+    description: Set when the task failed because I(deadline) was exceeded.
+    returned: When the deadline was exceeded
+    type: bool
+    sample: true
+'''
+
+import json
+import os
+import time
+from collections import deque
+
+from ansible.module_utils.basic import AnsibleModule
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailDeadlineError, budget_argument_spec, fail_api_error
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_breaker import breaker_argument_spec, circuit_breaker
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_http_cache import LogtailHttpCache
+from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_watch import LogtailSourceWatch, LogtailWatchError
+
+
+def argument_spec():
+    spec = dict(
+        token=dict(type='str', required=True, no_log=True),
+        state_file=dict(type='path', required=True),
+        events_file=dict(type='path', required=False, default=None),
+        interval=dict(type='int', required=False, default=60),
+        duration=dict(type='int', required=False, default=0),
+        full_scan_interval=dict(type='int', required=False, default=900),
+        max_events=dict(type='int', required=False, default=100),
+        http_cache_dir=dict(type='path', required=False, default=None),
+    )
+    spec.update(breaker_argument_spec())
+    spec.update(budget_argument_spec())
+    return spec
+
+
+def emit(path, events):
+    """ Append events to path as newline delimited JSON, creating it
+    readable by the owner only """
+    fd = os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+    with os.fdopen(fd, 'a') as f:
+        for event in events:
+            f.write(json.dumps(event, sort_keys=True) + '\n')
+
+
+def run_module(module=None):
+    result = dict(
+        changed=False,
+        message='',
+        events=list(),
+        counts=dict(),
+        polls=0,
+        sources=0,
+    )
+
+    # Action plugins pass in a module that runs on the controller
+    if module is None:
+        module = AnsibleModule(
+            argument_spec=argument_spec(),
+            supports_check_mode=True
+        )
+
+    lt = LogtailApiClient(module.params['token'])
+    lt.breaker = circuit_breaker(module.params)
+    if module.params['http_cache_dir'] is not None:
+        lt.http_cache = LogtailHttpCache(module.params['http_cache_dir'])
+    lt.set_budget(module.params['timeout'], module.params['deadline'])
+    watch = LogtailSourceWatch(module.params['state_file'])
+    events_file = module.params['events_file']
+    interval = module.params['interval']
+    # Only the most recent events are returned, the file keeps them all
+    events = deque(maxlen=max(0, module.params['max_events']))
+
+    try:
+        watch.load()
+    except LogtailWatchError as e:
+        return module.fail_json(msg=e.msg, **result)
+    # Without a snapshot the first poll only records one
+    baseline = watch.sources is None
+
+    started = time.time()
+    error = None
+    while True:
+        try:
+            found = watch.poll(lt, module.params['full_scan_interval'])
+            error = None
+        except LogtailDeadlineError as e:
+            result['events'] = list(events)
+            return fail_api_error(module, result, e)
+        except LogtailApiError as e:
+            error = e.msg
+            found = [dict(
+                event='error', msg=e.msg,
+                detected_at=time.strftime('%Y-%m-%dT%H:%M:%SZ',
+                                          time.gmtime()))]
+        result['polls'] += 1
+        try:
+            # Events are written before the snapshot moves past them
+            if found and events_file is not None and not module.check_mode:
+                emit(events_file, found)
+            if error is None and not module.check_mode:
+                watch.save()
+        except (IOError, OSError) as e:
+            result['events'] = list(events)
+            return module.fail_json(
+                msg="Unable to write events to %s. Reason: %s"
+                % (events_file, e), **result)
+        except LogtailWatchError as e:
+            result['events'] = list(events)
+            return module.fail_json(msg=e.msg, **result)
+        for event in found:
+            result['counts'][event['event']] = \
+                result['counts'].get(event['event'], 0) + 1
+        events.extend(found)
+        if time.time() + interval - started > module.params['duration']:
+            break
+        time.sleep(interval)
+
+    result['events'] = list(events)
+    result['sources'] = len(watch.sources or dict())
+    drift = sum(result['counts'].values()) - result['counts'].get('error', 0)
+    if baseline and result['polls'] == 1 and error is None:
+        result['message'] = "Recorded a snapshot of %i sources" \
+            % result['sources']
+    else:
+        result['message'] = "Found %i drift events in %i polls" \
+            % (drift, result['polls'])
+    if error is not None:
+        return module.fail_json(msg=error, **result)
+    module.exit_json(**result)
+
+
+def main():
+    run_module()
+
+
+if __name__ == '__main__':
+    main()
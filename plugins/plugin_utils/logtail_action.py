@@ -0,0 +1,132 @@
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Shared code for the action plugins of the logtail ansible collection.
+
+The Logtail modules only talk to the Logtail API, so their action plugins
+run the module code in the controller process instead of shipping it to
+the managed host.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+from ansible.module_utils.common.arg_spec import ArgumentSpecValidator
+from ansible.module_utils.common.parameters import remove_values
+from ansible.module_utils.common.text.converters import to_native
+from ansible.module_utils.six import string_types
+from ansible.plugins.action import ActionBase
+
+
+class LogtailModuleExit(Exception):
+    """ Raised by exit_json and fail_json to stop the module code """
+
+    def __init__(self, result):
+        self.result = result
+
+
+def no_log_values(argument_spec, params):
+    """ Return the values of the no_log options in params, including the
+    options of nested dicts and lists of dicts """
+    values = set()
+    for name, spec in argument_spec.items():
+        value = params.get(name)
+        if value is None:
+            continue
+        if spec.get('no_log'):
+            if not isinstance(value, string_types):
+                value = to_native(value)
+            if value:
+                values.add(value)
+        elif spec.get('options'):
+            entries = value if isinstance(value, list) else [value]
+            for entry in entries:
+                if isinstance(entry, dict):
+                    values.update(no_log_values(spec['options'], entry))
+    return values
+
+
+class LogtailControllerModule():
+    """ The subset of AnsibleModule used by the Logtail modules. The
+    constraints are the AnsibleModule arguments of the same name. """
+
+    def __init__(self, argument_spec, args, check_mode=False, diff=False,
+                 mutually_exclusive=None, required_one_of=None,
+                 required_if=None):
+        self.check_mode = check_mode
+        self._diff = diff
+        self.warnings = list()
+        validated = ArgumentSpecValidator(
+            argument_spec,
+            mutually_exclusive=mutually_exclusive,
+            required_one_of=required_one_of,
+            required_if=required_if).validate(args)
+        self.params = validated.validated_parameters
+        # Tokens passed in args are hidden even when validation fails
+        self.no_log_values = no_log_values(argument_spec, args)
+        self.no_log_values.update(
+            no_log_values(argument_spec, self.params))
+        if validated.error_messages:
+            self.fail_json(msg=validated.error_messages[0])
+
+    def warn(self, warning):
+        self.warnings.append(warning)
+
+    def _result(self, kwargs):
+        kwargs.setdefault('changed', False)
+        if self.warnings:
+            kwargs['warnings'] = self.warnings
+        return remove_values(kwargs, self.no_log_values)
+
+    def exit_json(self, **kwargs):
+        raise LogtailModuleExit(self._result(kwargs))
+
+    def fail_json(self, msg, **kwargs):
+        kwargs['failed'] = True
+        kwargs['msg'] = msg
+        raise LogtailModuleExit(self._result(kwargs))
+
+
+class LogtailActionBase(ActionBase):
+    """ Runs `module.run_module` on the controller. Subclasses set
+    `module` to the imported module, which may define
+    argument_constraints() returning its mutually_exclusive,
+    required_one_of and required_if lists. """
+
+    module = None
+    TRANSFERS_FILES = False
+    _supports_check_mode = True
+    _supports_async = True
+
+    def run(self, tmp=None, task_vars=None):
+        result = super(LogtailActionBase, self).run(tmp, task_vars)
+        del tmp
+
+        if self._task.async_val:
+            progress_file = self._task.args.get('progress_file')
+            if progress_file:
+                # Until the job writes its own status, the status of the
+                # previous job must not be read as this one's
+                self._execute_module(
+                    module_name='ansible.builtin.file',
+                    module_args=dict(path=progress_file, state='absent'),
+                    task_vars=task_vars)
+            # Background jobs need the module to run as its own process
+            result.update(self._execute_module(
+                module_name=self._task.action,
+                module_args=self._task.args,
+                task_vars=task_vars,
+                wrap_async=True))
+            return result
+
+        constraints = getattr(self.module, 'argument_constraints', dict)()
+        try:
+            self.module.run_module(LogtailControllerModule(
+                self.module.argument_spec(),
+                self._task.args,
+                check_mode=self._play_context.check_mode,
+                diff=self._play_context.diff,
+                **constraints))
+        except LogtailModuleExit as e:
+            result.update(e.result)
+        return result
@@ -0,0 +1,139 @@
+#!/usr/bin/env python
+# Copyright: (c) 2022, Skyler Hardy <skyler.hardy@gmail.com>
+# GNU General Public License v3.0+ (see COPYING or https://www.gnu.org/licenses/gpl-3.0.txt)
+
+"""Benchmark the AnsiballZ payload size and cold-start time of the modules.
+
+Run it from anywhere inside an ansible_collections/sd_hardy/logtail checkout:
+
+  python tests/benchmarks/module_payload.py [--runs 20] [--collections-path DIR]
+  python tests/benchmarks/module_payload.py --check
+
+The payload is built with the same dependency finder AnsiballZ uses. The
+cold start is the time a fresh interpreter takes to import the module, the
+part of each remote execution that happens before the first API call.
+
+With --check nothing is timed. Instead it fails when a module ships a
+collection module_util that is not listed for it in MODULE_UTILS, so a new
+import cannot silently grow the payload of every module.
+"""
+
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import argparse
+import io
+import os
+import statistics
+import subprocess
+import sys
+import zipfile
+
+MODULES = (
+    'logtail_env', 'logtail_job_info', 'logtail_source', 'logtail_source_info',
+    'logtail_source_ingest', 'logtail_source_plan', 'logtail_source_watch')
+COLLECTION = 'ansible_collections.sd_hardy.logtail'
+
+# The collection module_utils each module may ship, the ones reachable
+# through its options
+COMMON = ('logtail_api', 'logtail_breaker', 'logtail_source')
+MODULE_UTILS = dict(
+    logtail_env=(),
+    logtail_job_info=('logtail_job',),
+    logtail_source=COMMON + (
+        'logtail_daemon', 'logtail_http_cache', 'logtail_transport'),
+    logtail_source_info=COMMON + (
+        'logtail_accounts', 'logtail_cache', 'logtail_concurrency',
+        'logtail_daemon', 'logtail_http_cache', 'logtail_index',
+        'logtail_job', 'logtail_singleflight', 'logtail_transport'),
+    logtail_source_ingest=COMMON + (
+        'logtail_accounts', 'logtail_concurrency', 'logtail_job',
+        'logtail_transport'),
+    logtail_source_plan=COMMON + (
+        'logtail_accounts', 'logtail_concurrency', 'logtail_plan',
+        'logtail_transport'),
+    logtail_source_watch=COMMON + ('logtail_http_cache', 'logtail_watch'),
+)
+
+COLD_START = (
+    "import sys, time\n"
+    "started = time.perf_counter()\n"
+    "import %s.plugins.modules.%%s\n"
+    "print(time.perf_counter() - started)\n"
+    "print(int('ansible.module_utils.urls' in sys.modules))\n" % COLLECTION)
+
+
+def default_root():
+    here = os.path.dirname(os.path.abspath(__file__))
+    return os.path.abspath(os.path.join(here, '..', '..', '..', '..', '..'))
+
+
+def payload(name, root):
+    from ansible.executor.module_common import recursive_finder
+    from ansible.utils.collection_loader._collection_finder import _AnsibleCollectionFinder
+
+    _AnsibleCollectionFinder(paths=[root])._install()
+    fqn = '%s.plugins.modules.%s' % (COLLECTION, name)
+    path = os.path.join(root, *fqn.split('.')) + '.py'
+    with open(path, 'rb') as f:
+        data = f.read()
+    buf = io.BytesIO()
+    zf = zipfile.ZipFile(buf, 'w', zipfile.ZIP_DEFLATED)
+    recursive_finder(name, fqn, data, zf)
+    names = zf.namelist()
+    zf.close()
+    prefix = '%s/plugins/module_utils/' % COLLECTION.replace('.', '/')
+    utils = sorted(
+        n[len(prefix):-len('.py')] for n in names
+        if n.startswith(prefix) and not n.endswith('__init__.py'))
+    return len(names), len(buf.getvalue()), utils
+
+
+def cold_start(name, runs, root):
+    env = dict(os.environ, PYTHONPATH=root)
+    times = list()
+    urls = 0
+    for i in range(runs):
+        out = subprocess.check_output(
+            [sys.executable, '-c', COLD_START % name], env=env)
+        elapsed, loaded = out.decode().split()
+        times.append(float(elapsed) * 1000)
+        urls = int(loaded)
+    return statistics.median(times), urls
+
+
+def check(root):
+    failed = 0
+    for name in MODULES:
+        files, size, utils = payload(name, root)
+        extra = sorted(set(utils) - set(MODULE_UTILS[name]))
+        print('%-22s %12d %s' % (
+            name, size, 'ships ' + ', '.join(extra) if extra else 'ok'))
+        failed += bool(extra)
+    return 1 if failed else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument(
+        '--collections-path', default=default_root(),
+        help='directory containing ansible_collections/sd_hardy/logtail')
+    parser.add_argument(
+        '--check', action='store_true',
+        help='fail when a module ships module_utils beyond MODULE_UTILS')
+    args = parser.parse_args()
+    root = os.path.abspath(args.collections_path)
+    if args.check:
+        return check(root)
+    print('%-22s %6s %12s %14s %10s' % (
+        'module', 'files', 'zip bytes', 'import ms p50', 'urls'))
+    for name in MODULES:
+        files, size, utils = payload(name, root)
+        median, urls = cold_start(name, args.runs, root)
+        print('%-22s %6d %12d %14.1f %10s' % (
+            name, files, size, median, 'loaded' if urls else 'lazy'))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
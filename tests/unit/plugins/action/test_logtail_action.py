@@ -0,0 +1,148 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.action import logtail_source, logtail_source_info, logtail_source_ingest
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+    from ansible_collections.sd_hardy.logtail.plugins.plugin_utils.logtail_action import LogtailControllerModule, LogtailModuleExit, no_log_values
+    MOCK_PATH = "ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api.LogtailApiClient"
+except ImportError:
+    print("ImportError")
+
+
+def make_action(action_class, args, check_mode=False):
+    task = mock.MagicMock()
+    task.args = args
+    task.async_val = 0
+    task.check_mode = check_mode
+    task.diff = False
+    play_context = mock.MagicMock()
+    play_context.check_mode = check_mode
+    play_context.diff = False
+    connection = mock.MagicMock()
+    return action_class.ActionModule(
+        task, connection, play_context,
+        loader=None, templar=None, shared_loader_obj=None)
+
+
+class TestLogtailActionPlugins(unittest.TestCase):
+
+    def setUp(self):
+        self.source = LogtailSource(
+            id='123456',
+            name='source1',
+            platform='ubuntu',
+            token='sourcetoken')
+        self.patch_get_source = mock.patch(MOCK_PATH + '.get_source')
+        self.addCleanup(self.patch_get_source.stop)
+        self.mocked_get_source = self.patch_get_source.start()
+
+    def test_info_runs_on_controller(self):
+        self.mocked_get_source.return_value = self.source
+        action = make_action(
+            logtail_source_info, {'token': 'apitoken', 'id': 123456})
+        with mock.patch.object(action, '_execute_module') as execute:
+            result = action.run(task_vars=dict())
+        execute.assert_not_called()
+        self.mocked_get_source.assert_called_once_with(123456)
+        self.assertFalse(result['changed'])
+        self.assertEqual(result['sources'][0]['name'], 'source1')
+
+    def test_required_args(self):
+        action = make_action(logtail_source_info, {})
+        result = action.run(task_vars=dict())
+        self.assertTrue(result['failed'])
+        self.assertEqual(
+            'one of the following is required: token, accounts', result['msg'])
+
+    def test_constraints(self):
+        spec = dict(
+            id=dict(type='int'),
+            ids=dict(type='list', elements='int'),
+            token=dict(type='str', no_log=True),
+        )
+        with self.assertRaises(LogtailModuleExit) as r:
+            LogtailControllerModule(
+                spec, {'id': 1, 'ids': [2], 'token': 'apitoken'},
+                mutually_exclusive=[('id', 'ids')])
+        self.assertEqual(
+            'parameters are mutually exclusive: id|ids',
+            r.exception.result['msg'])
+        with self.assertRaises(LogtailModuleExit) as r:
+            LogtailControllerModule(spec, {}, required_one_of=[('id', 'ids')])
+        self.assertEqual(
+            'one of the following is required: id, ids',
+            r.exception.result['msg'])
+
+    def test_no_log_values(self):
+        spec = dict(
+            token=dict(type='str', no_log=True),
+            name=dict(type='str'),
+            accounts=dict(type='list', elements='dict', options=dict(
+                alias=dict(type='str'),
+                token=dict(type='str', no_log=True))),
+        )
+        self.assertEqual(
+            set(['apitoken', 'token1', 'token2']),
+            no_log_values(spec, {
+                'token': 'apitoken',
+                'name': 'source1',
+                'accounts': [{'alias': 'web', 'token': 'token1'},
+                             {'alias': 'data', 'token': 'token2'}],
+            }))
+
+    def test_ingest_requires_selection(self):
+        action = make_action(
+            logtail_source_ingest, {'token': 'apitoken', 'ingest_paused': True})
+        result = action.run(task_vars=dict())
+        self.assertTrue(result['failed'])
+        self.assertEqual(
+            'one of the following is required: name, filter', result['msg'])
+
+    def test_failure_hides_token(self):
+        self.mocked_get_source.side_effect = LogtailApiError(
+            'Bad token apitoken')
+        action = make_action(
+            logtail_source, {'token': 'apitoken', 'id': 123456,
+                             'state': 'absent'})
+        result = action.run(task_vars=dict())
+        self.assertTrue(result['failed'])
+        self.assertNotIn('apitoken', result['msg'])
+
+    def test_check_mode(self):
+        self.mocked_get_source.return_value = self.source
+        action = make_action(
+            logtail_source, {'token': 'apitoken', 'id': 123456,
+                             'state': 'absent'}, check_mode=True)
+        with mock.patch(MOCK_PATH + '.remove_source') as remove_source:
+            result = action.run(task_vars=dict())
+        remove_source.assert_not_called()
+        self.assertTrue(result['changed'])
+
+    def test_async_runs_remotely(self):
+        action = make_action(logtail_source_info, {'token': 'apitoken'})
+        action._task.async_val = 60
+        with mock.patch.object(action, '_execute_module') as execute:
+            execute.return_value = dict(ansible_job_id='1')
+            result = action.run(task_vars=dict())
+        execute.assert_called_once()
+        self.assertTrue(execute.call_args[1]['wrap_async'])
+        self.assertEqual(result['ansible_job_id'], '1')
+
+    def test_async_clears_progress(self):
+        action = make_action(logtail_source_info, {
+            'token': 'apitoken', 'progress_file': '/tmp/listing.json'})
+        action._task.async_val = 60
+        with mock.patch.object(action, '_execute_module') as execute:
+            execute.return_value = dict(ansible_job_id='1')
+            action.run(task_vars=dict())
+        clear, submit = execute.call_args_list
+        self.assertEqual(clear[1]['module_name'], 'ansible.builtin.file')
+        self.assertEqual(
+            clear[1]['module_args'],
+            dict(path='/tmp/listing.json', state='absent'))
+        self.assertTrue(submit[1]['wrap_async'])
@@ -0,0 +1,42 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import unittest
+
+from ansible.errors import AnsibleFilterError
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.filter.logtail_index import FilterModule
+except ImportError:
+    print("ImportError")
+
+
+class TestLogtailIndexFilter(unittest.TestCase):
+
+    def setUp(self):
+        self.logtail_index = FilterModule().filters()['logtail_index']
+        self.sources = [
+            dict(id=1, name='web', table_name='web'),
+            dict(id=2, name='db', table_name=None),
+            dict(id=3, name='web', table_name='web_2'),
+        ]
+
+    def test_key_by_id(self):
+        index = self.logtail_index(self.sources)
+        self.assertEqual(['1', '2', '3'], sorted(index))
+        self.assertEqual('db', index['2']['name'])
+
+    def test_key_by_name_keeps_first(self):
+        index = self.logtail_index(self.sources, 'name')
+        self.assertEqual(['db', 'web'], sorted(index))
+        self.assertEqual(1, index['web']['id'])
+
+    def test_key_skips_missing_values(self):
+        index = self.logtail_index(self.sources, 'table_name')
+        self.assertEqual(['web', 'web_2'], sorted(index))
+
+    def test_invalid_input(self):
+        with self.assertRaises(AnsibleFilterError):
+            self.logtail_index(self.sources, 'platform')
+        with self.assertRaises(AnsibleFilterError):
+            self.logtail_index(dict(), 'id')
@@ -0,0 +1,66 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import threading
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_accounts import account_clients, check_accounts, fan_out
+except ImportError:
+    print("ImportError")
+
+
+class TestLogtailAccounts(unittest.TestCase):
+
+    def setUp(self):
+        self.accounts = [
+            dict(alias='web', token='token1', rate=None),
+            dict(alias='data', token='token2', rate=5.0),
+        ]
+
+    def test_check_accounts(self):
+        self.assertIsNone(check_accounts(dict(token='token', accounts=None)))
+        self.assertIsNone(check_accounts(dict(token=None, accounts=self.accounts)))
+        self.assertEqual(
+            "accounts must list at least one account",
+            check_accounts(dict(token=None, accounts=list())))
+        self.assertEqual(
+            "The account alias web is used more than once",
+            check_accounts(dict(token=None, accounts=self.accounts + [
+                dict(alias='web', token='token3', rate=None)])))
+
+    def test_account_clients(self):
+        configured = list()
+        clients = account_clients(
+            self.accounts, lambda lt, alias: configured.append(lt))
+        self.assertEqual(['web', 'data'], [alias for alias, lt in clients])
+        web, data = clients[0][1], clients[1][1]
+        self.assertEqual('token2', data.token)
+        self.assertEqual([web, data], configured)
+        # Connections and rate limits are not shared between accounts
+        self.assertIsNot(web.transport, data.transport)
+        self.assertIsNone(web.limiter)
+        self.assertEqual(5.0, data.limiter.rate)
+
+    def test_fan_out(self):
+        clients = account_clients(self.accounts)
+        # Both accounts must be in flight at once to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def run(alias, lt):
+            barrier.wait()
+            if lt.token == 'token2':
+                raise LogtailApiError('Unauthorized', 401)
+            return lt.token
+
+        idle = mock.Mock()
+        clients[0][1].transport.idle[('https', 'logtail.com')] = [idle]
+        outcomes = fan_out(run, clients, concurrency=2)
+        # The pooled connections are closed when every account is done
+        idle.close.assert_called_once_with()
+        self.assertEqual({}, clients[0][1].transport.idle)
+        self.assertEqual(('web', 'token1', None), outcomes[0][:3])
+        self.assertEqual('data', outcomes[1][0])
+        self.assertEqual('Unauthorized', outcomes[1][2].msg)
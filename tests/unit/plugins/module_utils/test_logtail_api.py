@@ -1,15 +1,18 @@
 from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
+import gzip
 import io
 import json
 import unittest
+import zlib
+from json import JSONDecodeError
 from unittest import mock
 from ansible.module_utils import basic
 from ansible.module_utils.six.moves.urllib.error import HTTPError, URLError
 
 try:
-    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailDeadlineError, LogtailDecodedResponse, LogtailJsonStream
     from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
     MOCK_OPENURL_PATH = 'ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api.open_url'
 except ImportError:
@@ -21,8 +24,22 @@ class MockUrllibResponse:
         self.header = header
         self.body = body
 
-    def read(self):
-        return self.body
+    def read(self, size=-1):
+        if size is None or size < 0:
+            size = len(self.body)
+        body, self.body = self.body[:size], self.body[size:]
+        return body
+
+class MockEncodedResponse:
+    def __init__(self, status, body, encoding):
+        self.status = status
+        self.headers = {
+            'Content-type': 'Application/json',
+            'Content-Encoding': encoding}
+        self.body = io.BytesIO(body)
+
+    def read(self, size=-1):
+        return self.body.read(size)
 
 def mocked_exit_json(*args, **kwargs):
     """function to patch over exit_json; package return data into an exception"""
@@ -104,7 +121,8 @@ class TestLogtailApi(unittest.TestCase):
         self.lt = LogtailApiClient('token')
         self.baseurl = 'https://logtail.com/api/v1'
         self.headers = {
-            'Authorization': 'Bearer token'}
+            'Authorization': 'Bearer token',
+            'Accept-Encoding': 'gzip, deflate'}
         self.agent = 'ansible-logtail (Python-urllib/3.8)'
         self.resp_headers = {'Content-type': 'Application/json'}
         self.source_response = MockUrllibResponse(200, 
@@ -374,3 +392,188 @@ class TestLogtailApi(unittest.TestCase):
         ]
         self.mocked.assert_has_calls(calls)    
         self.assertEqual(type(sources), list)
+
+    def test_get_sources_since(self):
+        url = self.baseurl + '/sources?sort=-updated_at'
+        page2 = '"' + url + '&page=2"'
+        self.mocked.side_effect = [
+            MockUrllibResponse(200, generate_response(
+                paging=True, nextpage=page2), self.resp_headers),
+            MockUrllibResponse(200, generate_response(
+                paging=True), self.resp_headers)
+        ]
+        sources, seen_ids, complete = self.lt.get_sources_since(
+            '2022-06-11T00:00:00.000Z')
+        self.assertEqual(len(sources), 2)
+        self.assertEqual(seen_ids, set(['123456']))
+        self.assertTrue(complete)
+        self.mocked.assert_called_with(
+            url + '&page=2',
+            method='GET',
+            data=None,
+            headers=self.headers,
+            http_agent=self.agent)
+
+    def test_get_sources_since_stops_paging(self):
+        url = self.baseurl + '/sources?sort=-updated_at'
+        page2 = '"' + url + '&page=2"'
+        self.mocked.return_value = MockUrllibResponse(
+            200, generate_response(paging=True, nextpage=page2),
+            self.resp_headers)
+        self.lt.changes_ordered = True
+        sources, seen_ids, complete = self.lt.get_sources_since(
+            '2022-07-01T00:00:00.000Z')
+        self.mocked.assert_called_once()
+        self.mocked.assert_called_with(
+            url,
+            method='GET',
+            data=None,
+            headers=self.headers,
+            http_agent=self.agent)
+        self.assertEqual(sources, [])
+        self.assertFalse(complete)
+
+    def test_get_sources_since_unordered(self):
+        url = self.baseurl + '/sources?sort=-updated_at'
+        page2 = '"' + url + '&page=2"'
+        # The first page looks sorted, the API ignored the order anyway
+        newer = generate_response(id='123457', paging=True).replace(
+            '2022-06-11T21:43:12.740Z', '2022-07-02T00:00:00.000Z')
+        self.mocked.side_effect = [
+            MockUrllibResponse(200, generate_response(
+                paging=True, nextpage=page2), self.resp_headers),
+            MockUrllibResponse(200, newer, self.resp_headers)
+        ]
+        sources, seen_ids, complete = self.lt.get_sources_since(
+            '2022-07-01T00:00:00.000Z')
+        self.assertEqual(self.mocked.call_count, 2)
+        self.assertEqual(['123457'], [s['id'] for s in sources])
+        self.assertEqual(seen_ids, set(['123456', '123457']))
+        self.assertTrue(complete)
+
+    def test_get_sources_since_reconcile(self):
+        url = self.baseurl + '/sources?sort=-updated_at'
+        page2 = '"' + url + '&page=2"'
+        self.mocked.side_effect = [
+            MockUrllibResponse(200, generate_response(
+                paging=True, nextpage=page2), self.resp_headers),
+            MockUrllibResponse(200, generate_response(
+                paging=True), self.resp_headers)
+        ]
+        sources, seen_ids, complete = self.lt.get_sources_since(
+            '2022-07-01T00:00:00.000Z', reconcile=True)
+        self.assertEqual(self.mocked.call_count, 2)
+        self.assertEqual(sources, [])
+        self.assertEqual(seen_ids, set(['123456']))
+        self.assertTrue(complete)
+
+    def test_request_timeout(self):
+        self.mocked.return_value = MockUrllibResponse(
+            200, generate_response(), self.resp_headers)
+        self.lt.set_budget(timeout=5)
+        self.lt.get_source('123456')
+        self.assertEqual(5, self.mocked.call_args[1]['timeout'])
+
+    def test_deadline_returns_partial_listing(self):
+        url = self.baseurl + '/sources'
+        page2 = '"' + url + '?page=2"'
+        self.lt.set_budget(timeout=5, deadline=60)
+        started = self.lt.deadline - 60
+
+        def respond(*args, **kwargs):
+            # The first page takes the whole budget
+            self.assertLessEqual(kwargs['timeout'], 5)
+            clock.return_value = started + 61
+            return MockUrllibResponse(200, generate_response(
+                paging=True, nextpage=page2), self.resp_headers)
+        self.mocked.side_effect = respond
+        with mock.patch('time.time') as clock:
+            clock.return_value = started
+            with self.assertRaises(LogtailDeadlineError) as e:
+                self.lt.get_all_sources()
+        self.mocked.assert_called_once()
+        self.assertEqual(1, len(e.exception.partial))
+
+    def test_gzip_response(self):
+        self.mocked.return_value = MockEncodedResponse(
+            200, gzip.compress(generate_response().encode()), 'gzip')
+        # Small chunks make the body arrive over many reads
+        with mock.patch.object(LogtailDecodedResponse, 'chunk_size', 16):
+            source = self.lt.get_source('123456')
+        self.assertEqual('gzip, deflate',
+                         self.mocked.call_args[1]['headers']['Accept-Encoding'])
+        self.assertEqual('123456', source.id)
+
+    def test_raw_deflate_response(self):
+        compressor = zlib.compressobj(wbits=-15)
+        body = compressor.compress(generate_response().encode()) + \
+            compressor.flush()
+        self.mocked.return_value = MockEncodedResponse(200, body, 'deflate')
+        source = self.lt.get_source('123456')
+        self.assertEqual('123456', source.id)
+
+    def test_corrupt_gzip_response(self):
+        self.mocked.return_value = MockEncodedResponse(
+            200, b'not compressed at all', 'gzip')
+        with self.assertRaises(LogtailApiError) as e:
+            self.lt.get_source('123456')
+        self.assertIn('decompressing', e.exception.msg)
+
+    def test_truncated_gzip_response(self):
+        body = gzip.compress(generate_response().encode())
+        self.mocked.return_value = MockEncodedResponse(
+            200, body[:len(body) // 2], 'gzip')
+        with self.assertRaises(LogtailApiError) as e:
+            self.lt.get_source('123456')
+        self.assertIn('truncated', e.exception.msg)
+
+    def test_open_url_decompress(self):
+        from ansible_collections.sd_hardy.logtail.plugins.module_utils import logtail_api
+        # Test the real wrapper rather than the mock of setUp
+        self.patch_open_url.stop()
+        with mock.patch('ansible.module_utils.urls.open_url') as urls_open_url:
+            with mock.patch('ansible.module_utils.ansible_release.__version__', '2.13.9'):
+                logtail_api.open_url('https://logtail.com')
+            self.assertNotIn('decompress', urls_open_url.call_args[1])
+            with mock.patch('ansible.module_utils.ansible_release.__version__', '2.14.0'):
+                logtail_api.open_url('https://logtail.com')
+            self.assertFalse(urls_open_url.call_args[1]['decompress'])
+
+    def test_json_stream(self):
+        body = json.dumps({
+            'pagination': {'next': None},
+            'data': [{'name': u'caf\u00e9', 'retention': 12345}, {}, [1]],
+        }, ensure_ascii=False).encode('utf-8')
+        for chunk_size in (1, 3, 7, 65536):
+            stream = LogtailJsonStream(io.BytesIO(body))
+            stream.chunk_size = chunk_size
+            self.assertEqual(json.loads(body), stream.decode(lambda x: x))
+        self.assertEqual({'data': []}, LogtailJsonStream(
+            io.BytesIO(b' {"data" : [ ] } ')).decode(lambda x: x))
+        # Chunks ending inside a number, after its '.', exponent or sign
+        for chunks in ([b'{"data":[1.', b'5]}'], [b'{"data":[1e', b'3]}'],
+                       [b'{"data":[1.5e-', b'3]}'], [b'{"data":[-', b'2]}']):
+            response = mock.Mock()
+            response.read.side_effect = chunks + [b'']
+            self.assertEqual(
+                json.loads(b''.join(chunks)),
+                LogtailJsonStream(response).decode(lambda x: x))
+        for broken in (b'', b'{"data": [1, 2}', b'{"data": []} []', b'{1: 2}'):
+            with self.assertRaises(JSONDecodeError):
+                LogtailJsonStream(io.BytesIO(broken)).decode(lambda x: x)
+
+    def test_listing_decoded_as_it_is_read(self):
+        self.mocked.return_value = MockUrllibResponse(
+            200, generate_response(paging=True).encode(), self.resp_headers)
+        with mock.patch.object(LogtailJsonStream, 'chunk_size', 32):
+            sources = self.lt.get_all_sources()
+        self.assertEqual(1, len(sources))
+        self.assertEqual('123456', sources[0]['id'])
+        self.assertEqual(30, sources[0]['retention'])
+
+    def test_invalid_response(self):
+        self.mocked.return_value = MockUrllibResponse(
+            200, '{"errors": "nope"}', self.resp_headers)
+        with self.assertRaises(LogtailApiError) as e:
+            self.lt.get_all_sources()
+        self.assertIn('{"errors": "nope"}', e.exception.msg)
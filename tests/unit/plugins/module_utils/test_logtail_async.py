@@ -0,0 +1,244 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import asyncio
+import json
+import os
+import time
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError, LogtailConnectionError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_async import LogtailAsyncApiClient, LogtailAsyncTransport
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_concurrency import LogtailAdaptiveConcurrency
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+except ImportError:
+    print("ImportError")
+
+
+def make_source(id, name='test'):
+    return {
+        'id': id, 'type': 'source',
+        'attributes': {
+            'team_id': 56657, 'name': name, 'platform': 'ubuntu',
+            'table_name': 'test', 'token': 'token', 'retention': 30,
+            'ingesting_paused': False, 'autogenerate_views': True,
+            'created_at': '2022-06-10T21:24:46.409Z',
+            'updated_at': '2022-06-11T21:43:12.740Z'}}
+
+
+class MockLogtailServer():
+    """ Serves a tiny subset of the Logtail API over plain HTTP """
+
+    def __init__(self, delay=0, reason=' X'):
+        self.delay = delay
+        self.reason = reason
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.connections = 0
+        self.requests = list()
+
+    async def start(self):
+        self.server = await asyncio.start_server(
+            self.handle, '127.0.0.1', 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.baseurl = 'http://127.0.0.1:%d/api' % port
+
+    async def stop(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    def route(self, method, path, body):
+        if path == '/api/v1/sources':
+            if method == 'POST':
+                return 200, {'data': make_source('3', 'created')}
+            return 200, {'data': [make_source('1')], 'pagination': {
+                'next': self.baseurl + '/v1/sources?page=2'}}
+        if path == '/api/v1/sources?page=2':
+            return 200, {'data': [make_source('2')],
+                         'pagination': {'next': None}}
+        if path == '/api/v1/sources/1' and method == 'DELETE':
+            return 204, None
+        if path == '/api/v1/sources/1':
+            return 200, {'data': make_source('1')}
+        if path == '/api/v1/sources/500':
+            return 500, {'errors': 'Internal Server Error'}
+        return 404, {'errors': 'Resource not found'}
+
+    async def handle(self, reader, writer):
+        self.connections += 1
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            method, path, version = line.decode().split()
+            headers = dict()
+            while True:
+                header = (await reader.readline()).decode().strip()
+                if not header:
+                    break
+                key, value = header.split(':', 1)
+                headers[key.lower()] = value.strip()
+            body = await reader.readexactly(
+                int(headers.get('content-length', 0)))
+            self.requests.append((method, path, headers, body))
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+            await asyncio.sleep(self.delay)
+            self.in_flight -= 1
+            status, obj = self.route(method, path, body)
+            payload = json.dumps(obj).encode() if obj is not None else b''
+            writer.write((
+                'HTTP/1.1 %d%s\r\nContent-Type: application/json\r\n'
+                'Content-Length: %d\r\n\r\n'
+                % (status, self.reason, len(payload))
+            ).encode() + payload)
+            await writer.drain()
+        writer.close()
+
+
+class TestLogtailAsyncApiClient(unittest.TestCase):
+
+    def run_with_server(self, scenario, delay=0, concurrency=10, reason=' X'):
+        async def main():
+            server = MockLogtailServer(delay, reason)
+            await server.start()
+            lt = LogtailAsyncApiClient('token', concurrency=concurrency)
+            lt.client.baseurl = server.baseurl
+            try:
+                return server, await scenario(lt)
+            finally:
+                await lt.close()
+                await server.stop()
+        return asyncio.run(main())
+
+    def test_get_source(self):
+        async def scenario(lt):
+            return await lt.get_source('1'), await lt.get_source('2')
+        server, (found, missing) = self.run_with_server(scenario)
+        self.assertEqual(type(found), LogtailSource)
+        self.assertEqual(found.id, '1')
+        self.assertFalse(missing)
+        method, path, headers, body = server.requests[0]
+        self.assertEqual(headers['authorization'], 'Bearer token')
+        # Both requests used the same keep-alive connection
+        self.assertEqual(server.connections, 1)
+
+    def test_write_methods(self):
+        async def scenario(lt):
+            return (await lt.create_source('created', 'ubuntu'),
+                    await lt.remove_source('1'))
+        server, (created, removed) = self.run_with_server(scenario)
+        self.assertEqual(created.name, 'created')
+        self.assertTrue(removed)
+        self.assertEqual(
+            server.requests[0][3], b'name=created&platform=ubuntu')
+
+    def test_get_all_sources(self):
+        async def scenario(lt):
+            return await lt.get_all_sources()
+        server, sources = self.run_with_server(scenario)
+        self.assertEqual([s['id'] for s in sources], ['1', '2'])
+
+    def test_error(self):
+        async def scenario(lt):
+            with self.assertRaises(LogtailApiError) as r:
+                await lt.get_source('500')
+            return r.exception.msg
+        server, msg = self.run_with_server(scenario)
+        self.assertIn('Internal Server Error', msg)
+
+    def test_concurrency_limit(self):
+        async def scenario(lt):
+            return await asyncio.gather(
+                *[lt.get_source('1') for i in range(12)])
+        server, sources = self.run_with_server(
+            scenario, delay=0.02, concurrency=4)
+        self.assertEqual(len(sources), 12)
+        self.assertEqual(server.max_in_flight, 4)
+        self.assertEqual(server.connections, 4)
+
+    def test_connection_error(self):
+        async def scenario(lt):
+            lt.client.baseurl = 'http://127.0.0.1:1/api'
+            with self.assertRaises(LogtailApiError):
+                await lt.get_source('1')
+        self.run_with_server(scenario)
+
+    def test_adaptive_concurrency(self):
+        controller = LogtailAdaptiveConcurrency(
+            initial=2, maximum=8, window=4)
+
+        async def scenario(lt):
+            await asyncio.gather(*[lt.get_source('1') for i in range(12)])
+            with self.assertRaises(LogtailApiError):
+                await lt.get_source('500')
+        server, result = self.run_with_server(
+            scenario, delay=0.01, concurrency=controller)
+        self.assertLessEqual(server.max_in_flight, 4)
+        self.assertEqual(
+            controller.history[-1]['reason'], 'server error (500)')
+
+    def test_status_without_reason(self):
+        async def scenario(lt):
+            return await lt.get_source('1')
+        server, source = self.run_with_server(scenario, reason='')
+        self.assertEqual('1', source.id)
+
+    def test_retry_once(self):
+        def dead_connection():
+            reader = asyncio.StreamReader()
+            reader.feed_eof()
+            writer = mock.Mock()
+            writer.drain = mock.AsyncMock()
+            return reader, writer
+
+        async def scenario():
+            transport = LogtailAsyncTransport()
+            key = ('http', '127.0.0.1', 80)
+            transport.idle[key] = [dead_connection(), dead_connection()]
+            with mock.patch('asyncio.open_connection') as open_connection:
+                open_connection.return_value = dead_connection()
+                with self.assertRaises(ConnectionResetError):
+                    await transport.request('http://127.0.0.1/api')
+            return transport.idle[key], open_connection
+        idle, open_connection = asyncio.run(scenario())
+        # One idle connection was tried, then a single new one
+        self.assertEqual(1, len(idle))
+        open_connection.assert_called_once()
+
+    def test_connect_timeout(self):
+        async def hang(*args, **kwargs):
+            await asyncio.sleep(60)
+
+        async def scenario():
+            lt = LogtailAsyncApiClient('token', timeout=0.05)
+            lt.client.baseurl = 'http://127.0.0.1/api'
+            with mock.patch('asyncio.open_connection', side_effect=hang):
+                with self.assertRaises(LogtailConnectionError):
+                    await lt.get_source('1')
+        started = time.time()
+        asyncio.run(scenario())
+        # Connecting is bounded by the same timeout as the exchange
+        self.assertLess(time.time() - started, 5)
+
+    def test_proxy_fallback(self):
+        response = mock.Mock()
+        response.getcode.return_value = 200
+        response.reason = 'OK'
+        response.headers = {'Content-Type': 'application/json'}
+        response.read.return_value = json.dumps(
+            {'data': make_source('1')}).encode()
+
+        async def scenario():
+            lt = LogtailAsyncApiClient('token')
+            return await lt.get_source('1')
+        with mock.patch.dict(os.environ, {'https_proxy': 'http://proxy:3128',
+                                          'no_proxy': ''}):
+            with mock.patch('ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_async.open_url') as open_url:
+                open_url.return_value = response
+                source = asyncio.run(scenario())
+        self.assertEqual('1', source.id)
+        self.assertEqual(
+            'https://logtail.com/api/v1/sources/1', open_url.call_args[0][0])
@@ -0,0 +1,123 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailConnectionError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_breaker import LogtailCircuitBreaker, circuit_breaker
+except ImportError:
+    print("ImportError")
+
+
+class TestLogtailCircuitBreaker(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'state', 'breaker.json')
+        self.breaker = LogtailCircuitBreaker(
+            self.path, threshold=3, reset_timeout=30)
+        self.down = mock.Mock(side_effect=LogtailConnectionError(
+            'Unable to complete API request. Reason: timed out'))
+
+    def fail(self, times):
+        for i in range(times):
+            with self.assertRaises(LogtailApiError):
+                self.breaker.call(self.down)
+
+    def test_opens_after_threshold(self):
+        self.fail(3)
+        self.assertEqual(3, self.down.call_count)
+        with self.assertRaises(LogtailApiError) as e:
+            self.breaker.call(self.down)
+        self.assertEqual(3, self.down.call_count)
+        self.assertIn('circuit is open after 3', e.exception.msg)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_shared_between_instances(self):
+        self.fail(3)
+        other = LogtailCircuitBreaker(self.path, threshold=3)
+        with self.assertRaises(LogtailApiError):
+            other.call(self.down)
+        self.assertEqual(3, self.down.call_count)
+
+    def test_success_resets_count(self):
+        self.fail(2)
+        self.assertEqual('ok', self.breaker.call(lambda: 'ok'))
+        self.fail(2)
+        self.assertEqual('ok', self.breaker.call(lambda: 'ok'))
+
+    def test_client_errors_do_not_count(self):
+        not_found = mock.Mock(side_effect=LogtailApiError(
+            'Unprocessable', status=422))
+        for i in range(5):
+            with self.assertRaises(LogtailApiError):
+                self.breaker.call(not_found)
+        self.assertEqual(5, not_found.call_count)
+        # An answer that can not be decoded is no outage either
+        garbled = mock.Mock(side_effect=LogtailApiError(
+            'Error decoding response from server'))
+        for i in range(5):
+            with self.assertRaises(LogtailApiError):
+                self.breaker.call(garbled)
+        self.assertEqual(5, garbled.call_count)
+
+    def test_rate_limited_closed(self):
+        limited = mock.Mock(side_effect=LogtailApiError(
+            'Too Many Requests', status=429))
+        for i in range(10):
+            with self.assertRaises(LogtailApiError):
+                self.breaker.call(limited)
+        # Every request of the burst reached the API
+        self.assertEqual(10, limited.call_count)
+        self.assertEqual('ok', self.breaker.call(lambda: 'ok'))
+
+    def test_unwritable_file(self):
+        breaker = LogtailCircuitBreaker(
+            os.path.join(self.tmpdir, 'missing', 'breaker.json'))
+        with mock.patch('os.makedirs', side_effect=OSError(13, 'Permission denied')):
+            with self.assertRaises(LogtailApiError) as e:
+                breaker.call(self.down)
+        self.assertIn('Unable to update the circuit breaker file', e.exception.msg)
+
+    def test_half_open_probe(self):
+        self.fail(3)
+        with mock.patch('time.time', return_value=os.path.getmtime(
+                self.path) + 31):
+            # A single probe is let through, its failure reopens
+            self.fail(1)
+            self.assertEqual(4, self.down.call_count)
+            with self.assertRaises(LogtailApiError):
+                self.breaker.call(self.down)
+            self.assertEqual(4, self.down.call_count)
+        with mock.patch('time.time', return_value=os.path.getmtime(
+                self.path) + 62):
+            self.assertTrue(self.breaker.before())
+            # Others wait while the probe is in flight
+            with self.assertRaises(LogtailApiError):
+                self.breaker.before()
+            self.breaker.success(probe=True)
+            self.assertFalse(self.breaker.before())
+
+    def test_per_account_file(self):
+        params = dict(
+            circuit_breaker_file=self.path,
+            circuit_breaker_threshold=3,
+            circuit_breaker_reset=30)
+        self.assertEqual(self.path, circuit_breaker(params).path)
+        self.assertEqual(
+            self.path + '.team_a_1', circuit_breaker(params, 'team a/1').path)
+
+    def test_client_uses_breaker(self):
+        lt = LogtailApiClient('token')
+        lt.breaker = self.breaker
+        with mock.patch.object(lt, '_send', self.down):
+            for i in range(4):
+                with self.assertRaises(LogtailApiError):
+                    lt.get_source(1)
+        self.assertEqual(3, self.down.call_count)
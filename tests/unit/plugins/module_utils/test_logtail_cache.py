@@ -0,0 +1,178 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError, LogtailConnectionError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_cache import LogtailSourceCache
+except ImportError:
+    print("ImportError")
+
+
+def make_source(id, name='source', updated_at='2022-06-11T21:43:12.740Z'):
+    return {
+        'id': id,
+        'name': name,
+        'platform': 'ubuntu',
+        'token': 'token',
+        'ingest_paused': False,
+        'autogen_views': True,
+        'created_at': '2022-06-10T21:24:46.409Z',
+        'updated_at': updated_at,
+        'retention': 30,
+        'table_name': name,
+        'team_id': 1111
+    }
+
+
+class TestLogtailSourceCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'cache', 'sources.json')
+        self.client = mock.Mock()
+        self.client.get_all_sources.return_value = [
+            make_source('1', 'source1'),
+            make_source('2', 'source2')]
+
+    def test_load_missing(self):
+        cache = LogtailSourceCache(self.path)
+        self.assertFalse(cache.load())
+        self.assertEqual(cache.get_sources(), [])
+
+    def test_full_refresh(self):
+        cache = LogtailSourceCache(self.path)
+        changes = cache.refresh(self.client)
+        self.client.get_all_sources.assert_called_once_with()
+        self.assertEqual(len(changes['changed']), 2)
+        self.assertEqual(changes['removed'], [])
+        self.assertEqual(cache.synced_at, '2022-06-11T21:43:12.740Z')
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        reloaded = LogtailSourceCache(self.path)
+        self.assertTrue(reloaded.load())
+        self.assertEqual(len(reloaded.get_sources()), 2)
+
+    def test_delta_refresh(self):
+        cache = LogtailSourceCache(self.path)
+        cache.refresh(self.client)
+        updated = make_source('2', 'renamed', '2022-06-12T00:00:00.000Z')
+        self.client.get_sources_since.return_value = (
+            [updated], set(['2']), False)
+        changes = cache.refresh(self.client)
+        self.client.get_all_sources.assert_called_once_with()
+        self.client.get_sources_since.assert_called_once_with(
+            '2022-06-11T21:43:12.740Z', reconcile=False)
+        self.assertEqual(changes['changed'], [updated])
+        self.assertEqual(changes['removed'], [])
+        self.assertEqual(cache.sources['2']['name'], 'renamed')
+        self.assertEqual(cache.synced_at, '2022-06-12T00:00:00.000Z')
+        self.assertEqual(
+            cache.get_sources_since('2022-06-11T21:43:12.740Z'),
+            [updated])
+
+    def test_delta_refresh_reconciles_removed(self):
+        cache = LogtailSourceCache(self.path)
+        cache.refresh(self.client)
+        self.client.get_sources_since.return_value = (
+            [], set(['1']), True)
+        changes = cache.refresh(self.client)
+        self.assertEqual(changes['changed'], [])
+        self.assertEqual(changes['removed'], ['2'])
+        self.assertEqual(list(cache.sources), ['1'])
+
+    def test_refresh_reconcile_interval(self):
+        cache = LogtailSourceCache(self.path)
+        cache.refresh(self.client)
+        cache.reconciled_at -= cache.reconcile_interval + 1
+        self.client.get_sources_since.return_value = ([], set(['1']), True)
+        changes = cache.refresh(self.client)
+        # Deletions are found from the IDs of a complete walk, not by
+        # downloading the whole listing again
+        self.client.get_all_sources.assert_called_once_with()
+        self.client.get_sources_since.assert_called_once_with(
+            '2022-06-11T21:43:12.740Z', reconcile=True)
+        self.assertEqual(changes['removed'], ['2'])
+        self.assertEqual(cache.reconciled_at, cache.refreshed_at)
+
+    def test_snapshot_per_token(self):
+        cache = LogtailSourceCache(self.path, 'token1')
+        cache.refresh(self.client)
+        self.assertTrue(cache.path.startswith(self.path + '.'))
+        self.assertTrue(LogtailSourceCache(self.path, 'token1').load())
+        self.assertFalse(LogtailSourceCache(self.path, 'token2').load())
+
+    def test_refresh_empty_response(self):
+        cache = LogtailSourceCache(self.path)
+        self.client.get_all_sources.return_value = False
+        self.assertFalse(cache.refresh(self.client))
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_revalidate_fresh(self):
+        cache = LogtailSourceCache(self.path)
+        cache.refresh(self.client)
+        changes = cache.revalidate(self.client, ttl=60)
+        self.assertFalse(changes['stale'])
+        self.client.get_all_sources.assert_called_once_with()
+        self.client.get_sources_since.assert_not_called()
+
+    def test_revalidate_stale_while_revalidate(self):
+        cache = LogtailSourceCache(self.path)
+        cache.refresh(self.client)
+        cache.refreshed_at -= 120
+        self.client.get_sources_since.return_value = ([], set(), False)
+        with mock.patch.object(cache, '_spawn') as spawn:
+            spawn.side_effect = lambda target: target()
+            changes = cache.revalidate(
+                self.client, ttl=60, stale_while_revalidate=120)
+            # A second caller finds the lock held and does not refresh
+            with open(cache._lock_path(), 'w'):
+                pass
+            cache.revalidate(self.client, ttl=60, stale_while_revalidate=120)
+        self.assertTrue(changes['stale'])
+        spawn.assert_called_once()
+        # The refresh process does not share the parent's connections
+        self.client.close.assert_called_once_with()
+        self.client.get_sources_since.assert_called_once_with(
+            '2022-06-11T21:43:12.740Z', reconcile=False)
+
+    def test_background_full_refresh(self):
+        cache = LogtailSourceCache(self.path)
+        cache.refresh(self.client)
+        with mock.patch.object(cache, '_spawn') as spawn:
+            spawn.side_effect = lambda target: target()
+            self.assertTrue(cache.refresh_in_background(self.client, full=True))
+        self.assertEqual(self.client.get_all_sources.call_count, 2)
+        self.client.get_sources_since.assert_not_called()
+        self.assertFalse(os.path.exists(cache._lock_path()))
+
+    def test_revalidate_stale_if_error(self):
+        cache = LogtailSourceCache(self.path)
+        cache.refresh(self.client)
+        cache.refreshed_at -= 120
+        self.client.get_sources_since.side_effect = LogtailConnectionError(
+            'Unable to complete API request')
+        changes = cache.revalidate(self.client, ttl=60, stale_if_error=120)
+        self.assertTrue(changes['stale'])
+        self.assertEqual(changes['error'], 'Unable to complete API request')
+        self.client.get_sources_since.side_effect = LogtailApiError(
+            'Service Unavailable', 503)
+        self.assertTrue(cache.revalidate(
+            self.client, ttl=60, stale_if_error=120)['stale'])
+        with self.assertRaises(LogtailApiError):
+            cache.revalidate(self.client, ttl=60, stale_if_error=30)
+
+    def test_revalidate_client_error_raised(self):
+        cache = LogtailSourceCache(self.path)
+        cache.refresh(self.client)
+        cache.refreshed_at -= 120
+        for status in (401, 403, 404):
+            self.client.get_sources_since.side_effect = LogtailApiError(
+                'Unauthorized', status)
+            with self.assertRaises(LogtailApiError):
+                cache.revalidate(self.client, ttl=60, stale_if_error=120)
@@ -0,0 +1,90 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import threading
+import time
+import unittest
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_concurrency import LogtailAdaptiveConcurrency, run_parallel
+except ImportError:
+    print("ImportError")
+
+
+class TestLogtailAdaptiveConcurrency(unittest.TestCase):
+
+    def test_increase_while_latency_flat(self):
+        controller = LogtailAdaptiveConcurrency(initial=2, window=5)
+        for i in range(15):
+            controller.record(0.1)
+        self.assertEqual(controller.limit, 5)
+        self.assertEqual(len(controller.history), 3)
+        self.assertIn('within baseline', controller.history[0]['reason'])
+
+    def test_cut_on_throttle(self):
+        controller = LogtailAdaptiveConcurrency(initial=16)
+        controller.record(0.1, status=429, error=True)
+        self.assertEqual(controller.limit, 8)
+        # Responses already in flight do not cut the limit again
+        controller.record(0.1, status=429, error=True)
+        self.assertEqual(controller.limit, 8)
+        for i in range(8):
+            controller.record(0.1)
+        controller.record(0.1, status=503, error=True)
+        self.assertEqual(controller.limit, 4)
+        report = controller.report()
+        self.assertEqual(report['max_limit'], 16)
+        self.assertEqual(report['min_limit'], 4)
+        self.assertEqual(
+            [c['reason'] for c in report['changes']],
+            ['throttled by the API (429)', 'server error (503)'])
+
+    def test_client_errors_do_not_cut(self):
+        controller = LogtailAdaptiveConcurrency(initial=4)
+        controller.record(0.1, status=404, error=True)
+        self.assertEqual(controller.limit, 4)
+        controller.record(0.1, error=True)
+        self.assertEqual(controller.limit, 2)
+        self.assertEqual(
+            controller.history[-1]['reason'], 'connection error or timeout')
+
+    def test_cut_on_latency_rise(self):
+        controller = LogtailAdaptiveConcurrency(initial=8, window=4)
+        for i in range(4):
+            controller.record(0.1)
+        for i in range(4):
+            controller.record(0.5)
+        self.assertEqual(controller.limit, 4)
+        self.assertIn('above baseline', controller.history[-1]['reason'])
+
+    def test_bounds(self):
+        controller = LogtailAdaptiveConcurrency(
+            initial=2, minimum=2, maximum=3, window=1)
+        for i in range(5):
+            controller.record(0.1)
+        self.assertEqual(controller.limit, 3)
+        controller.record(0.1, status=429, error=True)
+        self.assertEqual(controller.limit, 2)
+
+    def test_run_parallel(self):
+        controller = LogtailAdaptiveConcurrency(initial=3, maximum=3)
+        lock = threading.Lock()
+        state = dict(in_flight=0, peak=0)
+
+        def work(item):
+            with lock:
+                state['in_flight'] += 1
+                state['peak'] = max(state['peak'], state['in_flight'])
+            time.sleep(0.01)
+            with lock:
+                state['in_flight'] -= 1
+            if item == 5:
+                raise LogtailApiError('not found', status=404)
+            return item * 2
+
+        results = run_parallel(work, range(10), controller)
+        self.assertEqual(state['peak'], 3)
+        self.assertEqual([r[0] for r in results][:5], [0, 2, 4, 6, 8])
+        self.assertIsNone(results[5][0])
+        self.assertEqual(results[5][1].status, 404)
@@ -0,0 +1,272 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import socket
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from ansible.module_utils.six.moves import BaseHTTPServer, socketserver
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailDeadlineError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_daemon import (
+        LogtailDaemon, LogtailDaemonClient, LogtailSourceLRU, connect_client)
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+    MOCK_PATH = "ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api.LogtailApiClient"
+    DAEMON_PATH = "ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_daemon"
+except ImportError:
+    print("ImportError")
+
+
+class DeleteHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_DELETE(self):
+        self.server.ports.append(self.client_address[1])
+        self.send_response(204)
+        self.end_headers()
+
+    def log_message(self, *args):
+        pass
+
+
+class ThreadingServer(socketserver.ThreadingMixIn, BaseHTTPServer.HTTPServer):
+    daemon_threads = True
+
+
+class TestLogtailDaemon(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.socket_path = os.path.join(self.tmpdir, 'daemon.sock')
+        self.source = LogtailSource(id='123456', name='source1')
+
+    def test_lru(self):
+        lru = LogtailSourceLRU(size=2, ttl=60)
+        lru.put('a', 1)
+        lru.put('b', 2)
+        lru.get('a')
+        lru.put('c', 3)
+        self.assertIsNone(lru.get('b'))
+        self.assertEqual(lru.get('a'), 1)
+        lru.discard('a')
+        self.assertIsNone(lru.get('a'))
+        lru.ttl = -1
+        self.assertIsNone(lru.get('c'))
+
+    def test_sessions_share_upstream(self):
+        server = ThreadingServer(('127.0.0.1', 0), DeleteHandler)
+        server.ports = list()
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.shutdown)
+        daemon = LogtailDaemon(self.socket_path, idle_timeout=1)
+        daemon._client('token')[1].baseurl = \
+            'http://127.0.0.1:%d/api' % server.server_port
+        serving = threading.Thread(target=daemon.serve)
+        serving.start()
+        self.addCleanup(serving.join)
+        for i in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+        # Every session is served on its own daemon thread
+        for source_id in range(3):
+            with LogtailDaemonClient('token', self.socket_path, socket_timeout=5) as lt:
+                self.assertTrue(lt.remove_source(source_id))
+        self.assertEqual(3, len(server.ports))
+        self.assertEqual(1, len(set(server.ports)))
+
+    def test_serve_keeps_other_files(self):
+        with open(self.socket_path, 'w') as f:
+            f.write('data')
+        with self.assertRaises(LogtailApiError):
+            LogtailDaemon(self.socket_path).serve()
+        with open(self.socket_path) as f:
+            self.assertEqual('data', f.read())
+
+    def test_call_uses_lru(self):
+        daemon = LogtailDaemon(self.socket_path)
+        with mock.patch(MOCK_PATH + '.get_source') as get_source, \
+                mock.patch(MOCK_PATH + '.remove_source') as remove_source:
+            get_source.return_value = self.source
+            remove_source.return_value = True
+            first = daemon.call('token', 'get_source', ['123456'])
+            second = daemon.call('token', 'get_source', ['123456'])
+            daemon.call('token', 'remove_source', ['123456'])
+            daemon.call('token', 'get_source', ['123456'])
+        self.assertEqual(first, self.source.get_dict())
+        self.assertEqual(first, second)
+        self.assertEqual(get_source.call_count, 2)
+        with self.assertRaises(LogtailApiError):
+            daemon.call('token', 'request', [])
+
+    def test_socket_round_trip(self):
+        daemon = LogtailDaemon(self.socket_path, idle_timeout=1)
+        thread = threading.Thread(target=daemon.serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        for i in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+        self.assertEqual(os.stat(self.socket_path).st_mode & 0o777, 0o700)
+        with mock.patch(MOCK_PATH + '.get_source') as get_source, \
+                mock.patch(MOCK_PATH + '.get_all_sources') as all_sources:
+            get_source.return_value = self.source
+            all_sources.side_effect = LogtailApiError('API down')
+            lt = connect_client('token', self.socket_path, start=False)
+            self.assertEqual(type(lt), LogtailDaemonClient)
+            source = lt.get_source('123456')
+            with self.assertRaises(LogtailApiError) as r:
+                lt.get_all_sources()
+            # Closed clients connect again on the next call
+            lt.close()
+            self.assertEqual('source1', lt.get_source('123456').name)
+            lt.close()
+        self.assertEqual(type(source), LogtailSource)
+        self.assertEqual(source.name, 'source1')
+        self.assertEqual(r.exception.msg, 'API down')
+
+    def test_pages_through_daemon(self):
+        daemon = LogtailDaemon(self.socket_path, idle_timeout=1)
+        thread = threading.Thread(target=daemon.serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        for i in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+        next_url = 'https://logtail.com/api/v1/sources?page=2'
+        with mock.patch(MOCK_PATH + '.request') as request:
+            request.side_effect = [
+                dict(data=[dict(id='1')], pagination=dict(next=next_url)),
+                dict(data=[dict(id='2')], pagination=dict(next=None))]
+            with LogtailDaemonClient('token', self.socket_path, socket_timeout=5) as lt:
+                pages = list(lt.iter_source_pages())
+                with self.assertRaises(LogtailApiError) as r:
+                    lt.get_source_page('https://example.com/collect')
+        self.assertEqual([[dict(id='1')], [dict(id='2')]], pages)
+        self.assertEqual(next_url, request.call_args[1]['url'])
+        self.assertIn('Unsupported listing page URL', r.exception.msg)
+
+    def test_parallel_calls(self):
+        daemon = LogtailDaemon(self.socket_path, idle_timeout=1)
+        thread = threading.Thread(target=daemon.serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        for i in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+        # Both lookups must reach the API at once to pass the barrier
+        barrier = threading.Barrier(2, timeout=5)
+
+        def get_source(source_id):
+            barrier.wait()
+            return LogtailSource(id=source_id, name='source%s' % source_id)
+
+        with mock.patch(MOCK_PATH + '.get_source') as mocked:
+            mocked.side_effect = get_source
+            lt = LogtailDaemonClient('token', self.socket_path, socket_timeout=10)
+            results = dict()
+            workers = [threading.Thread(
+                target=lambda i=i: results.update({i: lt.get_source(i)}))
+                for i in (1, 2)]
+            for worker in workers:
+                worker.start()
+            for worker in workers:
+                worker.join()
+        self.assertEqual('source1', results[1].name)
+        self.assertEqual('source2', results[2].name)
+
+    def test_unexpected_error_replied(self):
+        daemon = LogtailDaemon(self.socket_path, idle_timeout=1)
+        thread = threading.Thread(target=daemon.serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        for i in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+        with mock.patch.object(daemon, 'call', side_effect=RuntimeError('boom')):
+            with LogtailDaemonClient('token', self.socket_path, socket_timeout=5) as lt:
+                with self.assertRaises(LogtailApiError) as r:
+                    lt.get_source('123456')
+                self.assertEqual(1, len(lt.connections))
+            self.assertEqual([], lt.connections)
+        self.assertIn('boom', r.exception.msg)
+
+    def test_timeout_drops_connection(self):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(1)
+        self.addCleanup(server.close)
+        lt = LogtailDaemonClient('token', self.socket_path, socket_timeout=0.1)
+        conn, addr = server.accept()
+        self.addCleanup(conn.close)
+        with self.assertRaises(LogtailApiError):
+            lt.get_source('123456')
+        # A late reply on this connection can not answer the next call
+        self.assertEqual([], lt.connections)
+        self.assertIsNone(lt.local.conn)
+
+    def test_budget_forwarded(self):
+        daemon = LogtailDaemon(self.socket_path, idle_timeout=1)
+        thread = threading.Thread(target=daemon.serve)
+        thread.start()
+        self.addCleanup(thread.join)
+        for i in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.01)
+        budgets = list()
+
+        def get_source(client, source_id):
+            budgets.append((client.timeout, client.deadline))
+            return self.source
+
+        def get_all_sources(client):
+            raise LogtailDeadlineError('Too late', [self.source.get_dict()])
+
+        with mock.patch(MOCK_PATH + '.get_source', autospec=True) as source, \
+                mock.patch(MOCK_PATH + '.get_all_sources', autospec=True) as all_sources:
+            source.side_effect = get_source
+            all_sources.side_effect = get_all_sources
+            with connect_client('token', self.socket_path, start=False,
+                                timeout=7, deadline=60) as lt:
+                lt.get_source('123456')
+                with self.assertRaises(LogtailDeadlineError) as r:
+                    lt.get_all_sources()
+        self.assertEqual(7, budgets[0][0])
+        self.assertTrue(time.time() < budgets[0][1] <= time.time() + 60)
+        self.assertEqual([self.source.get_dict()], r.exception.partial)
+        # The shared client of the daemon keeps no budget
+        self.assertIsNone(list(daemon.clients.values())[0].deadline)
+
+    def test_deadline_while_waiting(self):
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(self.socket_path)
+        server.listen(1)
+        self.addCleanup(server.close)
+        lt = connect_client('token', self.socket_path, start=False,
+                            deadline=0.1)
+        conn, addr = server.accept()
+        self.addCleanup(conn.close)
+        with self.assertRaises(LogtailDeadlineError):
+            lt.get_source('123456')
+
+    def test_connect_client_fallback(self):
+        lt = connect_client('token', self.socket_path, start=False)
+        self.assertEqual(type(lt), LogtailApiClient)
+        lt = connect_client('token', self.socket_path, start=False,
+                            timeout=3, deadline=10)
+        self.assertEqual(3, lt.timeout)
+        self.assertIsNotNone(lt.deadline)
@@ -0,0 +1,105 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import io
+import json
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from unittest import mock
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_http_cache import LogtailHttpCache
+    MOCK_OPENURL_PATH = 'ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api.open_url'
+except ImportError:
+    print("ImportError")
+
+
+BODY = json.dumps({'data': {
+    'id': '123456',
+    'type': 'source',
+    'attributes': {
+        'team_id': 1111, 'name': 'test', 'platform': 'ubuntu',
+        'table_name': 'test', 'token': 'token', 'retention': 30,
+        'ingesting_paused': False, 'autogenerate_views': True,
+        'created_at': '2022-06-10T21:24:46.409Z',
+        'updated_at': '2022-06-11T21:43:12.740Z'}}}).encode()
+
+
+def response(status, body=b'', headers=None):
+    resp = mock.Mock(status=status, headers=headers or dict())
+    resp.read.return_value = body
+    return resp
+
+
+class TestLogtailHttpCache(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.cache = LogtailHttpCache(os.path.join(self.tmpdir, 'http'))
+        self.lt = LogtailApiClient('token')
+        self.lt.http_cache = self.cache
+        self.url = 'https://logtail.com/api/v1/sources/123456'
+        self.patch_open_url = mock.patch(MOCK_OPENURL_PATH)
+        self.addCleanup(self.patch_open_url.stop)
+        self.mocked = self.patch_open_url.start()
+
+    def test_store(self):
+        self.assertIsNone(self.cache.get('token', self.url))
+        self.cache.put('token', self.url, '"v1"', None, b'{"data": []}')
+        entry = self.cache.get('token', self.url)
+        self.assertEqual('{"data": []}', entry['body'])
+        self.assertEqual(
+            {'If-None-Match': '"v1"'}, self.cache.conditions(entry))
+        # Entries are not shared between tokens
+        self.assertIsNone(self.cache.get('other', self.url))
+
+    def test_prune(self):
+        cache = LogtailHttpCache(self.cache.directory, max_entries=2)
+        now = time.time()
+        for i, age in enumerate((10, 20, 30, 2 * 86400)):
+            url = self.url + str(i)
+            cache.put('token', url, '"v1"', None, b'{}')
+            os.utime(cache._path('token', url), (now - age, now - age))
+        # Using an entry makes it the most recently used one
+        cache.get('token', self.url + '2')
+        cache._prune()
+        self.assertEqual(
+            sorted([cache._path('token', self.url + '0'),
+                    cache._path('token', self.url + '2')]),
+            sorted(os.path.join(cache.directory, name)
+                   for name in os.listdir(cache.directory)))
+
+    def test_conditional_get_not_modified(self):
+        self.mocked.return_value = response(200, BODY, {
+            'ETag': '"v1"',
+            'Last-Modified': 'Sat, 11 Jun 2022 21:43:12 GMT'})
+        first = self.lt.get_source('123456')
+        self.assertNotIn('If-None-Match', self.mocked.call_args[1]['headers'])
+        self.mocked.return_value = None
+        self.mocked.side_effect = HTTPError(
+            self.url, 304, 'Not Modified', dict(), io.BytesIO(b''))
+        second = self.lt.get_source('123456')
+        headers = self.mocked.call_args[1]['headers']
+        self.assertEqual('"v1"', headers['If-None-Match'])
+        self.assertEqual(
+            'Sat, 11 Jun 2022 21:43:12 GMT', headers['If-Modified-Since'])
+        self.assertEqual(first.get_dict(), second.get_dict())
+        # The client's own headers are left untouched
+        self.assertNotIn('If-None-Match', self.lt.headers)
+
+    def test_not_modified_status(self):
+        self.cache.put('token', self.url, '"v1"', None, BODY)
+        self.mocked.return_value = response(304)
+        source = self.lt.get_source('123456')
+        self.assertEqual('test', source.name)
+
+    def test_no_validators_not_stored(self):
+        self.mocked.return_value = response(200, BODY)
+        self.lt.get_source('123456')
+        self.assertIsNone(self.cache.get('token', self.url))
@@ -0,0 +1,130 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import sqlite3
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_index import LogtailSourceIndex
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_cache import LogtailCacheError, LogtailSourceCache
+except ImportError:
+    print("ImportError")
+
+
+def make_source(id, name='source', platform='ubuntu',
+                updated_at='2022-06-11T21:43:12.740Z'):
+    return {
+        'id': id,
+        'name': name,
+        'platform': platform,
+        'token': 'token',
+        'ingest_paused': False,
+        'autogen_views': True,
+        'created_at': '2022-06-10T21:24:46.409Z',
+        'updated_at': updated_at,
+        'retention': 30,
+        'table_name': name,
+        'team_id': 1111
+    }
+
+
+class TestLogtailSourceIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'sources.db')
+        self.client = mock.Mock()
+        self.client.get_all_sources.return_value = [
+            make_source('1', 'source1'),
+            make_source('2', 'source2', 'mongodb'),
+            make_source('3', 'other', 'mongodb')]
+        self.index = LogtailSourceIndex(self.path)
+        self.assertFalse(self.index.load())
+        self.index.refresh(self.client)
+
+    def test_refresh_persists(self):
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+        index = LogtailSourceIndex(self.path)
+        self.assertTrue(index.load())
+        self.assertEqual(index.synced_at, '2022-06-11T21:43:12.740Z')
+        sources = index.get_sources()
+        self.assertEqual(len(sources), 3)
+        self.assertEqual(sources[0], make_source('1', 'source1'))
+
+    def test_find_by_name(self):
+        sources = self.index.find_sources(name='source2')
+        self.assertEqual([s['id'] for s in sources], ['2'])
+        plan = self.index.conn.execute(
+            'EXPLAIN QUERY PLAN SELECT id FROM sources WHERE name = ?',
+            ('source2',)).fetchall()
+        self.assertIn('sources_name', str(plan))
+
+    def test_find_by_filter(self):
+        sources = self.index.find_sources(filter={'platform': 'mongo'})
+        self.assertEqual([s['id'] for s in sources], ['2', '3'])
+        with self.assertRaises(LogtailCacheError):
+            self.index.find_sources(filter={'bad key': 'x'})
+
+    def test_find_by_match(self):
+        sources = self.index.find_sources(
+            match={'platform': 'mongodb', 'team_id': 1111})
+        self.assertEqual([s['id'] for s in sources], ['2', '3'])
+        sources = self.index.find_sources(
+            name='other', match={'platform': 'mongodb'})
+        self.assertEqual([s['id'] for s in sources], ['3'])
+        for column in ('platform', 'team_id', 'table_name'):
+            plan = self.index.conn.execute(
+                'EXPLAIN QUERY PLAN SELECT id FROM sources WHERE %s = ?'
+                % column, ('x',)).fetchall()
+            self.assertIn('sources_%s' % column, str(plan))
+        with self.assertRaises(LogtailCacheError):
+            self.index.find_sources(match={'bad key': 'x'})
+
+    def test_filter_booleans_match_cache(self):
+        cache = LogtailSourceCache(os.path.join(self.tmpdir, 'sources.json'))
+        cache.refresh(self.client)
+        for filter in ({'ingest_paused': 'false'}, {'autogen_views': 'tru'},
+                       {'ingest_paused': True}, {'team_id': '111'}):
+            self.assertEqual(
+                [s['id'] for s in cache.find_sources(filter=filter)],
+                [s['id'] for s in self.index.find_sources(filter=filter)])
+        self.assertEqual(
+            [], self.index.find_sources(filter={'ingest_paused': '0'}))
+
+    def test_delta_refresh(self):
+        updated = make_source('3', 'renamed', 'mongodb',
+                              '2022-06-12T00:00:00.000Z')
+        self.client.get_sources_since.return_value = (
+            [updated, make_source('2', 'source2', 'mongodb')],
+            set(['2', '3']), True)
+        changes = self.index.refresh(self.client)
+        self.assertEqual(changes['changed'], [updated])
+        self.assertEqual(changes['removed'], ['1'])
+        self.assertEqual(
+            self.index.find_sources(since='2022-06-11T21:43:12.740Z'),
+            [updated])
+        self.assertEqual(self.index.synced_at, '2022-06-12T00:00:00.000Z')
+
+    def test_locked_index(self):
+        index = LogtailSourceIndex(self.path)
+        for conn in (index._connect(), self.index.conn):
+            conn.execute('PRAGMA busy_timeout = 0')
+        other = sqlite3.connect(self.path)
+        self.addCleanup(other.close)
+        other.execute('BEGIN EXCLUSIVE')
+        with self.assertRaises(LogtailCacheError) as r:
+            index.load()
+        self.assertIn('locked', r.exception.msg)
+        self.client.get_sources_since.return_value = (
+            [make_source('4', 'source4', updated_at='2022-06-12T00:00:00.000Z')],
+            set(['1', '2', '3', '4']), True)
+        with self.assertRaises(LogtailCacheError):
+            self.index.refresh(self.client)
+        other.rollback()
+        # The failed sync left the saved snapshot untouched
+        self.assertEqual(len(LogtailSourceIndex(self.path).get_sources()), 3)
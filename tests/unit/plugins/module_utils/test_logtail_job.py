@@ -0,0 +1,82 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_job import LogtailJobProgress, read_progress
+except ImportError:
+    print("ImportError")
+
+
+class TestLogtailJobProgress(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'jobs', 'listing.json')
+
+    def test_read_missing(self):
+        self.assertIsNone(read_progress(self.path))
+
+    def test_progress(self):
+        progress = LogtailJobProgress(self.path, 'listing').start()
+        progress.advance(pages=1, items=50)
+        progress.advance(pages=1, items=20)
+        status = read_progress(self.path)
+        self.assertEqual(status['state'], 'running')
+        self.assertEqual(status['operation'], 'listing')
+        self.assertEqual(status['pages'], 2)
+        self.assertEqual(status['items'], 70)
+        progress.finish('done')
+        status = read_progress(self.path)
+        self.assertEqual(status['state'], 'finished')
+        self.assertEqual(status['msg'], 'done')
+
+    def test_advance_from_threads(self):
+        progress = LogtailJobProgress(self.path, 'ingest').start()
+        workers = [threading.Thread(
+            target=lambda: [progress.advance(applied=1) for i in range(50)])
+            for i in range(4)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        progress.advance(failed=1)
+        status = read_progress(self.path)
+        self.assertEqual(200, status['applied'])
+        self.assertEqual(1, status['failed'])
+
+    def test_dead_process(self):
+        progress = LogtailJobProgress(self.path).start()
+        progress.fail('API down')
+        self.assertEqual(read_progress(self.path)['state'], 'failed')
+        progress.status['state'] = 'running'
+        progress._write()
+        with mock.patch('os.kill', side_effect=OSError(3, 'No such process')):
+            status = read_progress(self.path)
+        self.assertEqual(status['state'], 'failed')
+
+    def test_start_replaces_previous(self):
+        LogtailJobProgress(self.path).start().finish('done')
+        LogtailJobProgress(self.path).start()
+        self.assertEqual(read_progress(self.path)['state'], 'running')
+        LogtailJobProgress(self.path).start().finish('done')
+        with mock.patch('tempfile.mkstemp', side_effect=OSError(28, 'No space left')):
+            LogtailJobProgress(self.path).start()
+        self.assertIsNone(read_progress(self.path))
+
+    def test_client_reports_pages(self):
+        from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient
+        lt = LogtailApiClient('token')
+        lt.progress = LogtailJobProgress(self.path).start()
+        with mock.patch.object(lt, 'request') as request:
+            request.return_value = {
+                'data': [], 'pagination': {'next': None}}
+            self.assertEqual(lt.get_all_sources(), [])
+        self.assertEqual(read_progress(self.path)['pages'], 1)
@@ -0,0 +1,147 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_plan import LogtailSourcePlan, LogtailPlanError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+except ImportError:
+    print("ImportError")
+
+
+def make_source(id, name, ingest_paused=False,
+                updated_at='2022-06-11T21:43:12.740Z'):
+    return LogtailSource(
+        id=id, name=name, platform='ubuntu', token='token',
+        ingest_paused=ingest_paused, autogen_views=True,
+        created_at='2022-06-10T21:24:46.409Z', updated_at=updated_at,
+        retention=30, table_name=name, team_id=1111).get_dict()
+
+
+class TestLogtailSourcePlan(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'plans', 'sources.plan')
+        self.sources = [
+            make_source('1', 'web'),
+            make_source('2', 'db', updated_at='2022-06-12T08:00:00.000Z'),
+            make_source('3', 'old'),
+        ]
+        self.desired = [
+            dict(name='web', ingest_paused=True),
+            dict(name='db', ingest_paused=False),
+            dict(name='new', platform='nginx', ingest_paused=True),
+        ]
+        self.client = mock.Mock()
+        self.client.get_sources_since.return_value = (list(), set(), False)
+        self.client.update_source.side_effect = \
+            lambda id, name, autogen, ingest: LogtailSource(
+                id=id, ingest_paused=ingest)
+        self.client.create_source.side_effect = \
+            lambda name, platform: LogtailSource(
+                id='4', name=name, platform=platform,
+                ingest_paused=False, autogen_views=True)
+        self.client.remove_source.return_value = True
+
+    def build(self, prune=True):
+        plan = LogtailSourcePlan(self.path)
+        plan.build(self.sources, self.desired, prune=prune)
+        plan.save()
+        plan = LogtailSourcePlan(self.path)
+        plan.load()
+        return plan
+
+    def test_build(self):
+        plan = self.build()
+        self.assertEqual(
+            [('update', 'web'), ('create', 'new'), ('delete', 'old')],
+            [(a['action'], a['name']) for a in plan.actions])
+        self.assertEqual({'ingest_paused': True}, plan.actions[0]['changes'])
+        self.assertEqual(
+            '2022-06-11T21:43:12.740Z',
+            plan.actions[0]['expected_updated_at'])
+        self.assertEqual('2022-06-12T08:00:00.000Z', plan.watermark)
+        self.assertEqual(os.stat(self.path).st_mode & 0o777, 0o600)
+
+    def test_build_without_prune(self):
+        plan = LogtailSourcePlan(self.path)
+        actions = plan.build(self.sources, self.desired)
+        self.assertNotIn('delete', [a['action'] for a in actions])
+
+    def test_build_errors(self):
+        plan = LogtailSourcePlan(self.path)
+        with self.assertRaises(LogtailPlanError):
+            plan.build(self.sources, [dict(name='missing')])
+        with self.assertRaises(LogtailPlanError):
+            plan.build(self.sources, [dict(name='web'), dict(name='web')])
+        with self.assertRaises(LogtailPlanError):
+            plan.build(self.sources + [make_source('5', 'web')],
+                       [dict(name='web', ingest_paused=True)])
+
+    def test_load_missing(self):
+        with self.assertRaises(LogtailPlanError):
+            LogtailSourcePlan(self.path).load()
+
+    def test_apply(self):
+        plan = self.build()
+        steps = plan.apply(self.client)
+        self.client.get_sources_since.assert_called_once_with(
+            '2022-06-12T08:00:00.000Z')
+        self.client.get_all_sources.assert_not_called()
+        self.client.update_source.assert_any_call('1', None, None, True)
+        self.client.create_source.assert_called_once_with('new', 'nginx')
+        self.client.update_source.assert_any_call('4', None, None, True)
+        self.client.remove_source.assert_called_once_with('3')
+        self.assertEqual(
+            ['applied', 'applied', 'applied'],
+            [step['outcome'] for step in steps])
+        self.assertEqual('4', steps[1]['id'])
+
+    def test_apply_drifted(self):
+        plan = self.build()
+        # web was paused and new was created by someone else meanwhile
+        self.client.get_sources_since.return_value = ([
+            make_source('1', 'web', ingest_paused=True,
+                        updated_at='2022-06-13T00:00:00.000Z'),
+            make_source('6', 'new',
+                        updated_at='2022-06-13T00:00:00.000Z'),
+        ], set(['1', '2', '6']), True)
+        steps = plan.apply(self.client)
+        self.client.update_source.assert_not_called()
+        self.client.create_source.assert_not_called()
+        self.assertEqual('unchanged', steps[0]['outcome'])
+        self.assertTrue(steps[0]['drifted'])
+        self.assertEqual('conflict', steps[1]['outcome'])
+        # The complete listing shows old was deleted meanwhile
+        self.assertEqual('missing', steps[2]['outcome'])
+        self.client.remove_source.assert_not_called()
+
+    def test_apply_drifted_delete(self):
+        plan = self.build()
+        # old was renamed after the plan was made, it is not deleted
+        self.client.get_sources_since.return_value = ([
+            make_source('3', 'older',
+                        updated_at='2022-06-13T00:00:00.000Z'),
+        ], set(['1', '2', '3']), True)
+        steps = plan.apply(self.client)
+        self.client.remove_source.assert_not_called()
+        self.assertEqual('conflict', steps[2]['outcome'])
+        self.assertTrue(steps[2]['drifted'])
+        self.assertEqual(
+            'The source old changed since the plan was made', steps[2]['msg'])
+
+    def test_apply_failure(self):
+        plan = self.build()
+        self.client.remove_source.side_effect = LogtailApiError(
+            'Internal Server Error', status=500)
+        steps = plan.apply(self.client)
+        self.assertEqual('failed', steps[2]['outcome'])
+        self.assertEqual('Internal Server Error', steps[2]['msg'])
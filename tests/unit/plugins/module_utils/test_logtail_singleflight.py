@@ -0,0 +1,126 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailConnectionError, LogtailDeadlineError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_singleflight import LogtailSingleFlight
+except ImportError:
+    print("ImportError")
+
+
+class TestLogtailSingleFlight(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.flight = LogtailSingleFlight(
+            os.path.join(self.tmpdir, 'inflight'), poll_interval=0.01)
+
+    def test_key(self):
+        self.assertEqual(
+            self.flight.key('token', 'GET', '/sources'),
+            self.flight.key('token', 'GET', '/sources'))
+        self.assertNotEqual(
+            self.flight.key('token', 'GET', '/sources'),
+            self.flight.key('token2', 'GET', '/sources'))
+
+    def test_do_coalesces(self):
+        calls = list()
+
+        def fetch():
+            calls.append(1)
+            time.sleep(0.2)
+            return {'data': []}
+
+        results = list()
+        threads = [
+            threading.Thread(
+                target=lambda: results.append(self.flight.do('key', fetch)))
+            for i in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'data': []}] * 5)
+        self.assertFalse(os.path.exists(self.flight._paths('key')[0]))
+
+    def test_do_shares_errors(self):
+        fetch = mock.Mock(side_effect=LogtailApiError('Not found', 404))
+        with self.assertRaises(LogtailApiError):
+            self.flight.do('key', fetch, error=LogtailApiError)
+        with self.assertRaises(LogtailApiError) as r:
+            self.flight.do('key', fetch, error=LogtailApiError)
+        self.assertEqual(r.exception.msg, 'Not found')
+        self.assertEqual(r.exception.status, 404)
+        fetch.assert_called_once()
+
+    def test_do_shares_error_type(self):
+        fetch = mock.Mock(side_effect=LogtailConnectionError('API down'))
+        with self.assertRaises(LogtailConnectionError):
+            self.flight.do('key', fetch, error=LogtailApiError)
+        with self.assertRaises(LogtailConnectionError) as r:
+            self.flight.do('key', fetch, error=LogtailApiError)
+        self.assertEqual(r.exception.msg, 'API down')
+        self.assertIsNone(r.exception.status)
+        fetch.assert_called_once()
+
+    def test_transient_errors_not_shared(self):
+        for raised in (LogtailConnectionError('API unreachable'),
+                       LogtailDeadlineError('Deadline exceeded')):
+            lt = LogtailApiClient('token', singleflight=self.flight)
+            with mock.patch.object(lt, '_request') as request:
+                request.side_effect = [raised, {'data': []}]
+                url = '/sources/%s' % type(raised).__name__
+                with self.assertRaises(type(raised)):
+                    lt.request(url=url)
+                self.assertEqual({'data': []}, lt.request(url=url))
+            self.assertEqual(request.call_count, 2)
+
+    def test_do_expired_result(self):
+        self.flight.result_ttl = 0
+        fetch = mock.Mock(return_value=True)
+        self.flight.do('key', fetch)
+        time.sleep(0.01)
+        self.flight.do('key', fetch)
+        self.assertEqual(fetch.call_count, 2)
+
+    def test_expired_results_deleted(self):
+        self.flight.result_ttl = 0
+        self.flight.do('key1', mock.Mock(return_value=True))
+        time.sleep(0.01)
+        self.flight.do('key2', mock.Mock(return_value=True))
+        self.assertFalse(os.path.exists(self.flight._paths('key1')[1]))
+        self.assertTrue(os.path.exists(self.flight._paths('key2')[1]))
+
+    def test_lock_broken_by_waiter(self):
+        lock = self.flight._paths('key')[0]
+        self.assertEqual(
+            'value', self.flight.do('key', lambda: os.remove(lock) or 'value'))
+
+    def test_insecure_directory(self):
+        os.chmod(self.tmpdir, 0o755)
+        flight = LogtailSingleFlight(self.tmpdir)
+        fetch = mock.Mock(return_value=True)
+        flight.do('key', fetch)
+        flight.do('key', fetch)
+        self.assertFalse(flight.secure())
+        self.assertEqual(fetch.call_count, 2)
+        self.assertEqual([], os.listdir(self.tmpdir))
+
+    def test_client_coalesces_get(self):
+        lt = LogtailApiClient('token', singleflight=self.flight)
+        with mock.patch.object(lt, '_request') as request:
+            request.return_value = {'data': []}
+            lt.request()
+            lt.request()
+            lt.request(method='DELETE', url='/sources/1')
+        self.assertEqual(request.call_count, 2)
@@ -5,7 +5,7 @@ import unittest
 from unittest import mock
 
 try:
-    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource, LogtailSourceSummary, equal_source, match_source
 except ImportError:
     print("ImportError")    
 
@@ -43,3 +43,45 @@ class TestLogtailSourceClass(unittest.TestCase):
         sourcedict = self.source.get_dict()
         self.assertEqual(dict, type(sourcedict))
         self.assertEqual(sourcedict['id'], self.source.id)
+
+    def test_source_changes(self):
+        changes = self.source.requires_update('Source2', True, False)
+        self.assertEqual(
+            {'name': 'Source2', 'autogen_views': False}, changes)
+        self.assertEqual(dict(
+            before={'name': 'Source1', 'autogen_views': True},
+            after={'name': 'Source2', 'autogen_views': False},
+        ), self.source.get_diff(changes))
+
+    def test_match_source(self):
+        sourcedict = self.source.get_dict()
+        self.assertTrue(match_source({'platform': 'ubu'}, sourcedict))
+        self.assertTrue(match_source(
+            {'name': 'nomatch', 'platform': 'ubuntu'}, sourcedict))
+        self.assertFalse(match_source({'platform': 'mongo'}, sourcedict))
+        sourcedict['ingest_paused'] = False
+        self.assertTrue(match_source({'ingest_paused': 'fal'}, sourcedict))
+        self.assertTrue(match_source({'ingest_paused': False}, sourcedict))
+        self.assertFalse(match_source({'ingest_paused': '0'}, sourcedict))
+
+    def test_equal_source(self):
+        sourcedict = self.source.get_dict()
+        self.assertTrue(equal_source(
+            {'name': sourcedict['name'], 'platform': sourcedict['platform']},
+            sourcedict))
+        self.assertFalse(equal_source(
+            {'name': sourcedict['name'], 'platform': 'mongo'}, sourcedict))
+
+    def test_source_summary(self):
+        summary = LogtailSourceSummary()
+        summary.add(self.source.get_dict())
+        summary.add(LogtailSource(
+            id=2, platform='nginx', retention=30,
+            ingest_paused=False).get_dict())
+        self.assertEqual(dict(
+            count=2,
+            platform={'ubuntu': 1, 'nginx': 1},
+            team_id={'1111': 1, 'null': 1},
+            retention={'30': 2},
+            ingest_paused={'true': 1, 'false': 1},
+        ), summary.get_dict())
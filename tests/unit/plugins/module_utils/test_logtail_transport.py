@@ -0,0 +1,70 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import threading
+import time
+import unittest
+from unittest import mock
+from ansible.module_utils.six.moves import BaseHTTPServer
+from ansible.module_utils.six.moves.urllib.error import HTTPError
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_transport import LogtailKeepAliveTransport, LogtailRateLimiter
+    TRANSPORT_PATH = "ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_transport"
+except ImportError:
+    print("ImportError")
+
+
+class MockHandler(BaseHTTPServer.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+    def do_GET(self):
+        status = 404 if self.path == '/missing' else 200
+        body = b'{"data": {"port": %d}}' % self.client_address[1]
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class TestLogtailTransport(unittest.TestCase):
+
+    def test_rate_limiter(self):
+        limiter = LogtailRateLimiter(50, burst=1)
+        started = time.time()
+        for i in range(3):
+            limiter.acquire()
+        self.assertGreaterEqual(time.time() - started, 0.03)
+
+    def test_keep_alive_transport(self):
+        server = BaseHTTPServer.HTTPServer(('127.0.0.1', 0), MockHandler)
+        self.addCleanup(server.server_close)
+        thread = threading.Thread(target=server.serve_forever)
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.shutdown)
+        url = 'http://127.0.0.1:%d' % server.server_port
+        transport = LogtailKeepAliveTransport()
+        first = transport(url + '/sources', method='GET')
+        second = transport(url + '/sources', method='GET')
+        self.assertEqual(first.status, 200)
+        # The same client port means the connection was reused
+        self.assertEqual(first.read(), second.read())
+        with self.assertRaises(HTTPError) as r:
+            transport(url + '/missing', method='GET')
+        self.assertIn('Content-type', r.exception.headers)
+
+    def test_proxy_uses_open_url(self):
+        transport = LogtailKeepAliveTransport()
+        env = {'https_proxy': 'http://proxy:3128', 'no_proxy': ''}
+        with mock.patch.dict(os.environ, env), \
+                mock.patch(TRANSPORT_PATH + '.open_url') as open_url:
+            transport('https://logtail.com/api/v1/sources', method='GET')
+        self.assertEqual(open_url.call_args[0][0],
+                         'https://logtail.com/api/v1/sources')
+        self.assertEqual({}, transport.idle)
@@ -0,0 +1,120 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_watch import LogtailSourceWatch, LogtailWatchError, changed_fields
+except ImportError:
+    print("ImportError")
+
+
+def make_source(id, name, ingest_paused=False,
+                updated_at='2022-06-11T21:43:12.740Z'):
+    return LogtailSource(
+        id=id, name=name, platform='ubuntu', token='token',
+        ingest_paused=ingest_paused, autogen_views=True,
+        created_at='2022-06-10T21:24:46.409Z', updated_at=updated_at,
+        retention=30, table_name=name, team_id=1111).get_dict()
+
+
+class TestLogtailSourceWatch(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'watch', 'state.json')
+        self.sources = [
+            make_source('1', 'web'),
+            make_source('2', 'db', updated_at='2022-06-12T08:00:00.000Z'),
+        ]
+        self.client = mock.Mock()
+        self.client.get_all_sources.return_value = self.sources
+        self.client.get_sources_since.return_value = (list(), set(), False)
+
+    def baseline(self):
+        watch = LogtailSourceWatch(self.path)
+        watch.load()
+        self.assertEqual([], watch.poll(self.client))
+        watch.save()
+        watch = LogtailSourceWatch(self.path)
+        watch.load()
+        return watch
+
+    def test_changed_fields(self):
+        before = make_source('1', 'web')
+        after = make_source('1', 'web', ingest_paused=True,
+                            updated_at='2022-07-01T00:00:00.000Z')
+        self.assertEqual(
+            {'ingest_paused': {'before': False, 'after': True}},
+            changed_fields(before, after))
+        after['token'] = 'newtoken'
+        self.assertEqual(
+            {'changed': True}, changed_fields(before, after)['token'])
+
+    def test_baseline(self):
+        watch = self.baseline()
+        self.assertEqual(['1', '2'], sorted(watch.sources))
+        self.assertEqual('2022-06-12T08:00:00.000Z', watch.watermark)
+        self.assertEqual(
+            0o600, stat.S_IMODE(os.stat(self.path).st_mode))
+
+    def test_incremental_poll(self):
+        watch = self.baseline()
+        self.client.get_all_sources.reset_mock()
+        self.client.get_sources_since.return_value = ([
+            make_source('3', 'new', updated_at='2022-06-13T00:00:00.000Z'),
+            make_source('1', 'web', ingest_paused=True,
+                        updated_at='2022-06-12T09:00:00.000Z'),
+            self.sources[1],
+        ], set(['1', '2', '3']), False)
+        events = watch.poll(self.client, full_scan_interval=900)
+        self.client.get_sources_since.assert_called_once_with(
+            '2022-06-12T08:00:00.000Z')
+        self.client.get_all_sources.assert_not_called()
+        self.assertEqual(['created', 'modified'],
+                         [event['event'] for event in events])
+        self.assertEqual('new', events[0]['source']['name'])
+        self.assertNotIn('token', events[0]['source'])
+        self.assertEqual(
+            {'ingest_paused': {'before': False, 'after': True}},
+            events[1]['changes'])
+        self.assertEqual('2022-06-13T00:00:00.000Z', watch.watermark)
+
+    def test_deletions(self):
+        watch = self.baseline()
+        # A complete incremental walk holds every ID
+        self.client.get_sources_since.return_value = \
+            ([self.sources[1]], set(['2']), True)
+        events = watch.poll(self.client, full_scan_interval=900)
+        self.assertEqual([('deleted', '1')],
+                         [(event['event'], event['id']) for event in events])
+        self.assertNotIn('1', watch.sources)
+
+        # So does the periodic full listing
+        self.client.get_all_sources.return_value = list()
+        with mock.patch('time.time', return_value=watch.scanned_at + 900):
+            events = watch.poll(self.client, full_scan_interval=900)
+        self.assertEqual([('deleted', '2')],
+                         [(event['event'], event['id']) for event in events])
+
+    def test_failed_listing(self):
+        watch = LogtailSourceWatch(self.path)
+        self.client.get_all_sources.return_value = False
+        with self.assertRaises(LogtailApiError):
+            watch.poll(self.client)
+        self.assertIsNone(watch.sources)
+
+    def test_bad_state(self):
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{"version": 99}')
+        with self.assertRaises(LogtailWatchError):
+            LogtailSourceWatch(self.path).load()
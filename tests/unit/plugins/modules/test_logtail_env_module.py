@@ -0,0 +1,115 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import shutil
+import stat
+import tempfile
+import unittest
+from unittest import mock
+from ansible.module_utils import basic
+from ansible.module_utils.common.text.converters import to_bytes
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.modules import logtail_env
+except ImportError:
+    print("ImportError")
+
+
+class AnsibleExitJson(Exception):
+    """Exception class to be raised by module.exit_json and caught by the test case"""
+    pass
+
+
+class AnsibleFailJson(Exception):
+    """Exception class to be raised by module.fail_json and caught by the test case"""
+    pass
+
+
+def set_module_args(args):
+    """prepare arguments so that they will be picked up during module creation"""
+    args = json.dumps({'ANSIBLE_MODULE_ARGS': args})
+    basic._ANSIBLE_ARGS = to_bytes(args)
+
+
+def mocked_exit_json(*args, **kwargs):
+    """function to patch over exit_json; package return data into an exception"""
+    if 'changed' not in kwargs:
+        kwargs['changed'] = False
+    raise AnsibleExitJson(kwargs)
+
+
+def mocked_fail_json(*args, **kwargs):
+    """function to patch over fail_json; package return data into an exception"""
+    kwargs['failed'] = True
+    raise AnsibleFailJson(kwargs)
+
+
+class TestLogtailEnvModule(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_module_helper = mock.patch.multiple(
+            basic.AnsibleModule,
+            exit_json=mocked_exit_json,
+            fail_json=mocked_fail_json)
+        self.mock_module_helper.start()
+        self.addCleanup(self.mock_module_helper.stop)
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'environment')
+
+    def run_env(self, **args):
+        args['path'] = self.path
+        set_module_args(args)
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_env.main()
+        return r.exception.args[0]
+
+    def content(self):
+        with open(self.path, 'r') as f:
+            return f.read()
+
+    def test_missing_file_read(self):
+        result = self.run_env()
+        self.assertFalse(result['changed'])
+        self.assertIsNone(result['source_id'])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_write_and_read(self):
+        with open(self.path, 'w') as f:
+            f.write('PATH="/usr/bin:/bin"\nLOGTAIL_SOURCE_ID=1\n'
+                    'LOGTAIL_SOURCE_ID=2')
+        os.chmod(self.path, 0o640)
+        result = self.run_env(source_id='123456', source_token='abc')
+        self.assertTrue(result['changed'])
+        self.assertEqual('123456', result['source_id'])
+        self.assertEqual(
+            'PATH="/usr/bin:/bin"\nLOGTAIL_SOURCE_ID=123456\n'
+            "LOGTAIL_SOURCE_TOKEN='abc'\n", self.content())
+        self.assertEqual(0o640, stat.S_IMODE(os.stat(self.path).st_mode))
+
+        mtime = os.stat(self.path).st_mtime_ns
+        result = self.run_env(source_id='123456', source_token='abc')
+        self.assertFalse(result['changed'])
+        self.assertEqual(mtime, os.stat(self.path).st_mtime_ns)
+
+        result = self.run_env()
+        self.assertEqual('123456', result['source_id'])
+        self.assertNotIn('source_token', result)
+        result = self.run_env(return_token=True)
+        self.assertEqual('abc', result['source_token'])
+
+    def test_check_mode(self):
+        result = self.run_env(source_id='123456', _ansible_check_mode=True)
+        self.assertTrue(result['changed'])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_absent(self):
+        with open(self.path, 'w') as f:
+            f.write("LANG=C\nexport LOGTAIL_SOURCE_ID=1\n"
+                    "LOGTAIL_SOURCE_TOKEN='abc'\n")
+        result = self.run_env(state='absent', return_token=True)
+        self.assertTrue(result['changed'])
+        self.assertIsNone(result['source_token'])
+        self.assertEqual('LANG=C\n', self.content())
@@ -0,0 +1,84 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from ansible.module_utils import basic
+from ansible.module_utils.common.text.converters import to_bytes
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.modules import logtail_job_info
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_job import LogtailJobProgress
+except ImportError:
+    print("ImportError")
+
+
+class AnsibleExitJson(Exception):
+    """Exception class to be raised by module.exit_json and caught by the test case"""
+    pass
+
+
+class AnsibleFailJson(Exception):
+    """Exception class to be raised by module.fail_json and caught by the test case"""
+    pass
+
+
+def set_module_args(args):
+    """prepare arguments so that they will be picked up during module creation"""
+    args = json.dumps({'ANSIBLE_MODULE_ARGS': args})
+    basic._ANSIBLE_ARGS = to_bytes(args)
+
+
+def mocked_exit_json(*args, **kwargs):
+    """function to patch over exit_json; package return data into an exception"""
+    if 'changed' not in kwargs:
+        kwargs['changed'] = False
+    raise AnsibleExitJson(kwargs)
+
+
+def mocked_fail_json(*args, **kwargs):
+    """function to patch over fail_json; package return data into an exception"""
+    kwargs['failed'] = True
+    raise AnsibleFailJson(kwargs)
+
+
+class TestLogtailJobInfoModule(unittest.TestCase):
+
+    def setUp(self):
+        self.mock_module_helper = mock.patch.multiple(
+            basic.AnsibleModule,
+            exit_json=mocked_exit_json,
+            fail_json=mocked_fail_json)
+        self.mock_module_helper.start()
+        self.addCleanup(self.mock_module_helper.stop)
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.path = os.path.join(self.tmpdir, 'job.json')
+
+    def test_not_started(self):
+        set_module_args({'path': self.path})
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_job_info.main()
+        self.assertFalse(r.exception.args[0]['started'])
+        self.assertFalse(r.exception.args[0]['finished'])
+
+    def test_running(self):
+        LogtailJobProgress(self.path).start().advance(pages=3, items=150)
+        set_module_args({'path': self.path})
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_job_info.main()
+        self.assertTrue(r.exception.args[0]['started'])
+        self.assertFalse(r.exception.args[0]['finished'])
+        self.assertEqual(r.exception.args[0]['job']['items'], 150)
+
+    def test_failed(self):
+        LogtailJobProgress(self.path).start().fail('API down')
+        set_module_args({'path': self.path})
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_job_info.main()
+        self.assertTrue(r.exception.args[0]['finished'])
+        self.assertEqual('API down', r.exception.args[0]['msg'])
@@ -2,6 +2,9 @@ from __future__ import (absolute_import, division, print_function)
 __metaclass__ = type
 
 import json
+import os
+import shutil
+import tempfile
 import unittest
 from unittest import mock
 from ansible.module_utils import basic
@@ -9,7 +12,7 @@ from ansible.module_utils.common.text.converters import to_bytes
 
 try:
     from ansible_collections.sd_hardy.logtail.plugins.modules import logtail_source_info
-    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiClient, LogtailApiError, LogtailDeadlineError
     from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
     MOCK_PATH = "ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api.LogtailApiClient"
 except ImportError:
@@ -82,7 +85,7 @@ class TestLogtailSourceInfoModule(unittest.TestCase):
         with self.assertRaises(AnsibleFailJson) as r:
             logtail_source_info.main()
         self.assertEqual(
-            'missing required arguments: token',
+            'one of the following is required: token, accounts',
             r.exception.args[0]['msg'])
 
     def test_get_by_id(self):
@@ -118,6 +121,29 @@ class TestLogtailSourceInfoModule(unittest.TestCase):
             'No source found with ID %s' % self.source.id,
             r.exception.args[0]['msg'])
 
+    def test_get_by_id_progress(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'job.json')
+        self.mocked_get_source.return_value = False
+        set_module_args({
+            'token': 'token',
+            'id': self.source.id,
+            'progress_file': path
+        })
+        with self.assertRaises(AnsibleFailJson):
+            logtail_source_info.main()
+        with open(path) as f:
+            status = json.load(f)
+        self.assertEqual('failed', status['state'])
+        self.assertEqual(
+            'No source found with ID %s' % self.source.id, status['msg'])
+        self.mocked_get_source.return_value = self.source
+        with self.assertRaises(AnsibleExitJson):
+            logtail_source_info.main()
+        with open(path) as f:
+            self.assertEqual('finished', json.load(f)['state'])
+
     def test_get_by_id_api_exc(self):
         self.mocked_get_source.side_effect = LogtailApiError(
             'Internal Server Error')
@@ -220,3 +246,218 @@ class TestLogtailSourceInfoModule(unittest.TestCase):
             list, type(r.exception.args[0]['sources']))
         self.assertFalse(r.exception.args[0]['changed'])
         self.assertTrue(r.exception.args[0]['sources'])
+
+    def test_sources_by_match(self):
+        self.mocked_all_sources.return_value = [
+            self.source.get_dict(), self.source2.get_dict(),
+            self.source3.get_dict()]
+        set_module_args({
+            'token': 'token',
+            'filter': {'name': 'source'},
+            'match': {'platform': 'ubuntu'}
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_info.main()
+        self.assertEqual(
+            [self.source.id, self.source2.id],
+            [s['id'] for s in r.exception.args[0]['sources']])
+
+    def test_sources_since(self):
+        source = self.source.get_dict()
+        source['updated_at'] = '2022-06-12T00:00:00.000Z'
+        source2 = self.source2.get_dict()
+        source2['updated_at'] = '2022-06-11T00:00:00.000Z'
+        # The client leaves out sources not updated after since
+        with mock.patch(MOCK_PATH+'.iter_source_pages') as iter_pages:
+            iter_pages.return_value = iter([[source, source2]])
+            set_module_args({
+                'token': 'token',
+                'since': '2022-06-11T00:00:00.000Z'
+            })
+            with self.assertRaises(AnsibleExitJson) as r:
+                logtail_source_info.main()
+            self.assertIn('sort=-updated_at', iter_pages.call_args[0][0])
+        self.mocked_all_sources.assert_not_called()
+        self.assertEqual(
+            [self.source.id],
+            [s['id'] for s in r.exception.args[0]['sources']])
+
+    def test_source_by_name_from_index(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        source = self.source.get_dict()
+        source2 = self.source2.get_dict()
+        for s in (source, source2):
+            s['updated_at'] = '2022-06-11T00:00:00.000Z'
+        self.mocked_all_sources.return_value = [source, source2]
+        set_module_args({
+            'token': 'token',
+            'name': 'source2',
+            'cache_path': os.path.join(tmpdir, 'sources.db'),
+            'cache_format': 'sqlite'
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_info.main()
+        self.mocked_all_sources.assert_called_once_with()
+        self.assertEqual([], r.exception.args[0]['removed'])
+        self.assertEqual(
+            ['source2'],
+            [s['name'] for s in r.exception.args[0]['sources']])
+
+    def test_sources_by_ids(self):
+        sources = dict((s.id, s) for s in (
+            self.source, self.source2, self.source3))
+        self.mocked_get_source.side_effect = \
+            lambda id: sources.get(id, False)
+        set_module_args({
+            'token': 'token',
+            'ids': [self.source3.id, self.source.id, 999, self.source3.id]
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_info.main()
+        self.assertEqual(3, self.mocked_get_source.call_count)
+        self.mocked_all_sources.assert_not_called()
+        self.assertEqual(
+            [self.source3.id, self.source.id],
+            [s['id'] for s in r.exception.args[0]['sources']])
+        self.assertEqual([999], r.exception.args[0]['not_found'])
+        self.assertIn('limit', r.exception.args[0]['concurrency'])
+
+    def test_sources_by_ids_api_exc(self):
+        def get_source(id):
+            if id == self.source2.id:
+                raise LogtailApiError('Internal Server Error', status=500)
+            return self.source
+        self.mocked_get_source.side_effect = get_source
+        set_module_args({
+            'token': 'token',
+            'ids': [self.source.id, self.source2.id]
+        })
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_info.main()
+        self.assertEqual(
+            'Failed to pull 1 sources. %s: Internal Server Error'
+            % self.source2.id,
+            r.exception.args[0]['msg'])
+        self.assertIn('changes', r.exception.args[0]['concurrency'])
+        self.assertEqual(1, len(r.exception.args[0]['sources']))
+
+    def test_id_and_ids_exclusive(self):
+        set_module_args({
+            'token': 'token',
+            'id': self.source.id,
+            'ids': [self.source.id]
+        })
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_info.main()
+        self.assertEqual(
+            'parameters are mutually exclusive: id|ids',
+            r.exception.args[0]['msg'])
+
+    def test_summary_streams_pages(self):
+        pages = [
+            [self.source.get_dict(), self.source2.get_dict()],
+            [self.source3.get_dict()],
+        ]
+        set_module_args({
+            'token': 'token',
+            'filter': {'platform': 'ubuntu'},
+            'summary': True
+        })
+        with mock.patch(MOCK_PATH+'.iter_source_pages') as iter_pages:
+            iter_pages.return_value = iter(pages)
+            with self.assertRaises(AnsibleExitJson) as r:
+                logtail_source_info.main()
+        self.mocked_all_sources.assert_not_called()
+        self.assertNotIn('sources', r.exception.args[0])
+        summary = r.exception.args[0]['summary']
+        self.assertEqual(2, summary['count'])
+        self.assertEqual({'ubuntu': 2}, summary['platform'])
+
+    def test_sources_key_by_name(self):
+        duplicate = LogtailSource(id=123459, name='source1')
+        self.mocked_all_sources.return_value = [
+            self.source.get_dict(), self.source2.get_dict(),
+            duplicate.get_dict()]
+        set_module_args({
+            'token': 'token',
+            'key_by': 'name'
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_info.main()
+        self.assertNotIn('sources', r.exception.args[0])
+        sources = r.exception.args[0]['sources_by_key']
+        self.assertEqual(['source1', 'source2'], sorted(sources))
+        self.assertEqual(self.source.id, sources['source1']['id'])
+
+    def test_deadline_exceeded(self):
+        error = LogtailDeadlineError(
+            'The operation did not finish before its deadline')
+        error.partial = [self.source.get_dict(), self.source3.get_dict()]
+        self.mocked_all_sources.side_effect = error
+        set_module_args({
+            'token': 'token',
+            'filter': {'platform': 'ubuntu'},
+            'deadline': 30
+        })
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_info.main()
+        self.assertTrue(r.exception.args[0]['deadline_exceeded'])
+        self.assertEqual(
+            [self.source.id],
+            [s['id'] for s in r.exception.args[0]['sources']])
+
+    def test_accounts(self):
+        listings = {
+            'token1': [self.source.get_dict()],
+            'token2': [self.source2.get_dict(), self.source3.get_dict()],
+        }
+
+        def get_all_sources(lt, *args, **kwargs):
+            if lt.token == 'token3':
+                raise LogtailApiError('Unauthorized')
+            return listings[lt.token]
+
+        set_module_args({
+            'accounts': [
+                {'alias': 'web', 'token': 'token1'},
+                {'alias': 'data', 'token': 'token2'},
+            ],
+            'filter': {'platform': 'ubuntu'}
+        })
+        with mock.patch(MOCK_PATH+'.get_all_sources', get_all_sources):
+            with self.assertRaises(AnsibleExitJson) as r:
+                logtail_source_info.main()
+        result = r.exception.args[0]
+        self.assertEqual(
+            [('web', self.source.id), ('data', self.source2.id)],
+            [(s['account'], s['id']) for s in result['sources']])
+        self.assertEqual(
+            [('web', 1), ('data', 1)],
+            [(a['alias'], a['count']) for a in result['accounts']])
+
+        set_module_args({
+            'accounts': [
+                {'alias': 'web', 'token': 'token1'},
+                {'alias': 'broken', 'token': 'token3'},
+            ]
+        })
+        with mock.patch(MOCK_PATH+'.get_all_sources', get_all_sources):
+            with self.assertRaises(AnsibleFailJson) as r:
+                logtail_source_info.main()
+        result = r.exception.args[0]
+        self.assertTrue(result['msg'].startswith('Failed to list 1 accounts'))
+        self.assertEqual('Unauthorized', result['accounts'][1]['msg'])
+        self.assertLess(result['accounts'][1]['elapsed'], 5)
+        self.assertEqual(['web'], [s['account'] for s in result['sources']])
+
+    def test_accounts_with_id(self):
+        set_module_args({
+            'accounts': [{'alias': 'web', 'token': 'token1'}],
+            'id': self.source.id
+        })
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_info.main()
+        self.assertEqual(
+            'parameters are mutually exclusive: accounts|id',
+            r.exception.args[0]['msg'])
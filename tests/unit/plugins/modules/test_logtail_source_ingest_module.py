@@ -0,0 +1,230 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from ansible.module_utils import basic
+from ansible.module_utils.common.text.converters import to_bytes
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.modules import logtail_source_ingest
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_job import read_progress
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+    MOCK_PATH = "ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api.LogtailApiClient"
+except ImportError:
+    print("ImportError")
+
+
+class AnsibleExitJson(Exception):
+    """Exception class to be raised by module.exit_json and caught by the test case"""
+    pass
+
+
+class AnsibleFailJson(Exception):
+    """Exception class to be raised by module.fail_json and caught by the test case"""
+    pass
+
+
+def set_module_args(args):
+    """prepare arguments so that they will be picked up during module creation"""
+    args = json.dumps({'ANSIBLE_MODULE_ARGS': args})
+    basic._ANSIBLE_ARGS = to_bytes(args)
+
+
+def mocked_exit_json(*args, **kwargs):
+    """function to patch over exit_json; package return data into an exception"""
+    if 'changed' not in kwargs:
+        kwargs['changed'] = False
+    raise AnsibleExitJson(kwargs)
+
+
+def mocked_fail_json(*args, **kwargs):
+    """function to patch over fail_json; package return data into an exception"""
+    kwargs['failed'] = True
+    raise AnsibleFailJson(kwargs)
+
+
+class TestLogtailSourceIngestModule(unittest.TestCase):
+
+    def setUp(self):
+        self.sources = [
+            LogtailSource(id=1, name='web1', platform='nginx',
+                          ingest_paused=False).get_dict(),
+            LogtailSource(id=2, name='web2', platform='nginx',
+                          ingest_paused=True).get_dict(),
+            LogtailSource(id=3, name='web3', platform='nginx',
+                          ingest_paused=False).get_dict(),
+            LogtailSource(id=4, name='db1', platform='mongodb',
+                          ingest_paused=False).get_dict(),
+        ]
+
+        self.mock_module_helper = mock.patch.multiple(
+            basic.AnsibleModule,
+            exit_json=mocked_exit_json,
+            fail_json=mocked_fail_json)
+        self.mock_module_helper.start()
+        self.addCleanup(self.mock_module_helper.stop)
+
+        self.patch_all_sources = mock.patch(
+            MOCK_PATH+'.get_all_sources')
+        self.addCleanup(self.patch_all_sources.stop)
+        self.mocked_all_sources = self.patch_all_sources.start()
+        self.mocked_all_sources.return_value = self.sources
+
+        self.patch_update_source = mock.patch(
+            MOCK_PATH+'.update_source')
+        self.addCleanup(self.patch_update_source.stop)
+        self.mocked_update_source = self.patch_update_source.start()
+        self.mocked_update_source.side_effect = \
+            lambda id, name, autogen, ingest: LogtailSource(
+                id=id, ingest_paused=ingest)
+
+    def test_required_args(self):
+        set_module_args({'token': 'token', 'ingest_paused': True})
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_ingest.main()
+        self.assertEqual(
+            'one of the following is required: name, filter',
+            r.exception.args[0]['msg'])
+
+    def test_pause_by_filter(self):
+        set_module_args({
+            'token': 'token',
+            'filter': {'platform': 'nginx'},
+            'ingest_paused': True
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_ingest.main()
+        self.mocked_all_sources.assert_called_once()
+        self.assertEqual(2, self.mocked_update_source.call_count)
+        self.mocked_update_source.assert_any_call(1, None, None, True)
+        self.mocked_update_source.assert_any_call(3, None, None, True)
+        result = r.exception.args[0]
+        self.assertTrue(result['changed'])
+        self.assertEqual(
+            ['updated', 'unchanged', 'updated'],
+            [entry['outcome'] for entry in result['results']])
+        self.assertEqual('Updated 2 of 3 sources', result['message'])
+        self.assertIn('limit', result['concurrency'])
+
+    def test_already_in_state(self):
+        set_module_args({
+            'token': 'token',
+            'name': 'web2',
+            'ingest_paused': True
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_ingest.main()
+        self.mocked_update_source.assert_not_called()
+        self.assertFalse(r.exception.args[0]['changed'])
+        self.assertEqual(
+            [dict(id=2, name='web2', outcome='unchanged')],
+            r.exception.args[0]['results'])
+
+    def test_check_mode(self):
+        set_module_args({
+            'token': 'token',
+            'filter': {'platform': 'nginx'},
+            'ingest_paused': True,
+            '_ansible_check_mode': True
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_ingest.main()
+        self.mocked_update_source.assert_not_called()
+        self.assertTrue(r.exception.args[0]['changed'])
+
+    def test_partial_failure(self):
+        def update(id, name, autogen, ingest):
+            if id == 3:
+                raise LogtailApiError('Internal Server Error', status=500)
+            return LogtailSource(id=id, ingest_paused=ingest)
+        self.mocked_update_source.side_effect = update
+        set_module_args({
+            'token': 'token',
+            'filter': {'platform': 'nginx'},
+            'ingest_paused': True
+        })
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_ingest.main()
+        result = r.exception.args[0]
+        self.assertTrue(result['changed'])
+        self.assertEqual('Failed to update 1 sources', result['msg'])
+        self.assertEqual('failed', result['results'][2]['outcome'])
+        self.assertEqual(
+            'Internal Server Error', result['results'][2]['msg'])
+
+    def test_progress_counts_failures(self):
+        def update(id, name, autogen, ingest):
+            if id == 3:
+                return False
+            return LogtailSource(id=id, ingest_paused=ingest)
+        self.mocked_update_source.side_effect = update
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        path = os.path.join(tmpdir, 'ingest.json')
+        set_module_args({
+            'token': 'token',
+            'filter': {'platform': 'nginx'},
+            'ingest_paused': True,
+            'progress_file': path
+        })
+        with self.assertRaises(AnsibleFailJson):
+            logtail_source_ingest.main()
+        status = read_progress(path)
+        self.assertEqual('failed', status['state'])
+        self.assertEqual('Failed to update 1 sources', status['msg'])
+        self.assertEqual(1, status['applied'])
+        self.assertEqual(1, status['failed'])
+
+    def test_listing_api_exc(self):
+        self.mocked_all_sources.side_effect = LogtailApiError(
+            'Internal Server Error')
+        set_module_args({
+            'token': 'token',
+            'name': 'web1',
+            'ingest_paused': True
+        })
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_ingest.main()
+        self.mocked_update_source.assert_not_called()
+        self.assertEqual(
+            'Internal Server Error', r.exception.args[0]['msg'])
+
+    def test_listing_failed(self):
+        self.mocked_all_sources.return_value = False
+        set_module_args({
+            'token': 'token',
+            'name': 'web1',
+            'ingest_paused': True
+        })
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_ingest.main()
+        self.mocked_update_source.assert_not_called()
+        self.assertEqual(
+            'Unable to list the sources to update',
+            r.exception.args[0]['msg'])
+
+    def test_accounts(self):
+        set_module_args({
+            'accounts': [
+                {'alias': 'web', 'token': 'token1'},
+                {'alias': 'data', 'token': 'token2', 'rate': 5},
+            ],
+            'name': 'web1',
+            'ingest_paused': True
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_ingest.main()
+        result = r.exception.args[0]
+        self.assertTrue(result['changed'])
+        self.assertEqual(2, self.mocked_update_source.call_count)
+        self.assertEqual(
+            ['data', 'web'],
+            sorted(entry['account'] for entry in result['results']))
+        self.assertEqual(
+            ['web', 'data'], [a['alias'] for a in result['accounts']])
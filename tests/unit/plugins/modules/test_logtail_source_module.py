@@ -225,6 +225,38 @@ class TestLogtailSourceModule(unittest.TestCase):
         self.assertFalse(r.exception.args[0]['source'])
         self.assertTrue(r.exception.args[0]['changed'])
 
+    def test_update_diff(self):
+        source_id = 123456
+        self.mocked_get_source.return_value = LogtailSource(
+            id=source_id,
+            name='test',
+            ingest_paused=False,
+            autogen_views=True)
+        self.mocked_update_source.return_value = LogtailSource(
+            id=source_id,
+            name='test',
+            ingest_paused=True,
+            autogen_views=True)
+        set_module_args({
+            'token': 'token',
+            'state': 'present',
+            'name': 'test',
+            'autogen_views': True,
+            'ingest_paused': True,
+            'id': source_id,
+            '_ansible_diff': True
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source.main()
+        self.mocked_update_source.assert_called_once_with(
+            source_id, None, None, True)
+        self.assertEqual(
+            {'ingest_paused': True}, r.exception.args[0]['changes'])
+        self.assertEqual(
+            dict(before={'ingest_paused': False},
+                 after={'ingest_paused': True}),
+            r.exception.args[0]['diff'])
+
     def test_state_present_update(self):
         source_id = 123456
         source_name = 'updated'
@@ -295,9 +327,10 @@ class TestLogtailSourceModule(unittest.TestCase):
             source_name,
             source_platform)
         self.mocked_update_source.assert_called_once()
+        # The created source already has the name, it is not sent again
         self.mocked_update_source.assert_called_with(
             source_id,
-            source_name,
+            None,
             source_autogen,
             source_ingest)
         self.assertTrue(r.exception.args[0]['changed'])
@@ -0,0 +1,174 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from ansible.module_utils import basic
+from ansible.module_utils.common.text.converters import to_bytes
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.modules import logtail_source_plan
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+    MOCK_PATH = "ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api.LogtailApiClient"
+except ImportError:
+    print("ImportError")
+
+
+class AnsibleExitJson(Exception):
+    """Exception class to be raised by module.exit_json and caught by the test case"""
+    pass
+
+
+class AnsibleFailJson(Exception):
+    """Exception class to be raised by module.fail_json and caught by the test case"""
+    pass
+
+
+def set_module_args(args):
+    """prepare arguments so that they will be picked up during module creation"""
+    args = json.dumps({'ANSIBLE_MODULE_ARGS': args})
+    basic._ANSIBLE_ARGS = to_bytes(args)
+
+
+def mocked_exit_json(*args, **kwargs):
+    """function to patch over exit_json; package return data into an exception"""
+    if 'changed' not in kwargs:
+        kwargs['changed'] = False
+    raise AnsibleExitJson(kwargs)
+
+
+def mocked_fail_json(*args, **kwargs):
+    """function to patch over fail_json; package return data into an exception"""
+    kwargs['failed'] = True
+    raise AnsibleFailJson(kwargs)
+
+
+class TestLogtailSourcePlanModule(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.plan_file = os.path.join(self.tmpdir, 'sources.plan')
+        self.desired_file = os.path.join(self.tmpdir, 'sources.yml')
+        with open(self.desired_file, 'w') as f:
+            f.write("sources:\n"
+                    "  - name: web\n"
+                    "    ingest_paused: true\n")
+
+        self.mock_module_helper = mock.patch.multiple(
+            basic.AnsibleModule,
+            exit_json=mocked_exit_json,
+            fail_json=mocked_fail_json)
+        self.mock_module_helper.start()
+        self.addCleanup(self.mock_module_helper.stop)
+
+        self.source = LogtailSource(
+            id='1', name='web', platform='ubuntu', ingest_paused=False,
+            updated_at='2022-06-11T21:43:12.740Z')
+        patcher = mock.patch(MOCK_PATH+'.get_all_sources')
+        self.addCleanup(patcher.stop)
+        self.mocked_all_sources = patcher.start()
+        self.mocked_all_sources.return_value = [self.source.get_dict()]
+        patcher = mock.patch(MOCK_PATH+'.get_sources_since')
+        self.addCleanup(patcher.stop)
+        self.mocked_since = patcher.start()
+        self.mocked_since.return_value = (list(), set(), False)
+        patcher = mock.patch(MOCK_PATH+'.update_source')
+        self.addCleanup(patcher.stop)
+        self.mocked_update_source = patcher.start()
+        self.mocked_update_source.return_value = self.source
+
+    def test_desired_required(self):
+        set_module_args({'token': 'token', 'plan_file': self.plan_file})
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_plan.main()
+        self.assertEqual(
+            'mode is plan but any of the following are missing: '
+            'desired, desired_file',
+            r.exception.args[0]['msg'])
+
+    def test_plan_then_apply(self):
+        set_module_args({
+            'token': 'token',
+            'plan_file': self.plan_file,
+            'desired_file': self.desired_file
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_plan.main()
+        self.assertFalse(r.exception.args[0]['changed'])
+        self.assertEqual({'update': 1}, r.exception.args[0]['counts'])
+        self.mocked_update_source.assert_not_called()
+        self.assertTrue(os.path.exists(self.plan_file))
+
+        set_module_args({
+            'token': 'token',
+            'mode': 'apply',
+            'plan_file': self.plan_file
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_plan.main()
+        self.mocked_all_sources.assert_called_once()
+        self.mocked_since.assert_called_once_with('2022-06-11T21:43:12.740Z')
+        self.mocked_update_source.assert_called_once_with(
+            '1', None, None, True)
+        self.assertTrue(r.exception.args[0]['changed'])
+        self.assertEqual({'applied': 1}, r.exception.args[0]['counts'])
+
+    def test_accounts(self):
+        set_module_args({
+            'accounts': [
+                {'alias': 'web', 'token': 'token1'},
+                {'alias': 'data', 'token': 'token2'},
+            ],
+            'plan_file': self.plan_file,
+            'desired': [
+                {'name': 'web', 'ingest_paused': True},
+                {'name': 'warehouse', 'platform': 'postgresql',
+                 'account': 'data'},
+            ]
+        })
+        with self.assertRaises(AnsibleExitJson) as r:
+            logtail_source_plan.main()
+        result = r.exception.args[0]
+        self.assertEqual(
+            [('update', 'web', 'web'), ('update', 'web', 'data'),
+             ('create', 'warehouse', 'data')],
+            [(a['action'], a['name'], a['account'])
+             for a in result['actions']])
+        self.assertEqual(
+            [('web', {'update': 1}), ('data', {'update': 1, 'create': 1})],
+            [(a['alias'], a['counts']) for a in result['accounts']])
+        self.assertTrue(os.path.exists(self.plan_file + '.web'))
+        self.assertTrue(os.path.exists(self.plan_file + '.data'))
+        self.assertFalse(os.path.exists(self.plan_file))
+
+        set_module_args({
+            'accounts': [
+                {'alias': 'web', 'token': 'token1'},
+                {'alias': 'ops', 'token': 'token3'},
+            ],
+            'mode': 'apply',
+            'plan_file': self.plan_file
+        })
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_plan.main()
+        result = r.exception.args[0]
+        self.mocked_update_source.assert_called_once_with(
+            '1', None, None, True)
+        self.assertTrue(result['msg'].startswith('Failed to apply 1 accounts'))
+        self.assertEqual({'applied': 1}, result['accounts'][0]['counts'])
+        self.assertIn('Unable to read plan', result['accounts'][1]['msg'])
+
+    def test_apply_without_plan(self):
+        set_module_args({
+            'token': 'token',
+            'mode': 'apply',
+            'plan_file': self.plan_file
+        })
+        with self.assertRaises(AnsibleFailJson) as r:
+            logtail_source_plan.main()
+        self.assertIn('Unable to read plan', r.exception.args[0]['msg'])
@@ -0,0 +1,163 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import json
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+from ansible.module_utils import basic
+from ansible.module_utils.common.text.converters import to_bytes
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.modules import logtail_source_watch
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api import LogtailApiError
+    from ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_source import LogtailSource
+    MOCK_PATH = "ansible_collections.sd_hardy.logtail.plugins.module_utils.logtail_api.LogtailApiClient"
+except ImportError:
+    print("ImportError")
+
+
+class AnsibleExitJson(Exception):
+    """Exception class to be raised by module.exit_json and caught by the test case"""
+    pass
+
+
+class AnsibleFailJson(Exception):
+    """Exception class to be raised by module.fail_json and caught by the test case"""
+    pass
+
+
+def set_module_args(args):
+    """prepare arguments so that they will be picked up during module creation"""
+    args = json.dumps({'ANSIBLE_MODULE_ARGS': args})
+    basic._ANSIBLE_ARGS = to_bytes(args)
+
+
+def mocked_exit_json(*args, **kwargs):
+    """function to patch over exit_json; package return data into an exception"""
+    if 'changed' not in kwargs:
+        kwargs['changed'] = False
+    raise AnsibleExitJson(kwargs)
+
+
+def mocked_fail_json(*args, **kwargs):
+    """function to patch over fail_json; package return data into an exception"""
+    kwargs['failed'] = True
+    raise AnsibleFailJson(kwargs)
+
+
+class TestLogtailSourceWatchModule(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir)
+        self.state_file = os.path.join(self.tmpdir, 'watch.json')
+        self.events_file = os.path.join(self.tmpdir, 'events.ndjson')
+
+        self.mock_module_helper = mock.patch.multiple(
+            basic.AnsibleModule,
+            exit_json=mocked_exit_json,
+            fail_json=mocked_fail_json)
+        self.mock_module_helper.start()
+        self.addCleanup(self.mock_module_helper.stop)
+
+        self.source = LogtailSource(
+            id='1', name='web', platform='ubuntu', ingest_paused=False,
+            updated_at='2022-06-11T21:43:12.740Z')
+        patcher = mock.patch(MOCK_PATH+'.get_all_sources')
+        self.addCleanup(patcher.stop)
+        self.mocked_all_sources = patcher.start()
+        self.mocked_all_sources.return_value = [self.source.get_dict()]
+        patcher = mock.patch(MOCK_PATH+'.get_sources_since')
+        self.addCleanup(patcher.stop)
+        self.mocked_since = patcher.start()
+        self.mocked_since.return_value = (list(), set(), False)
+
+    def run_watch(self, expect=AnsibleExitJson, **args):
+        args.update(
+            token='token',
+            state_file=self.state_file,
+            events_file=self.events_file)
+        set_module_args(args)
+        with self.assertRaises(expect) as r:
+            logtail_source_watch.main()
+        return r.exception.args[0]
+
+    def test_baseline_then_drift(self):
+        result = self.run_watch()
+        self.assertEqual("Recorded a snapshot of 1 sources", result['message'])
+        self.assertFalse(os.path.exists(self.events_file))
+
+        modified = LogtailSource(
+            id='1', name='web', platform='ubuntu', ingest_paused=True,
+            updated_at='2022-06-12T00:00:00.000Z')
+        self.mocked_since.return_value = \
+            ([modified.get_dict()], set(['1']), False)
+        result = self.run_watch()
+        self.assertFalse(result['changed'])
+        self.assertEqual({'modified': 1}, result['counts'])
+        self.mocked_since.assert_called_once_with('2022-06-11T21:43:12.740Z')
+        with open(self.events_file, 'r') as f:
+            events = [json.loads(line) for line in f]
+        self.assertEqual(1, len(events))
+        self.assertEqual('modified', events[0]['event'])
+        self.assertEqual(True, events[0]['changes']['ingest_paused']['after'])
+        self.assertEqual(
+            0o600, os.stat(self.events_file).st_mode & 0o777)
+
+    def test_duration_keeps_polling(self):
+        self.run_watch()
+        clock = [0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+        with mock.patch('time.time', side_effect=lambda: clock[0]), \
+                mock.patch('time.sleep', side_effect=sleep) as slept:
+            result = self.run_watch(interval=10, duration=25)
+        self.assertEqual(3, result['polls'])
+        self.assertEqual(2, slept.call_count)
+        self.assertEqual("Found 0 drift events in 3 polls", result['message'])
+
+    def test_check_mode_writes_nothing(self):
+        self.run_watch()
+        with open(self.state_file, 'r') as f:
+            state = f.read()
+        modified = LogtailSource(
+            id='1', name='web', platform='ubuntu', ingest_paused=True,
+            updated_at='2022-06-12T00:00:00.000Z')
+        self.mocked_since.return_value = \
+            ([modified.get_dict()], set(['1']), False)
+        result = self.run_watch(_ansible_check_mode=True)
+        self.assertEqual({'modified': 1}, result['counts'])
+        self.assertFalse(os.path.exists(self.events_file))
+        with open(self.state_file, 'r') as f:
+            self.assertEqual(state, f.read())
+
+    def test_max_events(self):
+        self.run_watch()
+        clock = [0]
+
+        def sleep(seconds):
+            clock[0] += seconds
+        self.mocked_since.side_effect = LogtailApiError('API down', 503)
+        with mock.patch('time.time', side_effect=lambda: clock[0]), \
+                mock.patch('time.sleep', side_effect=sleep):
+            result = self.run_watch(
+                expect=AnsibleFailJson, interval=10, duration=45,
+                max_events=2)
+        self.assertEqual(5, result['polls'])
+        self.assertEqual({'error': 5}, result['counts'])
+        self.assertEqual(2, len(result['events']))
+        with open(self.events_file, 'r') as f:
+            self.assertEqual(5, len(f.readlines()))
+
+    def test_failed_poll(self):
+        self.run_watch()
+        self.mocked_since.side_effect = LogtailApiError('API down', 503)
+        result = self.run_watch(expect=AnsibleFailJson)
+        self.assertEqual('API down', result['msg'])
+        self.assertEqual({'error': 1}, result['counts'])
+        with open(self.events_file, 'r') as f:
+            self.assertEqual('error', json.loads(f.readline())['event'])
@@ -0,0 +1,25 @@
+from __future__ import (absolute_import, division, print_function)
+__metaclass__ = type
+
+import os
+import subprocess
+import sys
+import unittest
+
+try:
+    from ansible_collections.sd_hardy.logtail.plugins.modules import logtail_env
+except ImportError:
+    print("ImportError")
+
+
+class TestModulePayload(unittest.TestCase):
+
+    def test_module_utils_budget(self):
+        here = os.path.dirname(os.path.abspath(logtail_env.__file__))
+        collection = os.path.join(here, '..', '..')
+        root = os.path.abspath(os.path.join(collection, '..', '..', '..'))
+        script = os.path.join(collection, 'tests', 'benchmarks', 'module_payload.py')
+        run = subprocess.run(
+            [sys.executable, script, '--check', '--collections-path', root],
+            stdout=subprocess.PIPE, stderr=subprocess.STDOUT)
+        self.assertEqual(0, run.returncode, run.stdout.decode())